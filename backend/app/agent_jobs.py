@@ -0,0 +1,147 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.ai_client import estimate_tokens, generate_text, new_deadline
+from app.core.queue import Queues, TaskTypes, TaskWorker
+from app.core.redis import redis_manager
+from app.metering import usage_meter
+
+logger = logging.getLogger(__name__)
+
+# Generation budget for queued jobs; nobody holds a connection open, so it can be long
+AGENT_JOB_TIMEOUT = float(os.getenv("AGENT_JOB_TIMEOUT", 120))
+# How long finished job results stay readable
+AGENT_JOB_TTL = int(os.getenv("AGENT_JOB_TTL", 3600))
+# Jobs generated concurrently by this process (one TaskWorker loop each)
+AGENT_JOB_WORKERS = int(os.getenv("AGENT_JOB_WORKERS", 4))
+
+FINISHED = ("succeeded", "failed")
+
+
+def _job_key(job_id: str) -> str:
+    return f"agent:job:{job_id}"
+
+def _done_channel(job_id: str) -> str:
+    return f"agent:job:{job_id}:done"
+
+
+async def submit_job(prompt: str, owner: str, user_id: Optional[int] = None) -> str:
+    """Record a queued job and enqueue it for a worker; returns the job id.
+
+    Only ``owner`` (``user:<id>`` or ``ip:<addr>``) can read the job back;
+    it is also the upstream tenant. The finished job is metered against
+    ``user_id``; anonymous jobs are not.
+    """
+    redis = redis_manager.get_redis()
+    job_id = uuid.uuid4().hex
+    key = _job_key(job_id)
+    await redis.hset(key, mapping={
+        "status": "queued",
+        "owner": owner,
+        "created_at": datetime.utcnow().isoformat(),
+    })
+    await redis.expire(key, AGENT_JOB_TTL)
+    task = {
+        "type": TaskTypes.GENERATE_TEXT,
+        "payload": {"job_id": job_id, "prompt": prompt, "tenant": owner, "user_id": user_id},
+        # Generation is expensive and the client already retries on failure
+        "max_attempts": 1,
+    }
+    # The queue pops the highest score first; negative enqueue time runs jobs oldest first
+    await Queues.agent_queue.enqueue(task, priority=-time.time())
+    return job_id
+
+
+async def get_job(job_id: str, owner: str) -> Optional[Dict[str, Any]]:
+    """Current job state, or None if unknown, expired or not ``owner``'s"""
+    redis = redis_manager.get_redis()
+    job = await redis.hgetall(_job_key(job_id))
+    if not job or job.get("owner") != owner:
+        return None
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "text": job.get("text"),
+        "error": job.get("error"),
+    }
+
+
+async def wait_for_job(job_id: str, owner: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Long-poll: return once the job finishes or ``timeout`` seconds pass"""
+    redis = redis_manager.get_redis()
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(_done_channel(job_id))
+    try:
+        # Check after subscribing so a job finishing in between is not missed
+        job = await get_job(job_id, owner)
+        deadline = time.monotonic() + timeout
+        while job is not None and job["status"] not in FINISHED:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                job = await get_job(job_id, owner)
+        return job
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+
+async def _finish(job_id: str, **fields: str):
+    redis = redis_manager.get_redis()
+    key = _job_key(job_id)
+    await redis.hset(key, mapping={**fields, "finished_at": datetime.utcnow().isoformat()})
+    await redis.expire(key, AGENT_JOB_TTL)
+    await redis.publish(_done_channel(job_id), fields["status"])
+
+
+async def generate_text_handler(task_data: Dict[str, Any]):
+    """TaskWorker handler for ``TaskTypes.GENERATE_TEXT``"""
+    payload = task_data["payload"]
+    job_id = payload["job_id"]
+    await redis_manager.get_redis().hset(_job_key(job_id), "status", "running")
+    try:
+        text = await generate_text(payload["prompt"], new_deadline(AGENT_JOB_TIMEOUT), payload.get("tenant"))
+    except Exception as e:
+        logger.error(f"Agent job {job_id} failed: {e}")
+        await _finish(job_id, status="failed", error=str(e) or type(e).__name__)
+        raise
+    await _finish(job_id, status="succeeded", text=text)
+    if payload.get("user_id") is not None:
+        await usage_meter.record(payload["user_id"], estimate_tokens(payload["prompt"]), estimate_tokens(text))
+
+
+class AgentJobWorkers:
+    """Runs ``AGENT_JOB_WORKERS`` TaskWorker loops over the agent queue"""
+
+    def __init__(self, concurrency: int = AGENT_JOB_WORKERS):
+        self.concurrency = concurrency
+        self.workers: List[TaskWorker] = []
+        self.tasks: List[asyncio.Task] = []
+
+    def start(self):
+        for _ in range(self.concurrency):
+            worker = TaskWorker(Queues.agent_queue, {TaskTypes.GENERATE_TEXT: generate_text_handler})
+            self.workers.append(worker)
+            self.tasks.append(asyncio.create_task(worker.start()))
+        logger.info(f"Started {self.concurrency} agent job workers")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        # Workers block in dequeue for up to 5s; cancel rather than wait
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.workers.clear()
+        self.tasks.clear()
+
+
+# Global agent job worker pool, started in the app lifespan when Redis is available
+agent_job_workers = AgentJobWorkers()
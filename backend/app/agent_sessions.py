@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import weakref
+from typing import Any, Dict, List, Optional, Set
+
+from app.ai_client import estimate_tokens, generate_text, new_deadline
+from app.core.metrics import AGENT_SESSION_COMPACTIONS, AGENT_SESSION_PROMPT_TOKENS
+from app.core.redis import redis_manager
+from app.metering import usage_meter
+
+logger = logging.getLogger(__name__)
+
+# Approximate token budget for the context sent upstream with each turn
+AGENT_SESSION_CONTEXT_TOKENS = int(os.getenv("AGENT_SESSION_CONTEXT_TOKENS", 1024))
+# Most recent turns always kept verbatim; older ones are folded into the summary
+AGENT_SESSION_KEEP_TURNS = int(os.getenv("AGENT_SESSION_KEEP_TURNS", 4))
+# Idle sessions expire after this many seconds
+AGENT_SESSION_TTL = int(os.getenv("AGENT_SESSION_TTL", 86400))
+# Time budget for a background compaction call
+AGENT_SESSION_COMPACT_TIMEOUT = float(os.getenv("AGENT_SESSION_COMPACT_TIMEOUT", 60))
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few sentences. Keep names, numbers, "
+    "decisions and open questions; drop pleasantries.\n\n{text}\n\nSummary:"
+)
+
+
+def _render_turns(turns: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{'User' if t['role'] == 'user' else 'Assistant'}: {t['text']}" for t in turns)
+
+
+def context_tokens(session: Dict[str, Any]) -> int:
+    return estimate_tokens(session["summary"]) + sum(estimate_tokens(t["text"]) for t in session["turns"])
+
+
+def build_prompt(session: Dict[str, Any], message: str, budget: Optional[int] = None) -> str:
+    """Upstream prompt for ``message``: the summary, then as many recent turns as fit ``budget``"""
+    budget = AGENT_SESSION_CONTEXT_TOKENS if budget is None else budget
+    remaining = budget - estimate_tokens(session["summary"]) - estimate_tokens(message)
+    recent: List[Dict[str, str]] = []
+    # Compaction normally keeps the history within budget; this only trims if it fell behind
+    for turn in reversed(session["turns"]):
+        remaining -= estimate_tokens(turn["text"])
+        if remaining < 0:
+            break
+        recent.insert(0, turn)
+
+    parts = []
+    if session["summary"]:
+        parts.append(f"Summary of the conversation so far:\n{session['summary']}\n")
+    parts.append(_render_turns(recent + [{"role": "user", "text": message}]))
+    parts.append("Assistant:")
+    return "\n".join(parts)
+
+
+class SessionStore:
+    """Session history in Redis, or in process memory when Redis is unavailable"""
+
+    def __init__(self, ttl: int = AGENT_SESSION_TTL):
+        self.ttl = ttl
+        self._memory_store: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"agent:session:{session_id}"
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            redis = redis_manager.get_redis()
+        except RuntimeError:
+            session = self._memory_store.get(session_id)
+            if session is None or session["expires_at"] <= time.time():
+                self._memory_store.pop(session_id, None)
+                return None
+            return json.loads(session["data"])
+        data = await redis.get(self._key(session_id))
+        return json.loads(data) if data else None
+
+    async def save(self, session_id: str, session: Dict[str, Any]):
+        data = json.dumps(session)
+        try:
+            redis = redis_manager.get_redis()
+        except RuntimeError:
+            self._memory_store[session_id] = {"data": data, "expires_at": time.time() + self.ttl}
+            return
+        await redis.set(self._key(session_id), data, ex=self.ttl)
+
+    async def delete(self, session_id: str) -> bool:
+        try:
+            redis = redis_manager.get_redis()
+        except RuntimeError:
+            return self._memory_store.pop(session_id, None) is not None
+        return bool(await redis.delete(self._key(session_id)))
+
+
+class AgentSessions:
+    """Multi-turn conversations with server-side history.
+
+    Each turn sends the agent a running summary plus the recent turns that
+    fit ``context_tokens`` instead of the whole transcript. Once a session's
+    history outgrows the budget, everything but the last ``keep_turns`` turns
+    is folded into the summary by the agent itself. Compaction runs after the
+    reply is returned, so it adds no latency to the turn that triggered it.
+
+    A session belongs to the ``owner`` that created it (``user:<id>`` or
+    ``ip:<address>`` for anonymous callers); for anyone else it does not exist.
+    Each turn, and the compaction it triggers, is metered against the
+    sender's ``user_id`` with the prompt actually sent upstream.
+
+    Turns on one session are serialized with a lock; the lock is per
+    process, so concurrent turns on the same session across backend replicas
+    can still overwrite each other.
+    """
+
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        context_tokens: int = AGENT_SESSION_CONTEXT_TOKENS,
+        keep_turns: int = AGENT_SESSION_KEEP_TURNS,
+    ):
+        self.store = store or SessionStore()
+        self.context_tokens = context_tokens
+        self.keep_turns = keep_turns
+        # Entries disappear once no turn or compaction holds or awaits the lock
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._compactions: Set[asyncio.Task] = set()
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def create(self, owner: str) -> str:
+        session_id = uuid.uuid4().hex
+        await self.store.save(session_id, {"owner": owner, "summary": "", "turns": []})
+        return session_id
+
+    async def _get_owned(self, session_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        session = await self.store.get(session_id)
+        if session is None or session.get("owner") != owner:
+            return None
+        return session
+
+    async def get(self, session_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        return await self._get_owned(session_id, owner)
+
+    async def delete(self, session_id: str, owner: str) -> bool:
+        async with self._lock(session_id):
+            if await self._get_owned(session_id, owner) is None:
+                return False
+            return await self.store.delete(session_id)
+
+    async def send(
+        self,
+        session_id: str,
+        owner: str,
+        message: str,
+        deadline: Optional[float] = None,
+        tenant: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> Optional[str]:
+        """Run one turn; returns the reply, or None if ``owner`` has no such session"""
+        async with self._lock(session_id):
+            session = await self._get_owned(session_id, owner)
+            if session is None:
+                return None
+            prompt = build_prompt(session, message, self.context_tokens)
+            AGENT_SESSION_PROMPT_TOKENS.observe(estimate_tokens(prompt))
+            text = await generate_text(prompt, deadline, tenant)
+            await self._meter(user_id, prompt, text)
+            session["turns"].append({"role": "user", "text": message})
+            session["turns"].append({"role": "assistant", "text": text})
+            await self.store.save(session_id, session)
+
+        if context_tokens(session) > self.context_tokens and len(session["turns"]) > self.keep_turns:
+            task = asyncio.create_task(self.compact(session_id, tenant, user_id))
+            self._compactions.add(task)
+            task.add_done_callback(self._compactions.discard)
+        return text
+
+    async def compact(
+        self, session_id: str, tenant: Optional[str] = None, user_id: Optional[int] = None
+    ) -> bool:
+        """Fold all but the last ``keep_turns`` turns into the summary; True if anything changed"""
+        async with self._lock(session_id):
+            session = await self.store.get(session_id)
+            if session is None or len(session["turns"]) <= self.keep_turns:
+                return False
+            split = len(session["turns"]) - self.keep_turns
+            older, recent = session["turns"][:split], session["turns"][split:]
+            text = _render_turns(older)
+            if session["summary"]:
+                text = f"Earlier summary: {session['summary']}\n{text}"
+            prompt = SUMMARY_PROMPT.format(text=text)
+            try:
+                summary = await generate_text(prompt, new_deadline(AGENT_SESSION_COMPACT_TIMEOUT), tenant)
+            except Exception as e:
+                # History stays as is; build_prompt trims what does not fit
+                AGENT_SESSION_COMPACTIONS.labels("failed").inc()
+                logger.warning(f"Compacting agent session {session_id} failed: {e}")
+                return False
+            await self._meter(user_id, prompt, summary)
+            session["summary"] = summary.strip()
+            session["turns"] = recent
+            await self.store.save(session_id, session)
+        AGENT_SESSION_COMPACTIONS.labels("compacted").inc()
+        logger.debug(f"Compacted {len(older)} turns of agent session {session_id}")
+        return True
+
+    async def _meter(self, user_id: Optional[int], prompt: str, text: str):
+        if user_id is not None:
+            await usage_meter.record(user_id, estimate_tokens(prompt), estimate_tokens(text))
+
+
+# Global agent session manager
+agent_sessions = AgentSessions()
@@ -1,20 +1,281 @@
 import os
+import json
+import time
 import httpx
+import asyncio
+import hashlib
 import logging
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
+from app.core.concurrency_limiter import AdaptiveConcurrencyLimiter
+from app.core.distributed_semaphore import DistributedSemaphore
+from app.core.http_client import http_client_manager
+from app.core.load_balancer import Replica, ReplicaBalancer
+from app.core.metrics import AGENT_DEADLINE_EXPIRED
+from app.core.singleflight import SingleFlight
 
 GPT_AGENT_URL = os.getenv("GPT_AGENT_URL", "http://gpt-oss-agent:5000/generate")
+GPT_AGENT_STREAM_URL = os.getenv("GPT_AGENT_STREAM_URL", f"{GPT_AGENT_URL}/stream")
+GPT_AGENT_BATCH_URL = os.getenv("GPT_AGENT_BATCH_URL", f"{GPT_AGENT_URL}/batch")
+# Comma-separated generate URLs of agent replicas; defaults to the single URLs above
+GPT_AGENT_URLS = os.getenv("GPT_AGENT_URLS")
+# least_outstanding, ewma or random
+GPT_AGENT_LB_STRATEGY = os.getenv("GPT_AGENT_LB_STRATEGY", "least_outstanding")
+GPT_AGENT_EJECT_AFTER_FAILURES = int(os.getenv("GPT_AGENT_EJECT_AFTER_FAILURES", 3))
+GPT_AGENT_EJECT_SECONDS = float(os.getenv("GPT_AGENT_EJECT_SECONDS", 30))
+# Re-send a single-prompt call to a second replica once it exceeds this latency percentile; unset = off
+GPT_AGENT_HEDGE_PERCENTILE = os.getenv("GPT_AGENT_HEDGE_PERCENTILE")
+# Adaptive limit on in-flight generate_text calls: "gradient" (latency based), "aimd" or "off"
+GPT_AGENT_LIMITER = os.getenv("GPT_AGENT_LIMITER", "gradient")
+GPT_AGENT_LIMIT_INITIAL = int(os.getenv("GPT_AGENT_LIMIT_INITIAL", 20))
+GPT_AGENT_LIMIT_MIN = int(os.getenv("GPT_AGENT_LIMIT_MIN", 2))
+GPT_AGENT_LIMIT_MAX = int(os.getenv("GPT_AGENT_LIMIT_MAX", 200))
+# Calls over the limit wait this long in a queue of this size, then fail fast
+GPT_AGENT_LIMIT_QUEUE_SIZE = int(os.getenv("GPT_AGENT_LIMIT_QUEUE_SIZE", 50))
+GPT_AGENT_LIMIT_QUEUE_TIMEOUT = float(os.getenv("GPT_AGENT_LIMIT_QUEUE_TIMEOUT", 0.5))
+# Cap on generate_text calls in flight across all backend workers (Redis-coordinated); 0 = off
+GPT_AGENT_CLUSTER_LIMIT = int(os.getenv("GPT_AGENT_CLUSTER_LIMIT", 0))
+GPT_AGENT_CLUSTER_LEASE_SECONDS = float(os.getenv("GPT_AGENT_CLUSTER_LEASE_SECONDS", 30))
+# Longest wait for a cluster-wide slot (also bounded by the request deadline)
+GPT_AGENT_CLUSTER_WAIT = float(os.getenv("GPT_AGENT_CLUSTER_WAIT", 5))
+# The agent rejects batches above its own MAX_BATCH_PROMPTS (256 by default)
+GPT_AGENT_BATCH_CHUNK_SIZE = int(os.getenv("GPT_AGENT_BATCH_CHUNK_SIZE", 64))
+GPT_AGENT_BATCH_CONCURRENCY = int(os.getenv("GPT_AGENT_BATCH_CONCURRENCY", 4))
+# Total time budget for an agent call; the remainder is forwarded so the agent can drop or shorten work
+GPT_AGENT_TIMEOUT = float(os.getenv("GPT_AGENT_TIMEOUT", 30))
+# Held back from the forwarded budget to cover the response's trip back
+GPT_AGENT_DEADLINE_MARGIN_MS = float(os.getenv("GPT_AGENT_DEADLINE_MARGIN_MS", 50))
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+# The agent fair-queues requests per tenant, weighted by priority class
+TENANT_HEADER = "X-Tenant-Id"
+PRIORITY_HEADER = "X-Priority"
 logging.basicConfig(level=logging.INFO)
 
-async def generate_text(prompt: str) -> str:
-    async with httpx.AsyncClient(timeout=30) as client:
-        try:
-            response = await client.post(
-                GPT_AGENT_URL,
-                json={"prompt": prompt},
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data.get("text", "")
-        except Exception as e:
-            logging.error(f"Error calling GPT OSS agent: {e}")
+# Concurrent identical prompts share one request to the agent
+agent_singleflight = SingleFlight("gpt_oss_agent")
+
+def _replicas_from_env() -> List[Replica]:
+    if GPT_AGENT_URLS:
+        return [Replica(url.strip()) for url in GPT_AGENT_URLS.split(",") if url.strip()]
+    return [Replica(GPT_AGENT_URL, GPT_AGENT_STREAM_URL, GPT_AGENT_BATCH_URL)]
+
+agent_limiter = None
+if GPT_AGENT_LIMITER != "off":
+    agent_limiter = AdaptiveConcurrencyLimiter(
+        "gpt_oss_agent",
+        algorithm=GPT_AGENT_LIMITER,
+        initial_limit=GPT_AGENT_LIMIT_INITIAL,
+        min_limit=GPT_AGENT_LIMIT_MIN,
+        max_limit=GPT_AGENT_LIMIT_MAX,
+        max_queue=GPT_AGENT_LIMIT_QUEUE_SIZE,
+        queue_timeout=GPT_AGENT_LIMIT_QUEUE_TIMEOUT,
+    )
+
+agent_semaphore = None
+if GPT_AGENT_CLUSTER_LIMIT > 0:
+    agent_semaphore = DistributedSemaphore(
+        "gpt_oss_agent",
+        GPT_AGENT_CLUSTER_LIMIT,
+        lease_seconds=GPT_AGENT_CLUSTER_LEASE_SECONDS,
+        timeout=GPT_AGENT_CLUSTER_WAIT,
+    )
+
+agent_balancer = ReplicaBalancer(
+    _replicas_from_env(),
+    strategy=GPT_AGENT_LB_STRATEGY,
+    eject_after_failures=GPT_AGENT_EJECT_AFTER_FAILURES,
+    eject_seconds=GPT_AGENT_EJECT_SECONDS,
+    hedge_percentile=float(GPT_AGENT_HEDGE_PERCENTILE) if GPT_AGENT_HEDGE_PERCENTILE else None,
+)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the agent was called"""
+
+
+def new_deadline(timeout: Optional[float] = None) -> float:
+    """Monotonic deadline ``timeout`` seconds from now (``GPT_AGENT_TIMEOUT`` by default)"""
+    return time.monotonic() + (GPT_AGENT_TIMEOUT if timeout is None else timeout)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), as the agent's scheduler assumes"""
+    return len(text) // 4 + 1
+
+def _agent_headers(
+    deadline: float, tenant: Optional[str], priority: str
+) -> Tuple[float, Dict[str, str]]:
+    """Remaining seconds before ``deadline`` and the scheduling headers for the agent"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        AGENT_DEADLINE_EXPIRED.labels("before_send").inc()
+        raise DeadlineExceeded("Deadline passed before calling the agent")
+    budget_ms = max(0, int(remaining * 1000 - GPT_AGENT_DEADLINE_MARGIN_MS))
+    headers = {DEADLINE_HEADER: str(budget_ms), PRIORITY_HEADER: priority}
+    if tenant:
+        headers[TENANT_HEADER] = tenant
+    return remaining, headers
+
+def is_deadline_error(e: Exception) -> bool:
+    """True if ``e`` means the request ran out of time rather than failed"""
+    if isinstance(e, (DeadlineExceeded, httpx.TimeoutException)):
+        return True
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 504
+
+def _record_expiry(e: Exception):
+    if isinstance(e, httpx.TimeoutException):
+        AGENT_DEADLINE_EXPIRED.labels("timeout").inc()
+    elif isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 504:
+        AGENT_DEADLINE_EXPIRED.labels("agent").inc()
+
+async def generate_text(
+    prompt: str, deadline: Optional[float] = None, tenant: Optional[str] = None
+) -> str:
+    deadline = deadline or new_deadline()
+    # Per tenant, so every tenant's call is scheduled and accounted under its own name
+    key = hashlib.sha256(f"{tenant or ''}\0{prompt}".encode()).hexdigest()
+    led = False
+
+    def request() -> Awaitable[str]:
+        nonlocal led
+        led = True
+        return _request_text(prompt, deadline, tenant)
+
+    try:
+        # Callers sharing a flight get the leader's deadline
+        return await agent_singleflight.do(key, request)
+    except Exception as e:
+        # The shared call ran out of the leader's time; ours may not have
+        if led or not is_deadline_error(e) or time.monotonic() >= deadline:
             raise
+        return await _request_text(prompt, deadline, tenant)
+
+async def _request_text(prompt: str, deadline: float, tenant: Optional[str] = None) -> str:
+    async with AsyncExitStack() as slots:
+        # Cluster-wide slot first, so waiting for it does not count as agent latency in the local limiter
+        if agent_semaphore is not None:
+            wait = max(0.0, min(GPT_AGENT_CLUSTER_WAIT, deadline - time.monotonic()))
+            await slots.enter_async_context(agent_semaphore.acquire(timeout=wait))
+        if agent_limiter is not None:
+            await slots.enter_async_context(agent_limiter.acquire())
+        return await _balanced_text(prompt, deadline, tenant)
+
+async def _balanced_text(prompt: str, deadline: float, tenant: Optional[str]) -> str:
+    # Prompts are sent at temperature 0, so a hedged duplicate is safe
+    return await agent_balancer.call(
+        lambda replica: _post_text(replica, prompt, deadline, tenant), hedge=True
+    )
+
+async def _post_text(replica: Replica, prompt: str, deadline: float, tenant: Optional[str]) -> str:
+    timeout, headers = _agent_headers(deadline, tenant, "interactive")
+    try:
+        response = await http_client_manager.request(
+            "POST",
+            replica.url,
+            json={"prompt": prompt},
+            headers=headers,
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data.get("text", "")
+    except Exception as e:
+        _record_expiry(e)
+        logging.error(f"Error calling GPT OSS agent at {replica.url}: {e}")
+        raise
+
+
+async def generate_text_batch(
+    prompts: List[str],
+    chunk_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    deadline: Optional[float] = None,
+    tenant: Optional[str] = None,
+) -> List[Dict[str, Optional[str]]]:
+    """Generate completions for many prompts.
+
+    Prompts are split into chunks of ``chunk_size`` and at most
+    ``max_concurrency`` chunks are in flight at once. Results come back in
+    input order as ``{"text": ..., "error": ...}`` items; a chunk that fails
+    as a whole marks each of its items with the error instead of failing the
+    entire call. Chunks are queued at the agent's ``batch`` priority, behind
+    interactive requests. A caller's ``deadline`` bounds every chunk; without
+    one each chunk gets a fresh ``GPT_AGENT_TIMEOUT`` budget when it starts,
+    so chunks waiting behind ``max_concurrency`` are not timed out by the
+    chunks ahead of them.
+    """
+    chunk_size = chunk_size or GPT_AGENT_BATCH_CHUNK_SIZE
+    semaphore = asyncio.Semaphore(max_concurrency or GPT_AGENT_BATCH_CONCURRENCY)
+    chunks = [prompts[i:i + chunk_size] for i in range(0, len(prompts), chunk_size)]
+
+    async def run_chunk(chunk: List[str]) -> List[Dict[str, Optional[str]]]:
+        async with semaphore:
+            try:
+                return await _request_batch(chunk, deadline or new_deadline(), tenant)
+            except Exception as e:
+                return [{"text": None, "error": str(e) or type(e).__name__} for _ in chunk]
+
+    results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+    return [item for chunk_results in results for item in chunk_results]
+
+async def _request_batch(
+    prompts: List[str], deadline: float, tenant: Optional[str] = None
+) -> List[Dict[str, Optional[str]]]:
+    return await agent_balancer.call(
+        lambda replica: _post_batch(replica, prompts, deadline, tenant), observe_latency=False
+    )
+
+async def _post_batch(
+    replica: Replica, prompts: List[str], deadline: float, tenant: Optional[str]
+) -> List[Dict[str, Optional[str]]]:
+    timeout, headers = _agent_headers(deadline, tenant, "batch")
+    try:
+        response = await http_client_manager.request(
+            "POST",
+            replica.batch_url,
+            json={"prompts": prompts},
+            headers=headers,
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        return response.json()["results"]
+    except Exception as e:
+        _record_expiry(e)
+        logging.error(f"Error calling GPT OSS agent batch endpoint: {e}")
+        raise
+
+
+async def generate_text_stream(
+    prompt: str, deadline: Optional[float] = None, tenant: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Yield tokens from the agent's NDJSON stream as they arrive.
+
+    Tokens are read from the socket only as fast as the caller consumes them,
+    so a slow downstream client applies backpressure all the way to the agent.
+    The deadline caps how much the agent generates; reads time out per chunk.
+    """
+    timeout, headers = _agent_headers(deadline or new_deadline(), tenant, "interactive")
+    replica = agent_balancer.pick()
+    try:
+        # Stream duration depends on the client's read pace, so it is not a latency sample
+        async with agent_balancer.track(replica, observe_latency=False), http_client_manager.stream(
+            "POST",
+            replica.stream_url,
+            json={"prompt": prompt},
+            headers=headers,
+            timeout=timeout,
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(f"Agent stream error: {chunk['error']}")
+                if chunk.get("done"):
+                    return
+                yield chunk.get("token", "")
+    except Exception as e:
+        _record_expiry(e)
+        logging.error(f"Error streaming from GPT OSS agent: {e}")
+        raise
@@ -1,11 +1,32 @@
 import os
+import json
 import random
+import time
 import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from datetime import datetime
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel
-from app.ai_client import generate_text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.agent_jobs import get_job, submit_job, wait_for_job
+from app.agent_sessions import agent_sessions
+from app.api.dependencies import get_current_active_user, get_db, get_optional_user
+from app.ai_client import (
+    DEADLINE_HEADER,
+    estimate_tokens,
+    generate_text,
+    generate_text_stream,
+    is_deadline_error,
+    new_deadline,
+)
+from app.core.concurrency_limiter import ConcurrencyLimitExceeded
+from app.core.metrics import AGENT_CLIENT_DISCONNECTS
 from app.core.rate_limiter import RateLimiter
+from app.db.models.user import User
+from app.metering import default_usage_range, usage_for_user, usage_meter
+from app.retrieval import RETRIEVAL_TOP_K, build_prompt, user_indexes
 
 logger = logging.getLogger("agent")
 router = APIRouter()
@@ -14,6 +35,9 @@ MAX_PROMPT_LENGTH = int(os.getenv("MAX_PROMPT_LENGTH", 1024))
 RATE_LIMIT = int(os.getenv("RATE_LIMIT", 5))
 RATE_PERIOD = int(os.getenv("RATE_PERIOD", 60))  # seconds
 rate_limiter = RateLimiter("gpt-oss-agent", RATE_LIMIT, RATE_PERIOD)
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", 0.25))
+# Upper bound on a single long-poll for a job result (seconds)
+AGENT_JOB_MAX_WAIT = float(os.getenv("AGENT_JOB_MAX_WAIT", 30))
 
 class AgentRequest(BaseModel):
     prompt: str
@@ -21,6 +45,31 @@ class AgentRequest(BaseModel):
 class AgentResponse(BaseModel):
     text: str
 
+class AgentJobResponse(BaseModel):
+    job_id: str
+    status: str
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+class AgentAskResponse(BaseModel):
+    text: str
+    sources: List[str]
+
+class AgentSessionResponse(BaseModel):
+    session_id: str
+    summary: str = ""
+    turns: List[Dict[str, str]] = []
+
+class AgentUsageBucket(BaseModel):
+    window_start: datetime
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+
+class AgentUsageResponse(BaseModel):
+    window: str
+    buckets: List[AgentUsageBucket]
+
 def get_client_ip(request: Request) -> str:
     # Respect X-Forwarded-For header if behind proxies/load balancers
     x_forwarded_for = request.headers.get("X-Forwarded-For")
@@ -31,11 +80,76 @@ def get_client_ip(request: Request) -> str:
         return ip
     return request.client.host
 
-@router.post("/agent/gpt-oss", response_model=AgentResponse)
-async def gpt_oss_agent_endpoint(
-    request: Request,
-    body: AgentRequest
-):
+def caller_id(request: Request, user: Optional[User]) -> str:
+    """Who is calling: the signed-in user, else the client IP.
+
+    Also the upstream tenant, so signed-in users behind one NAT or proxy get
+    their own fair-queue and limiter buckets.
+    """
+    return f"user:{user.id}" if user is not None else f"ip:{get_client_ip(request)}"
+
+def request_deadline(request: Request) -> float:
+    """Deadline for the agent call, tightened by the client's own budget header if sent"""
+    deadline = new_deadline()
+    client_budget = request.headers.get(DEADLINE_HEADER)
+    if client_budget is not None:
+        try:
+            deadline = min(deadline, time.monotonic() + float(client_budget) / 1000)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid {DEADLINE_HEADER} header"
+            )
+    return deadline
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready"""
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Await ``coro``, cancelling it as soon as the client disconnects.
+
+    Cancelling the task aborts the outbound httpx request, which closes the
+    connection to the agent so it can drop the generation too.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        task.cancel()
+
+def agent_error(e: Exception) -> HTTPException:
+    """Map a failed agent call to the response the client gets"""
+    if isinstance(e, ClientDisconnected):
+        AGENT_CLIENT_DISCONNECTS.labels("gpt-oss").inc()
+        logger.info("Client disconnected; cancelled agent request")
+        # 499 (client closed request) only shows up in access logs
+        return HTTPException(status_code=499, detail="Client disconnected")
+    if isinstance(e, ConcurrencyLimitExceeded):
+        logger.warning(f"Shedding agent request: {e}")
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Agent busy, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    if is_deadline_error(e):
+        logger.warning(f"Agent request ran out of time: {e}")
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Deadline exceeded")
+    logger.error(f"Error generating text: {e}", exc_info=True)
+    return HTTPException(status_code=500, detail="Internal Server Error")
+
+async def meter_usage(user: Optional[User], prompt: str, text: str):
+    """Count a finished agent call against ``user``; anonymous calls are not metered"""
+    if user is not None:
+        await usage_meter.record(user.id, estimate_tokens(prompt), estimate_tokens(text))
+
+async def check_agent_request(request: Request, body: AgentRequest) -> None:
+    """Validate prompt length and apply the per-client rate limit"""
     if len(body.prompt) > MAX_PROMPT_LENGTH:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -53,12 +167,208 @@ async def gpt_oss_agent_endpoint(
             detail=f"Rate limit exceeded: {RATE_LIMIT} requests per {RATE_PERIOD} seconds"
         )
 
+@router.post("/agent/gpt-oss", response_model=AgentResponse)
+async def gpt_oss_agent_endpoint(
+    request: Request,
+    body: AgentRequest,
+    user: Optional[User] = Depends(get_optional_user),
+):
+    deadline = request_deadline(request)
+    await check_agent_request(request, body)
+
+    try:
+        text = await cancel_on_disconnect(request, generate_text(body.prompt, deadline, caller_id(request, user)))
+    except Exception as e:
+        raise agent_error(e)
+    await meter_usage(user, body.prompt, text)
+    return {"text": text}
+
+@router.post("/agent/gpt-oss/stream")
+async def gpt_oss_agent_stream_endpoint(
+    request: Request,
+    body: AgentRequest,
+    user: Optional[User] = Depends(get_optional_user),
+):
+    """Stream tokens as NDJSON (``{"token": ...}`` lines, then ``{"done": true}``)"""
+    deadline = request_deadline(request)
+    await check_agent_request(request, body)
+
+    tokens = generate_text_stream(body.prompt, deadline, caller_id(request, user))
+
+    async def first_token() -> Optional[str]:
+        try:
+            return await tokens.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    # Wait for the first token so upstream failures still map to a proper status code.
+    # A client leaving before it arrives cancels the read, which closes the agent stream.
     try:
-        text = await generate_text(body.prompt)
-        return {"text": text}
+        first = await cancel_on_disconnect(request, first_token())
     except Exception as e:
-        logger.error(f"Error generating text: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+        raise agent_error(e)
+
+    streamed: List[str] = []
+
+    async def ndjson_lines():
+        try:
+            if first is not None:
+                streamed.append(first)
+                yield json.dumps({"token": first}) + "\n"
+                async for token in tokens:
+                    streamed.append(token)
+                    yield json.dumps({"token": token}) + "\n"
+            yield json.dumps({"done": True}) + "\n"
+        except asyncio.CancelledError:
+            # Starlette cancels the response on disconnect; closing the stream aborts the agent call
+            AGENT_CLIENT_DISCONNECTS.labels("gpt-oss-stream").inc()
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming text: {e}", exc_info=True)
+            yield json.dumps({"error": "Internal Server Error"}) + "\n"
+        finally:
+            await tokens.aclose()
+            # Tokens generated before a disconnect still cost
+            await meter_usage(user, body.prompt, "".join(streamed))
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@router.post("/agent/gpt-oss/jobs", response_model=AgentJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_gpt_oss_job(
+    request: Request,
+    body: AgentRequest,
+    user: Optional[User] = Depends(get_optional_user),
+):
+    """Queue a generation and return its job id without waiting for the result"""
+    await check_agent_request(request, body)
+    try:
+        job_id = await submit_job(body.prompt, caller_id(request, user), user.id if user else None)
+    except RuntimeError as e:
+        logger.error(f"Cannot queue agent job: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Job queue unavailable")
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/agent/gpt-oss/jobs/{job_id}", response_model=AgentJobResponse)
+async def get_gpt_oss_job(
+    job_id: str, request: Request, user: Optional[User] = Depends(get_optional_user)
+):
+    """Poll a job's status and, once finished, its result; only its submitter can see it"""
+    try:
+        job = await get_job(job_id, caller_id(request, user))
+    except RuntimeError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Job queue unavailable")
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@router.get("/agent/gpt-oss/jobs/{job_id}/wait", response_model=AgentJobResponse)
+async def wait_gpt_oss_job(
+    job_id: str,
+    request: Request,
+    timeout: float = AGENT_JOB_MAX_WAIT,
+    user: Optional[User] = Depends(get_optional_user),
+):
+    """Long-poll: respond as soon as the job finishes, or with its current status after ``timeout`` seconds"""
+    try:
+        job = await wait_for_job(job_id, caller_id(request, user), min(max(timeout, 0.0), AGENT_JOB_MAX_WAIT))
+    except RuntimeError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Job queue unavailable")
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@router.post("/agent/gpt-oss/ask", response_model=AgentAskResponse)
+async def gpt_oss_ask_endpoint(
+    request: Request,
+    body: AgentRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Answer a question about the current user's expenses and moods.
+
+    Only the ``RETRIEVAL_TOP_K`` records most similar to the question are put
+    in the prompt; ``sources`` lists their keys (``expense:<id>``, ``mood:<id>``).
+    """
+    deadline = request_deadline(request)
+    await check_agent_request(request, body)
+
+    index = await user_indexes.get(db, current_user.id)
+    matches = index.search(body.prompt, RETRIEVAL_TOP_K)
+    prompt = build_prompt(body.prompt, matches)
+    try:
+        text = await cancel_on_disconnect(request, generate_text(prompt, deadline, caller_id(request, current_user)))
+    except Exception as e:
+        raise agent_error(e)
+    await meter_usage(current_user, prompt, text)
+    return {"text": text, "sources": [m.key for m in matches]}
+
+@router.post("/agent/gpt-oss/sessions", response_model=AgentSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_gpt_oss_session(request: Request, user: Optional[User] = Depends(get_optional_user)):
+    """Start a conversation whose history is kept server-side.
+
+    Only the creator can use the session: the signed-in user, or for
+    anonymous callers the same client IP.
+    """
+    session_id = await agent_sessions.create(caller_id(request, user))
+    return {"session_id": session_id}
+
+@router.get("/agent/gpt-oss/sessions/{session_id}", response_model=AgentSessionResponse)
+async def get_gpt_oss_session(
+    session_id: str, request: Request, user: Optional[User] = Depends(get_optional_user)
+):
+    """The session's summary of older turns and its recent turns"""
+    session = await agent_sessions.get(session_id, caller_id(request, user))
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    return {"session_id": session_id, "summary": session["summary"], "turns": session["turns"]}
+
+@router.delete("/agent/gpt-oss/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_gpt_oss_session(
+    session_id: str, request: Request, user: Optional[User] = Depends(get_optional_user)
+):
+    if not await agent_sessions.delete(session_id, caller_id(request, user)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+
+@router.post("/agent/gpt-oss/sessions/{session_id}/messages", response_model=AgentResponse)
+async def gpt_oss_session_message(
+    session_id: str,
+    request: Request,
+    body: AgentRequest,
+    user: Optional[User] = Depends(get_optional_user),
+):
+    """Send the next user turn; only the compacted history and this turn go upstream"""
+    deadline = request_deadline(request)
+    await check_agent_request(request, body)
+
+    caller = caller_id(request, user)
+    try:
+        text = await cancel_on_disconnect(
+            request,
+            agent_sessions.send(session_id, caller, body.prompt, deadline, caller, user.id if user else None),
+        )
+    except Exception as e:
+        raise agent_error(e)
+    if text is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    # Metered by the session, on the whole prompt sent upstream
+    return {"text": text}
+
+@router.get("/agent/usage", response_model=AgentUsageResponse)
+async def agent_usage(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    window: Literal["hour", "day"] = "hour",
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """The current user's agent usage per hour or day (UTC), the last 7 days by default.
+
+    Counts reach the database in batches, so the latest ``METERING_FLUSH_INTERVAL``
+    seconds are not included yet.
+    """
+    default_since, default_until = default_usage_range()
+    buckets = await usage_for_user(db, current_user.id, since or default_since, until or default_until, window)
+    return {"window": window, "buckets": buckets}
 
 @router.get("/agent/health")
 async def agent_health():
@@ -6,6 +6,7 @@ from sqlalchemy import select
 from app.api.dependencies import get_current_active_user, get_db, rate_limit_general
 from app.schemas.user import User
 from app.db.models.expense import Expense
+from app.retrieval import expense_key, user_indexes
 from app.schemas.expense import Expense as ExpenseSchema, ExpenseCreate, ExpenseUpdate
 
 router = APIRouter()
@@ -46,6 +47,7 @@ async def create_expense(
     db.add(expense)
     await db.commit()
     await db.refresh(expense)
+    user_indexes.upsert_expense(expense)
     return ExpenseSchema.model_validate(expense)
 
 
@@ -76,6 +78,7 @@ async def update_expense(
     
     await db.commit()
     await db.refresh(expense)
+    user_indexes.upsert_expense(expense)
     return ExpenseSchema.model_validate(expense)
 
 
@@ -99,6 +102,9 @@ async def delete_expense(
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
+    # Attributes expire on commit; read the owner before it
+    owner_id = current_user.id
     await db.delete(expense)
     await db.commit()
+    user_indexes.remove(owner_id, expense_key(expense_id))
     return {"message": "Expense deleted successfully"}
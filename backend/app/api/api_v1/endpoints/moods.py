@@ -6,6 +6,7 @@ from sqlalchemy import select
 from app.api.dependencies import get_current_active_user, get_db, rate_limit_general
 from app.schemas.user import User
 from app.db.models.mood import Mood
+from app.retrieval import mood_key, user_indexes
 from app.schemas.mood import Mood as MoodSchema, MoodCreate, MoodUpdate
 
 router = APIRouter()
@@ -46,6 +47,7 @@ async def create_mood(
     db.add(mood)
     await db.commit()
     await db.refresh(mood)
+    user_indexes.upsert_mood(mood)
     return MoodSchema.model_validate(mood)
 
 
@@ -76,6 +78,7 @@ async def update_mood(
     
     await db.commit()
     await db.refresh(mood)
+    user_indexes.upsert_mood(mood)
     return MoodSchema.model_validate(mood)
 
 
@@ -99,6 +102,9 @@ async def delete_mood(
     if not mood:
         raise HTTPException(status_code=404, detail="Mood entry not found")
     
+    # Attributes expire on commit; read the owner before it
+    owner_id = current_user.id
     await db.delete(mood)
     await db.commit()
+    user_indexes.remove(owner_id, mood_key(mood_id))
     return {"message": "Mood entry deleted successfully"}
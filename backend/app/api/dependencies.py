@@ -1,4 +1,4 @@
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
 from fastapi import Depends, HTTPException, status
 from jose import JWTError, jwt
@@ -43,6 +43,17 @@ async def get_current_user(
     return user
 
 
+async def get_optional_user(
+    db: AsyncSession = Depends(get_db),
+    token: Optional[str] = Depends(security.optional_oauth2_scheme),
+) -> Optional[UserModel]:
+    """The user behind the bearer token if one was sent, else None; a bad token is still a 401."""
+    if token is None:
+        return None
+    user = await get_current_user(db, token)
+    return user if user.is_active else None
+
+
 async def get_current_active_user(
     current_user: UserModel = Depends(get_current_user),
 ) -> UserModel:
@@ -1,18 +1,136 @@
 import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import fnmatch
 import hashlib
-from typing import Any, Optional, Union
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 from functools import wraps
 import logging
+from app.core.cache_codecs import CacheSerializer
+from app.core.config import settings
+from app.core.metrics import CACHE_L1_BYTES, CACHE_LOOKUPS, CACHE_REFRESHES, CACHE_STALE_SERVED
 from app.core.redis import redis_manager
+from app.core.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Keys deleted per pipeline round trip when invalidating tags or patterns
+DELETE_CHUNK_SIZE = 500
+
+
+def _tag_key(tag: str) -> str:
+    return f"cache:tag:{tag}"
+
+def _tag_version_key(tag: str) -> str:
+    return f"cache:tagver:{tag}"
+
+def _queue_tags(pipe, key: str, tags: Iterable[str], ttl: int):
+    for tag in tags:
+        pipe.sadd(_tag_key(tag), key)
+        # A tag's index lives as long as its longest-lived member
+        pipe.expire(_tag_key(tag), ttl, nx=True)
+        pipe.expire(_tag_key(tag), ttl, gt=True)
+
+
+class LocalCache:
+    """Bounded in-process LRU with a short TTL per entry.
+
+    Holds decoded values, so a hit costs neither a Redis round trip nor a
+    ``json.loads``; callers must not mutate what they get back. Bounded by
+    entry count and by the serialized size of the values.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        # key -> (expires_at, size, value)
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None):
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+        CACHE_L1_BYTES.set(self.bytes)
+
+    def pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+            CACHE_L1_BYTES.set(self.bytes)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+        CACHE_L1_BYTES.set(0)
+
+    def pop_pattern(self, pattern: str):
+        for key in [k for k in self._entries if fnmatch.fnmatchcase(k, pattern)]:
+            self.pop(key)
+
 
 class CacheManager:
-    """Redis-based caching manager"""
+    """Redis-based caching manager with an optional in-process L1.
+
+    With ``l1_max_entries`` > 0, reads are served from a local LRU for up to
+    ``l1_ttl`` seconds before going to Redis. ``set``/``delete`` publish the
+    keys they change on ``INVALIDATION_CHANNEL`` so other workers drop their
+    L1 copies; run ``listen_for_invalidations`` (started in the app lifespan)
+    to receive them. Without the listener the L1 TTL still bounds staleness.
+
+    Values are stored as bytes by ``serializer`` (from the ``cache_codec``
+    settings by default); reads accept every codec, so it can be changed
+    one worker at a time.
+    """
     
-    def __init__(self, default_ttl: int = 300):
+    def __init__(
+        self,
+        default_ttl: int = 300,
+        l1_max_entries: Optional[int] = None,
+        l1_max_bytes: Optional[int] = None,
+        l1_ttl: Optional[float] = None,
+        serializer: Optional[CacheSerializer] = None,
+    ):
         self.default_ttl = default_ttl
+        self.serializer = serializer or CacheSerializer(
+            settings.cache_codec, settings.cache_compression, settings.cache_compress_min_bytes
+        )
+        l1_max_entries = settings.cache_l1_max_entries if l1_max_entries is None else l1_max_entries
+        self.l1: Optional[LocalCache] = None
+        if l1_max_entries > 0:
+            self.l1 = LocalCache(
+                l1_max_entries,
+                settings.cache_l1_max_bytes if l1_max_bytes is None else l1_max_bytes,
+                settings.cache_l1_ttl if l1_ttl is None else l1_ttl,
+            )
+        # Lets the listener skip invalidations this instance sent itself
+        self.instance_id = uuid.uuid4().hex
+        self.lookups: Dict[str, int] = {"l1_hit": 0, "l1_miss": 0, "l2_hit": 0, "l2_miss": 0}
     
     def _generate_key(self, prefix: str, data: Any) -> str:
         """Generate a cache key from data"""
@@ -23,72 +141,396 @@ class CacheManager:
         
         hash_obj = hashlib.sha256(serialized.encode())
         return f"{prefix}:{hash_obj.hexdigest()}"
+
+    def _count(self, tier: str, hit: bool):
+        result = "hit" if hit else "miss"
+        self.lookups[f"{tier}_{result}"] += 1
+        CACHE_LOOKUPS.labels(tier, result).inc()
     
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
+        if self.l1 is not None:
+            value = self.l1.get(key)
+            self._count("l1", value is not None)
+            if value is not None:
+                return value
         try:
-            redis = redis_manager.get_redis()
+            redis = redis_manager.get_binary_redis()
             cached = await redis.get(key)
+            self._count("l2", bool(cached))
             if cached:
-                return json.loads(cached)
+                value = self.serializer.decode(cached)
+                if self.l1 is not None:
+                    self.l1.set(key, value, len(cached))
+                return value
             return None
         except Exception as e:
             logger.warning(f"Cache get error: {e}")
             return None
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set value in cache"""
+    async def set(
+        self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None
+    ) -> bool:
+        """Set value in cache, recording the key under each of ``tags`` for ``invalidate_tags``"""
         try:
-            redis = redis_manager.get_redis()
+            redis = redis_manager.get_binary_redis()
             ttl = ttl or self.default_ttl
-            serialized = json.dumps(value, default=str)
-            await redis.set(key, serialized, ex=ttl)
+            serialized = self.serializer.encode(value)
+            if tags:
+                pipe = redis.pipeline(transaction=False)
+                pipe.set(key, serialized, ex=ttl)
+                _queue_tags(pipe, key, tags, ttl)
+                await pipe.execute()
+            else:
+                await redis.set(key, serialized, ex=ttl)
+            if self.l1 is not None:
+                # Round-trip so L1 hands out what an L2 hit would
+                self.l1.set(key, self.serializer.decode(serialized), len(serialized), ttl)
+                await self._publish_invalidation(keys=[key])
             return True
         except Exception as e:
             logger.warning(f"Cache set error: {e}")
             return False
     
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Values of those ``keys`` that are cached; one MGET for all L1 misses"""
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            value = self.l1.get(key) if self.l1 is not None else None
+            if self.l1 is not None:
+                self._count("l1", value is not None)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+        if not missing:
+            return found
+        try:
+            redis = redis_manager.get_binary_redis()
+            for key, cached in zip(missing, await redis.mget(missing)):
+                self._count("l2", bool(cached))
+                if cached:
+                    found[key] = self.serializer.decode(cached)
+                    if self.l1 is not None:
+                        self.l1.set(key, found[key], len(cached))
+        except Exception as e:
+            logger.warning(f"Cache get many error: {e}")
+        return found
+
+    async def set_many(
+        self,
+        items: Dict[str, Any],
+        ttl: Optional[int] = None,
+        tags: Optional[Dict[str, Iterable[str]]] = None,
+    ) -> bool:
+        """Set several values in one pipelined round trip; ``tags`` maps keys to their tags"""
+        if not items:
+            return True
+        try:
+            redis = redis_manager.get_binary_redis()
+            ttl = ttl or self.default_ttl
+            serialized = {key: self.serializer.encode(value) for key, value in items.items()}
+            pipe = redis.pipeline(transaction=False)
+            for key, payload in serialized.items():
+                pipe.set(key, payload, ex=ttl)
+                _queue_tags(pipe, key, (tags or {}).get(key, ()), ttl)
+            await pipe.execute()
+            if self.l1 is not None:
+                for key, payload in serialized.items():
+                    self.l1.set(key, self.serializer.decode(payload), len(payload), ttl)
+                await self._publish_invalidation(keys=list(serialized))
+            return True
+        except Exception as e:
+            logger.warning(f"Cache set many error: {e}")
+            return False
+
     async def delete(self, key: str) -> bool:
         """Delete value from cache"""
+        if self.l1 is not None:
+            self.l1.pop(key)
         try:
             redis = redis_manager.get_redis()
             await redis.delete(key)
+            if self.l1 is not None:
+                await self._publish_invalidation(keys=[key])
             return True
         except Exception as e:
             logger.warning(f"Cache delete error: {e}")
             return False
     
-    async def clear_pattern(self, pattern: str) -> int:
-        """Clear all keys matching pattern"""
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        """Delete several keys, ``DELETE_CHUNK_SIZE`` per round trip; returns the number deleted"""
+        keys = list(dict.fromkeys(keys))
+        if self.l1 is not None:
+            for key in keys:
+                self.l1.pop(key)
         try:
             redis = redis_manager.get_redis()
-            keys = await redis.keys(pattern)
-            if keys:
-                return await redis.delete(*keys)
+            deleted = 0
+            for i in range(0, len(keys), DELETE_CHUNK_SIZE):
+                deleted += await redis.delete(*keys[i:i + DELETE_CHUNK_SIZE])
+            if self.l1 is not None and keys:
+                await self._publish_invalidation(keys=keys)
+            return deleted
+        except Exception as e:
+            logger.warning(f"Cache delete many error: {e}")
             return 0
+
+    async def clear_pattern(self, pattern: str) -> int:
+        """Clear all keys matching pattern.
+
+        Walks the keyspace with SCAN rather than KEYS, so Redis is not
+        blocked, but the cost is still O(keyspace); prefer ``invalidate_tags``.
+        """
+        if self.l1 is not None:
+            self.l1.pop_pattern(pattern)
+        try:
+            redis = redis_manager.get_redis()
+            deleted = 0
+            chunk: List[str] = []
+            async for key in redis.scan_iter(match=pattern, count=DELETE_CHUNK_SIZE):
+                chunk.append(key)
+                if len(chunk) >= DELETE_CHUNK_SIZE:
+                    deleted += await redis.delete(*chunk)
+                    chunk = []
+            if chunk:
+                deleted += await redis.delete(*chunk)
+            if self.l1 is not None:
+                await self._publish_invalidation(pattern=pattern)
+            return deleted
         except Exception as e:
             logger.warning(f"Cache clear pattern error: {e}")
             return 0
 
+    async def invalidate_tags(self, *tags: str) -> int:
+        """Delete every key recorded under any of ``tags`` and bump the tags' versions.
+
+        Members are read with SSCAN and deleted in pipelined chunks of
+        ``DELETE_CHUNK_SIZE``, so a large tag never blocks Redis for long.
+        The version bump makes keys built with ``versioned_key`` unreachable
+        even if they were missed by the index. Returns the number of keys deleted.
+        """
+        try:
+            redis = redis_manager.get_redis()
+            deleted = 0
+            for tag in tags:
+                tag_key = _tag_key(tag)
+                await redis.incr(_tag_version_key(tag))
+                chunk: List[str] = []
+                async for key in redis.sscan_iter(tag_key, count=DELETE_CHUNK_SIZE):
+                    chunk.append(key)
+                    if len(chunk) >= DELETE_CHUNK_SIZE:
+                        deleted += await self._delete_chunk(redis, tag_key, chunk)
+                        chunk = []
+                if chunk:
+                    deleted += await self._delete_chunk(redis, tag_key, chunk)
+            return deleted
+        except Exception as e:
+            logger.warning(f"Cache invalidate tags error: {e}")
+            return 0
+
+    async def _delete_chunk(self, redis, tag_key: str, keys: List[str]) -> int:
+        if self.l1 is not None:
+            for key in keys:
+                self.l1.pop(key)
+        pipe = redis.pipeline(transaction=False)
+        pipe.delete(*keys)
+        pipe.srem(tag_key, *keys)
+        deleted, _ = await pipe.execute()
+        if self.l1 is not None:
+            await self._publish_invalidation(keys=keys)
+        return deleted
+
+    async def versioned_key(self, key: str, tags: Iterable[str]) -> str:
+        """``key`` suffixed with the current versions of ``tags``; one MGET round trip"""
+        tags = list(tags)
+        try:
+            redis = redis_manager.get_redis()
+            versions = await redis.mget([_tag_version_key(tag) for tag in tags])
+        except Exception as e:
+            logger.warning(f"Cache tag version error: {e}")
+            return key
+        return f"{key}:v" + ".".join(version or "0" for version in versions)
+
+    async def _publish_invalidation(self, keys=None, pattern: Optional[str] = None):
+        redis = redis_manager.get_redis()
+        message = {"origin": self.instance_id, "keys": keys or [], "pattern": pattern}
+        await redis.publish(INVALIDATION_CHANNEL, json.dumps(message))
+
+    def _apply_invalidation(self, data: str):
+        message = json.loads(data)
+        if message["origin"] == self.instance_id or self.l1 is None:
+            return
+        for key in message["keys"]:
+            self.l1.pop(key)
+        if message["pattern"]:
+            self.l1.pop_pattern(message["pattern"])
+
+    async def listen_for_invalidations(self):
+        """Drop L1 entries changed by other workers; runs until cancelled"""
+        if self.l1 is None:
+            return
+        while True:
+            try:
+                pubsub = redis_manager.get_redis().pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                try:
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._apply_invalidation(message["data"])
+                finally:
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Messages sent while disconnected are lost; start clean
+                logger.warning(f"Cache invalidation listener error, clearing L1: {e}")
+                self.l1.clear()
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counts per tier; L2 lookups are L1 misses (or all lookups without L1)"""
+        l1_total = self.lookups["l1_hit"] + self.lookups["l1_miss"]
+        l2_total = self.lookups["l2_hit"] + self.lookups["l2_miss"]
+        return {
+            **self.lookups,
+            "l1_hit_rate": self.lookups["l1_hit"] / l1_total if l1_total else None,
+            "l2_hit_rate": self.lookups["l2_hit"] / l2_total if l2_total else None,
+            "l1_entries": len(self.l1) if self.l1 is not None else 0,
+            "l1_bytes": self.l1.bytes if self.l1 is not None else 0,
+        }
+
 
 # Global cache manager
 cache_manager = CacheManager()
 
 
+# Wraps values stored by ``cache_response`` with what XFetch and
+# stale-while-revalidate need: compute time and logical expiry (epoch seconds)
+_ENVELOPE = "_cache_envelope"
+
+# Concurrent misses for one key share a single recomputation in this process
+cache_singleflight = SingleFlight("cache_response")
+_background_refreshes: Set[asyncio.Task] = set()
+
+# Deletes the recompute lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _envelope(value: Any, delta: float, ttl: int) -> Dict[str, Any]:
+    return {_ENVELOPE: 1, "value": value, "delta": delta, "expires": time.time() + ttl}
+
+
+def _refresh_key(cache_key: str) -> str:
+    return f"{cache_key}:refresh"
+
+
+def _unwrap(cached: Any) -> Optional[Tuple[Any, float, float]]:
+    if isinstance(cached, dict) and cached.get(_ENVELOPE) == 1:
+        return cached["value"], cached["delta"], cached["expires"]
+    return None
+
+
+def _refresh_done(task: asyncio.Task):
+    _background_refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Background cache refresh failed: {task.exception()}")
+
+
+async def _wait_for_peer(cache_key: str, timeout: float) -> Optional[Any]:
+    """Poll for a value another process is computing under the lock"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        cached = _unwrap(await cache_manager.get(cache_key))
+        if cached is not None and cached[2] > time.time():
+            return cached[0]
+    return None
+
+
 def cache_response(
     prefix: str = "cache",
     ttl: int = 300,
-    key_builder: Optional[callable] = None
+    key_builder: Optional[callable] = None,
+    tags: Optional[Union[Iterable[str], Callable[..., Iterable[str]]]] = None,
+    versioned: bool = False,
+    stale_ttl: int = 0,
+    early_expiration: float = 0.0,
+    lock_timeout: Optional[float] = None,
 ):
     """
     Decorator to cache function responses
     
+    Concurrent misses for a key within a process share one call of the
+    function. Results are stored with their compute time and expiry so the
+    options below can refresh them before callers see a miss.
+    
     Args:
         prefix: Cache key prefix
         ttl: Time to live in seconds
         key_builder: Custom function to build cache key from args/kwargs
+        tags: Tags to record results under, or a function of args/kwargs
+            returning them; ``cache_manager.invalidate_tags`` drops them
+        versioned: Also fold the tags' versions into the key (one extra
+            MGET per call), so invalidation holds even for untracked keys
+        stale_ttl: Keep serving an expired value for up to this many
+            seconds while one background task refreshes it
+        early_expiration: XFetch ``beta``; above 0, callers refresh a value
+            in the background with a probability that rises as expiry nears
+            and with how long the value took to compute (1.0 is typical)
+        lock_timeout: Also take a Redis lock for recomputation, so only one
+            process computes a missing key; others wait up to this many
+            seconds for its result before computing it themselves
     """
     def decorator(func):
+        async def compute(cache_key: str, key_tags: List[str], reason: str, args, kwargs) -> Any:
+            CACHE_REFRESHES.labels(prefix, reason).inc()
+            lock_key, token = f"{cache_key}:lock", uuid.uuid4().hex
+            locked = False
+            if lock_timeout:
+                try:
+                    redis = redis_manager.get_redis()
+                    locked = bool(await redis.set(lock_key, token, nx=True, px=int(lock_timeout * 1000)))
+                except Exception as e:
+                    logger.warning(f"Cache lock error: {e}")
+                    locked = None
+                if locked is False and reason == "miss":
+                    value = await _wait_for_peer(cache_key, lock_timeout)
+                    if value is not None:
+                        return value
+                elif locked is False:
+                    # Someone else is refreshing; the stale value keeps being served meanwhile
+                    return None
+            try:
+                started = time.monotonic()
+                result = await func(*args, **kwargs)
+                delta = time.monotonic() - started
+                await cache_manager.set(cache_key, _envelope(result, delta, ttl), ttl + stale_ttl, tags=key_tags)
+                return result
+            finally:
+                if locked:
+                    try:
+                        await redis_manager.get_redis().eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                    except Exception as e:
+                        logger.warning(f"Cache unlock error: {e}")
+
+        def refresh_in_background(cache_key: str, key_tags: List[str], reason: str, args, kwargs):
+            # Refreshes get their own key: one that loses the lock returns None,
+            # which a miss caller must never receive as the value
+            task = asyncio.create_task(
+                cache_singleflight.do(
+                    _refresh_key(cache_key), lambda: compute(cache_key, key_tags, reason, args, kwargs)
+                )
+            )
+            _background_refreshes.add(task)
+            task.add_done_callback(_refresh_done)
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # Build cache key
@@ -97,21 +539,105 @@ def cache_response(
             else:
                 key_data = {"args": args, "kwargs": kwargs}
                 cache_key = cache_manager._generate_key(prefix, key_data)
+            key_tags = list(tags(*args, **kwargs) if callable(tags) else tags or [])
+            if versioned and key_tags:
+                cache_key = await cache_manager.versioned_key(cache_key, key_tags)
             
             # Try to get from cache
-            cached_result = await cache_manager.get(cache_key)
-            if cached_result is not None:
-                logger.debug(f"Cache hit for key: {cache_key}")
-                return cached_result
+            cached = _unwrap(await cache_manager.get(cache_key))
+            if cached is not None:
+                value, delta, expires = cached
+                now = time.time()
+                if now < expires:
+                    # XFetch: -log(U) is exponentially distributed, so a few callers refresh early, not all
+                    if early_expiration > 0 and (
+                        now - delta * early_expiration * math.log(1.0 - random.random()) >= expires
+                    ):
+                        if not cache_singleflight.in_flight(_refresh_key(cache_key)):
+                            refresh_in_background(cache_key, key_tags, "early", args, kwargs)
+                    logger.debug(f"Cache hit for key: {cache_key}")
+                    return value
+                if now < expires + stale_ttl:
+                    CACHE_STALE_SERVED.labels(prefix).inc()
+                    if not cache_singleflight.in_flight(_refresh_key(cache_key)):
+                        refresh_in_background(cache_key, key_tags, "stale", args, kwargs)
+                    logger.debug(f"Serving stale value for key: {cache_key}")
+                    return value
             
             # Execute function and cache result
             logger.debug(f"Cache miss for key: {cache_key}")
-            result = await func(*args, **kwargs)
-            
-            # Cache the result
-            await cache_manager.set(cache_key, result, ttl)
-            
-            return result
+            return await cache_singleflight.do(
+                cache_key, lambda: compute(cache_key, key_tags, "miss", args, kwargs)
+            )
+        return wrapper
+    return decorator
+
+
+def cache_response_batch(
+    prefix: str = "cache",
+    ttl: int = 300,
+    key_builder: Optional[callable] = None,
+    tags: Optional[Union[Iterable[str], Callable[..., Iterable[str]]]] = None,
+):
+    """
+    Decorator to cache a batch function per item
+
+    The decorated function takes a list of argument tuples and returns one
+    result per tuple, in order. The wrapper looks all of them up with one
+    MGET, calls the function once with just the misses (duplicates removed)
+    and writes their results back in one pipeline. Items are keyed and
+    stored exactly as ``cache_response`` with the same ``prefix`` and
+    ``key_builder`` would, so single and batch lookups share entries.
+    Stale serving, early refresh, locking and versioned keys are not
+    supported here; expired entries simply count as misses.
+
+    Args:
+        prefix: Cache key prefix
+        ttl: Time to live in seconds
+        key_builder: Custom function to build a cache key from one tuple's args
+        tags: Tags to record results under, or a function of one tuple's args
+    """
+    def decorator(func):
+        def item_key(args: Tuple) -> str:
+            if key_builder:
+                return key_builder(*args)
+            return cache_manager._generate_key(prefix, {"args": args, "kwargs": {}})
+
+        @wraps(func)
+        async def wrapper(arg_tuples: Iterable[Tuple]):
+            arg_tuples = [tuple(args) for args in arg_tuples]
+            keys = [item_key(args) for args in arg_tuples]
+            cached = await cache_manager.get_many(keys)
+
+            now = time.time()
+            results: Dict[str, Any] = {}
+            for key, entry in cached.items():
+                unwrapped = _unwrap(entry)
+                if unwrapped is not None and now < unwrapped[2]:
+                    results[key] = unwrapped[0]
+
+            misses = {key: args for key, args in zip(keys, arg_tuples) if key not in results}
+            logger.debug(f"Batch cache {prefix}: {len(keys) - len(misses)} hits, {len(misses)} misses")
+            if misses:
+                CACHE_REFRESHES.labels(prefix, "miss").inc(len(misses))
+                started = time.monotonic()
+                computed = list(await func(list(misses.values())))
+                if len(computed) != len(misses):
+                    raise ValueError(
+                        f"{func.__name__} returned {len(computed)} results for {len(misses)} argument tuples"
+                    )
+                # Every item shares the call's duration, which is all XFetch readers need
+                delta = time.monotonic() - started
+                results.update(zip(misses, computed))
+                await cache_manager.set_many(
+                    {key: _envelope(value, delta, ttl) for key, value in zip(misses, computed)},
+                    ttl,
+                    tags={
+                        key: list(tags(*args) if callable(tags) else tags or [])
+                        for key, args in misses.items()
+                    },
+                )
+            return [results[key] for key in keys]
         return wrapper
     return decorator
 
@@ -131,11 +657,14 @@ class UserCache:
         key_data = {"user_id": user_id, "args": args, "kwargs": kwargs}
         return cache_manager._generate_key("user", key_data)
     
+    @staticmethod
+    def user_tags(user_id: int, *args, **kwargs) -> List[str]:
+        return [f"user:{user_id}"]
+    
     @staticmethod
     async def invalidate_user_cache(user_id: int):
         """Invalidate all cache entries for a user"""
-        pattern = f"user:*user_id*{user_id}*"
-        return await cache_manager.clear_pattern(pattern)
+        return await cache_manager.invalidate_tags(f"user:{user_id}")
 
 
 # User-specific cache decorators
@@ -144,5 +673,6 @@ def cache_user_data(ttl: int = 300):
     return cache_response(
         prefix="user_data",
         ttl=ttl,
-        key_builder=UserCache.user_key_builder
+        key_builder=UserCache.user_key_builder,
+        tags=UserCache.user_tags,
     )
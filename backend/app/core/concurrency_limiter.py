@@ -0,0 +1,180 @@
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional
+
+from app.core.metrics import CONCURRENCY_IN_FLIGHT, CONCURRENCY_LIMIT, CONCURRENCY_REJECTED
+from app.core.retry import is_transient_error
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ("gradient", "aimd")
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a call cannot get a slot within the queue bounds"""
+
+
+class AdaptiveConcurrencyLimiter:
+    """Caps in-flight upstream calls at a limit learned from observed behaviour.
+
+    ``gradient`` compares a short-term latency average with a slow long-term
+    baseline: while latency stays near the baseline the limit grows by about
+    ``sqrt(limit)`` per update, and once queueing in the upstream inflates
+    latency the limit shrinks in proportion. ``aimd`` ignores latency, adding
+    roughly one slot per ``limit`` successes and multiplying by
+    ``backoff_ratio`` on failure. Both treat the transient failures from
+    ``app.core.retry`` (timeouts, connection errors, 429/5xx) as overload.
+
+    Calls over the limit wait in a FIFO of at most ``max_queue`` entries for
+    up to ``queue_timeout`` seconds, then fail with ``ConcurrencyLimitExceeded``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        algorithm: str = "gradient",
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        max_queue: int = 50,
+        queue_timeout: float = 0.5,
+        backoff_ratio: float = 0.9,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        long_window: int = 600,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown concurrency limit algorithm: {algorithm}")
+        self.name = name
+        self.algorithm = algorithm
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._long_alpha = 2 / (long_window + 1)
+        self._clock = clock
+        self.in_flight = 0
+        self.short_rtt: Optional[float] = None
+        self.long_rtt: Optional[float] = None
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        CONCURRENCY_LIMIT.labels(name).set(self.limit)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        """Hold a slot for one upstream call and feed its outcome back into the limit"""
+        await self._acquire_slot()
+        in_flight = self.in_flight
+        started = self._clock()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # The caller left; says nothing about the upstream
+            self._release_slot()
+            raise
+        except Exception as e:
+            self._release_slot()
+            if is_transient_error(e):
+                self._on_drop()
+            raise
+        else:
+            self._release_slot()
+            self._on_success(self._clock() - started, in_flight)
+
+    async def _acquire_slot(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self._take_slot()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # The releaser takes the slot on our behalf before resolving the future
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we gave up: hand it on
+                self._release_slot()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("queue timeout")
+            raise
+
+    def _take_slot(self):
+        self.in_flight += 1
+        CONCURRENCY_IN_FLIGHT.labels(self.name).set(self.in_flight)
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        CONCURRENCY_IN_FLIGHT.labels(self.name).set(self.in_flight)
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._take_slot()
+                waiter.set_result(None)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        CONCURRENCY_REJECTED.labels(self.name).inc()
+        raise ConcurrencyLimitExceeded(
+            f"{self.name}: {reason} ({self.in_flight} in flight, limit {int(self.limit)})"
+        )
+
+    def _on_success(self, rtt: float, in_flight: int):
+        self.short_rtt = rtt if self.short_rtt is None else self.short_rtt + 0.5 * (rtt - self.short_rtt)
+        if self.long_rtt is None:
+            self.long_rtt = rtt
+        else:
+            self.long_rtt += self._long_alpha * (rtt - self.long_rtt)
+            if self.long_rtt > 2 * self.short_rtt:
+                # Latency dropped for good (e.g. the upstream scaled out); let the baseline follow quickly
+                self.long_rtt = 0.95 * self.long_rtt
+
+        # A limit that is not being used is no evidence it could be higher
+        app_limited = in_flight * 2 < self.limit
+
+        if self.algorithm == "aimd":
+            if not app_limited:
+                self._set_limit(self.limit + 1 / self.limit)
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        if new_limit < self.limit or not app_limited:
+            self._set_limit(new_limit)
+
+    def _on_drop(self):
+        self._set_limit(self.limit * self.backoff_ratio)
+
+    def _set_limit(self, limit: float):
+        previous = int(self.limit)
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+        if int(self.limit) != previous:
+            logger.debug(f"{self.name} concurrency limit {previous} -> {int(self.limit)}")
+            self._wake_waiters()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "algorithm": self.algorithm,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+            "short_rtt_s": self.short_rtt,
+            "long_rtt_s": self.long_rtt,
+        }
@@ -27,6 +27,24 @@ class Settings(BaseSettings):
     # Redis
     redis_url: AnyUrl = "redis://localhost:6379/0"
     
+    # Outbound HTTP client pool (app.core.http_client)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_per_host_limit: int = 50
+    # Used only when the ``h2`` package is installed and the server negotiates it
+    http2: bool = True
+
+    # In-process L1 cache in front of Redis (app.core.cache); 0 entries = off
+    cache_l1_max_entries: int = 0
+    cache_l1_max_bytes: int = 16 * 1024 * 1024
+    cache_l1_ttl: float = 5.0
+    # Serialisation of cached values (app.core.cache_codecs): "json" or "orjson",
+    # compression "" (off), "zlib" or "zstd" for payloads of at least min_bytes
+    cache_codec: str = "json"
+    cache_compression: str = ""
+    cache_compress_min_bytes: int = 1024
+
     # API Configuration
     api_v1_str: str = "/api/v1"
     project_name: str = "Wealth App API"
@@ -0,0 +1,193 @@
+import time
+import uuid
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.concurrency_limiter import ConcurrencyLimitExceeded
+from app.core.metrics import (
+    DISTRIBUTED_SEMAPHORE_ACQUIRES,
+    DISTRIBUTED_SEMAPHORE_LEASES_LOST,
+    DISTRIBUTED_SEMAPHORE_WAIT,
+)
+from app.core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+# Expire holders and stale waiters, join the FIFO queue if new, and take a
+# slot if one is free and this waiter is among the first in line. Time
+# comes from the Redis server so workers with skewed clocks agree on expiry.
+ACQUIRE_SCRIPT = """
+local holders, queue, seen, tickets = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local id, limit, lease_ms, stale_ms = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+
+redis.call('ZREMRANGEBYSCORE', holders, '-inf', now)
+for _, waiter in ipairs(redis.call('ZRANGEBYSCORE', seen, '-inf', now - stale_ms)) do
+    redis.call('ZREM', queue, waiter)
+    redis.call('ZREM', seen, waiter)
+end
+
+if not redis.call('ZSCORE', queue, id) then
+    redis.call('ZADD', queue, redis.call('INCR', tickets), id)
+end
+redis.call('ZADD', seen, now, id)
+
+local free = limit - redis.call('ZCARD', holders)
+if free > 0 and redis.call('ZRANK', queue, id) < free then
+    redis.call('ZREM', queue, id)
+    redis.call('ZREM', seen, id)
+    redis.call('ZADD', holders, now + lease_ms, id)
+    return 1
+end
+return 0
+"""
+
+# Extend a lease that is still held; returns 0 if it already expired
+RENEW_SCRIPT = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+return 1
+"""
+
+
+class DistributedSemaphore:
+    """Cluster-wide cap on concurrent calls, shared by every worker through Redis.
+
+    Holders are kept in a sorted set scored by lease expiry. A holder renews
+    its lease every third of ``lease_seconds`` while its call runs, so a
+    worker that crashes frees its slots once the lease lapses. Waiters take
+    a ticket from a counter and are admitted strictly in ticket order,
+    whichever worker they are on; a waiter that stops polling (crashed
+    worker) drops out of the queue after ``stale_seconds``.
+
+    Acquisition polls every ``poll_interval`` seconds (with jitter) for up
+    to ``timeout`` seconds, then raises ``ConcurrencyLimitExceeded``. When
+    Redis is unavailable calls go through unlimited, like the other
+    Redis-backed limits in this app.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        lease_seconds: float = 30.0,
+        timeout: float = 5.0,
+        poll_interval: float = 0.05,
+        stale_seconds: Optional[float] = None,
+    ):
+        self.name = name
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds or max(1.0, 20 * poll_interval)
+        prefix = f"semaphore:{name}"
+        self._keys = [f"{prefix}:holders", f"{prefix}:queue", f"{prefix}:seen", f"{prefix}:tickets"]
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold one slot for the duration of the block"""
+        try:
+            redis = redis_manager.get_redis()
+        except RuntimeError:
+            DISTRIBUTED_SEMAPHORE_ACQUIRES.labels(self.name, "bypassed").inc()
+            yield
+            return
+
+        lease_id = uuid.uuid4().hex
+        try:
+            await self._wait_for_slot(redis, lease_id, self.timeout if timeout is None else timeout)
+        except ConcurrencyLimitExceeded:
+            raise
+        except Exception as e:
+            # Redis went away mid-wait; fail open rather than fail the call
+            logger.warning(f"Semaphore {self.name} unavailable, proceeding without a slot: {e}")
+            lease_id = None
+        if lease_id is None:
+            DISTRIBUTED_SEMAPHORE_ACQUIRES.labels(self.name, "bypassed").inc()
+            yield
+            return
+
+        renewer = asyncio.create_task(self._renew(redis, lease_id))
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await self._release(redis, lease_id)
+
+    async def _wait_for_slot(self, redis, lease_id: str, timeout: float):
+        started = time.monotonic()
+        try:
+            while True:
+                acquired = await redis.eval(
+                    ACQUIRE_SCRIPT,
+                    len(self._keys),
+                    *self._keys,
+                    lease_id,
+                    self.limit,
+                    int(self.lease_seconds * 1000),
+                    int(self.stale_seconds * 1000),
+                )
+                waited = time.monotonic() - started
+                if acquired:
+                    DISTRIBUTED_SEMAPHORE_WAIT.labels(self.name).observe(waited)
+                    DISTRIBUTED_SEMAPHORE_ACQUIRES.labels(self.name, "acquired").inc()
+                    return
+                if waited >= timeout:
+                    DISTRIBUTED_SEMAPHORE_WAIT.labels(self.name).observe(waited)
+                    DISTRIBUTED_SEMAPHORE_ACQUIRES.labels(self.name, "timeout").inc()
+                    raise ConcurrencyLimitExceeded(
+                        f"{self.name}: no cluster-wide slot within {timeout:g}s (limit {self.limit})"
+                    )
+                await asyncio.sleep(min(self.poll_interval * random.uniform(0.5, 1.5), timeout - waited))
+        except BaseException:
+            # Leave the queue so those behind us are not held up until we go stale
+            await self._forget(redis, lease_id)
+            raise
+
+    async def _renew(self, redis, lease_id: str):
+        lease_ms = int(self.lease_seconds * 1000)
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await redis.eval(RENEW_SCRIPT, 1, self._keys[0], lease_id, lease_ms)
+            except Exception as e:
+                logger.warning(f"Could not renew semaphore {self.name} lease: {e}")
+                continue
+            if not renewed:
+                # The call keeps running, but the slot may already have been handed out again
+                DISTRIBUTED_SEMAPHORE_LEASES_LOST.labels(self.name).inc()
+                logger.warning(f"Semaphore {self.name} lease {lease_id} expired while held")
+                return
+
+    async def _release(self, redis, lease_id: str):
+        try:
+            await redis.zrem(self._keys[0], lease_id)
+        except Exception as e:
+            # The lease expires on its own
+            logger.warning(f"Could not release semaphore {self.name} lease: {e}")
+
+    async def _forget(self, redis, lease_id: str):
+        try:
+            pipe = redis.pipeline()
+            pipe.zrem(self._keys[1], lease_id)
+            pipe.zrem(self._keys[2], lease_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not leave semaphore {self.name} queue: {e}")
+
+    async def stats(self) -> Dict[str, Any]:
+        redis = redis_manager.get_redis()
+        return {
+            "limit": self.limit,
+            "holders": await redis.zcard(self._keys[0]),
+            "waiting": await redis.zcard(self._keys[1]),
+        }
@@ -0,0 +1,102 @@
+import time
+import asyncio
+import logging
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import HTTP_CLIENT_IN_FLIGHT, HTTP_CLIENT_POOL_UTILIZATION, HTTP_CLIENT_SLOT_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientManager:
+    """Long-lived, pooled ``httpx`` client shared by all outbound calls.
+
+    Reusing one client keeps connections alive between calls instead of
+    paying TCP/TLS setup each time. The pool size and keep-alive come from
+    settings; a per-host semaphore stops one slow upstream from taking every
+    connection. HTTP/2 is enabled when ``h2`` is installed; httpx only uses it
+    for ``https`` origins that negotiate it.
+    """
+
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+        self.max_connections = settings.http_max_connections
+        self.per_host_limit = settings.http_per_host_limit
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    async def connect(self):
+        """Create the pooled client"""
+        if self.client is None:
+            self.client = self._create_client()
+
+    async def disconnect(self):
+        """Close pooled connections"""
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = settings.http2 and importlib.util.find_spec("h2") is not None
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        )
+        logger.info(f"Outbound HTTP pool: {self.max_connections} connections, http2={http2}")
+        return httpx.AsyncClient(limits=limits, http2=http2)
+
+    def get_client(self) -> httpx.AsyncClient:
+        """Get the pooled client, creating it if the app lifespan has not run (tests, scripts)"""
+        if self.client is None:
+            self.client = self._create_client()
+        return self.client
+
+    @asynccontextmanager
+    async def host_slot(self, url: str) -> AsyncIterator[None]:
+        """Hold one of the ``per_host_limit`` concurrency slots for ``url``'s host"""
+        host = httpx.URL(url).host
+        slots = self._host_slots.get(host)
+        if slots is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        started = time.monotonic()
+        async with slots:
+            HTTP_CLIENT_SLOT_WAIT.labels(host).observe(time.monotonic() - started)
+            self._track(host, 1)
+            try:
+                yield
+            finally:
+                self._track(host, -1)
+
+    def _track(self, host: str, delta: int):
+        self._in_flight[host] = self._in_flight.get(host, 0) + delta
+        HTTP_CLIENT_IN_FLIGHT.labels(host).inc(delta)
+        HTTP_CLIENT_POOL_UTILIZATION.set(sum(self._in_flight.values()) / self.max_connections)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request through the pool; kwargs are passed to ``httpx.AsyncClient.request``"""
+        async with self.host_slot(url):
+            return await self.get_client().request(method, url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Stream a response; the host slot is held until the body is consumed"""
+        async with self.host_slot(url):
+            async with self.get_client().stream(method, url, **kwargs) as response:
+                yield response
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "max_connections": self.max_connections,
+            "per_host_limit": self.per_host_limit,
+            "in_flight": dict(self._in_flight),
+        }
+
+
+# Global outbound HTTP client manager
+http_client_manager = HTTPClientManager()
@@ -0,0 +1,226 @@
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+import httpx
+
+from app.core.metrics import AGENT_HEDGED_REQUESTS, AGENT_REPLICA_EJECTIONS, AGENT_REPLICA_OUTSTANDING
+from app.core.retry import TransientAPIError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STRATEGIES = ("least_outstanding", "ewma", "random")
+
+
+class Replica:
+    """One upstream instance and its passively observed health"""
+
+    def __init__(self, url: str, stream_url: Optional[str] = None, batch_url: Optional[str] = None):
+        self.url = url
+        self.stream_url = stream_url or f"{url}/stream"
+        self.batch_url = batch_url or f"{url}/batch"
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def __repr__(self) -> str:
+        return f"Replica({self.url!r})"
+
+
+def is_replica_failure(e: BaseException) -> bool:
+    """Errors that say something about the replica rather than the request"""
+    if isinstance(e, (TransientAPIError, httpx.TransportError)):
+        return True
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500
+
+
+class ReplicaBalancer:
+    """Client-side load balancing across upstream replicas.
+
+    ``least_outstanding`` sends each call to the replica with the fewest calls
+    in flight; ``ewma`` weighs that by each replica's smoothed latency, so a
+    replica that is slow but idle is not preferred. ``random`` matches what a
+    plain proxy does and is kept as a baseline. Replicas failing
+    ``eject_after_failures`` times in a row are skipped for
+    ``eject_seconds``; if every replica is ejected the one due back first is
+    used anyway.
+
+    With ``hedge_percentile`` set, a call still running after that percentile
+    of recent latencies is sent to a second replica and the first response
+    wins. Only hedge idempotent calls.
+    """
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        strategy: str = "least_outstanding",
+        eject_after_failures: int = 3,
+        eject_seconds: float = 30.0,
+        ewma_alpha: float = 0.3,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not replicas:
+            raise ValueError("At least one replica is required")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown load balancing strategy: {strategy}")
+        self.replicas = replicas
+        self.strategy = strategy
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.ewma_alpha = ewma_alpha
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._clock = clock
+        self._latencies: Deque[float] = deque(maxlen=512)
+        self._hedge_delay: Optional[float] = None
+        self._samples_since_refresh = 0
+
+    def pick(self, exclude: Optional[Replica] = None) -> Replica:
+        """Choose a replica for the next call"""
+        now = self._clock()
+        candidates = [r for r in self.replicas if r is not exclude] or self.replicas
+        healthy = [r for r in candidates if r.ejected_until <= now]
+        if not healthy:
+            # Everything is ejected: fail open to the replica due back soonest
+            return min(candidates, key=lambda r: r.ejected_until)
+        if self.strategy == "random" or len(healthy) == 1:
+            return random.choice(healthy)
+        scores = [self._score(r) for r in healthy]
+        best = min(scores)
+        # Break ties randomly so idle replicas share load instead of all hitting the first
+        return random.choice([r for r, score in zip(healthy, scores) if score == best])
+
+    def _score(self, replica: Replica) -> float:
+        if self.strategy == "ewma":
+            # Unmeasured replicas score as fast so they get sampled
+            latency = replica.ewma_latency or 0.0
+            return latency * (replica.outstanding + 1)
+        return replica.outstanding
+
+    @asynccontextmanager
+    async def track(self, replica: Replica, observe_latency: bool = True) -> AsyncIterator[None]:
+        """Count a call against ``replica`` and record its outcome"""
+        replica.outstanding += 1
+        AGENT_REPLICA_OUTSTANDING.labels(replica.url).inc()
+        started = self._clock()
+        try:
+            yield
+        except asyncio.CancelledError:
+            if observe_latency:
+                # A lost hedge race or a caller that gave up: the call took at least this long
+                self._record_latency_lower_bound(replica, self._clock() - started)
+            raise
+        except Exception as e:
+            if is_replica_failure(e):
+                self._record_failure(replica)
+            raise
+        else:
+            replica.consecutive_failures = 0
+            if observe_latency:
+                self._record_latency(replica, self._clock() - started)
+        finally:
+            replica.outstanding -= 1
+            AGENT_REPLICA_OUTSTANDING.labels(replica.url).dec()
+
+    def _record_latency(self, replica: Replica, latency: float):
+        self._record_latency_ewma(replica, latency)
+        self._latencies.append(latency)
+        self._samples_since_refresh += 1
+
+    def _record_latency_ewma(self, replica: Replica, latency: float):
+        if replica.ewma_latency is None:
+            replica.ewma_latency = latency
+        else:
+            replica.ewma_latency += self.ewma_alpha * (latency - replica.ewma_latency)
+
+    def _record_latency_lower_bound(self, replica: Replica, elapsed: float):
+        # Otherwise a replica whose attempts keep losing hedge races keeps its old, fast
+        # score. Censored samples stay out of the hedge window, which holds full latencies.
+        if replica.ewma_latency is None or elapsed > replica.ewma_latency:
+            self._record_latency_ewma(replica, elapsed)
+
+    def _record_failure(self, replica: Replica):
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= self.eject_after_failures:
+            replica.ejected_until = self._clock() + self.eject_seconds
+            replica.consecutive_failures = 0
+            AGENT_REPLICA_EJECTIONS.labels(replica.url).inc()
+            logger.warning(f"Ejecting agent replica {replica.url} for {self.eject_seconds:g}s")
+
+    def hedge_delay(self) -> Optional[float]:
+        """Latency after which a call is hedged, or None while hedging is off or unsampled"""
+        if self.hedge_percentile is None or len(self._latencies) < self.hedge_min_samples:
+            return None
+        # Re-sorting the window on every call is wasteful; refresh periodically
+        if self._hedge_delay is None or self._samples_since_refresh >= 32:
+            ordered = sorted(self._latencies)
+            index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+            self._hedge_delay = ordered[index]
+            self._samples_since_refresh = 0
+        return self._hedge_delay
+
+    async def call(
+        self, fn: Callable[[Replica], Awaitable[T]], hedge: bool = False, observe_latency: bool = True
+    ) -> T:
+        """Run ``fn`` against a chosen replica, hedging to a second one if enabled.
+
+        Pass ``observe_latency=False`` for calls whose duration is not
+        comparable to the rest, so they do not skew EWMA scores or the hedge delay.
+        """
+        primary = self.pick()
+        delay = self.hedge_delay() if hedge and len(self.replicas) > 1 else None
+
+        async def attempt(replica: Replica) -> T:
+            async with self.track(replica, observe_latency):
+                return await fn(replica)
+
+        if delay is None:
+            return await attempt(primary)
+
+        first = asyncio.ensure_future(attempt(primary))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+
+            AGENT_HEDGED_REQUESTS.labels("sent").inc()
+            second = asyncio.ensure_future(attempt(self.pick(exclude=primary)))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            AGENT_HEDGED_REQUESTS.labels("won").inc()
+                        return task.result()
+            # Both attempts failed; surface the original call's error
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        return {
+            "strategy": self.strategy,
+            "hedge_delay_s": self.hedge_delay(),
+            "replicas": [
+                {
+                    "url": r.url,
+                    "outstanding": r.outstanding,
+                    "ewma_latency_s": r.ewma_latency,
+                    "ejected": r.ejected_until > now,
+                }
+                for r in self.replicas
+            ],
+        }
@@ -0,0 +1,131 @@
+"""Prometheus metrics for backend subsystems.
+
+Metrics live on the default registry, which the instrumentator in
+``app.main`` already exposes at ``/metrics``.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Calls through single-flight groups by role (leader = upstream call, shared = call saved)",
+    ["group", "role"],
+)
+SINGLEFLIGHT_CANCELLED = Counter(
+    "singleflight_cancelled_total",
+    "In-flight upstream calls cancelled because every waiter went away",
+    ["group"],
+)
+AGENT_CLIENT_DISCONNECTS = Counter(
+    "agent_client_disconnects_total",
+    "Agent endpoint calls whose client disconnected before the response; the upstream request is cancelled",
+    ["endpoint"],
+)
+AGENT_DEADLINE_EXPIRED = Counter(
+    "agent_deadline_expired_total",
+    "Agent calls that ran out of time budget, by where (before_send, timeout, agent = agent answered 504)",
+    ["stage"],
+)
+HTTP_CLIENT_IN_FLIGHT = Gauge(
+    "http_client_in_flight_requests",
+    "Outbound requests holding a per-host slot",
+    ["host"],
+)
+HTTP_CLIENT_SLOT_WAIT = Histogram(
+    "http_client_slot_wait_seconds",
+    "Time outbound requests waited for a per-host concurrency slot",
+    ["host"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+HTTP_CLIENT_POOL_UTILIZATION = Gauge(
+    "http_client_pool_utilization",
+    "Outbound requests in flight as a fraction of the connection pool size",
+)
+AGENT_REPLICA_OUTSTANDING = Gauge(
+    "agent_replica_outstanding_requests",
+    "Agent calls in flight per replica",
+    ["replica"],
+)
+AGENT_REPLICA_EJECTIONS = Counter(
+    "agent_replica_ejections_total",
+    "Times a replica was taken out of rotation after consecutive failures",
+    ["replica"],
+)
+AGENT_HEDGED_REQUESTS = Counter(
+    "agent_hedged_requests_total",
+    "Hedged agent calls (sent = second attempt started, won = second attempt answered first)",
+    ["outcome"],
+)
+CONCURRENCY_LIMIT = Gauge(
+    "concurrency_limit",
+    "Current adaptive concurrency limit",
+    ["limiter"],
+)
+CONCURRENCY_IN_FLIGHT = Gauge(
+    "concurrency_in_flight",
+    "Calls currently holding a concurrency slot",
+    ["limiter"],
+)
+CONCURRENCY_REJECTED = Counter(
+    "concurrency_rejected_total",
+    "Calls rejected because the limiter's queue was full or the wait timed out",
+    ["limiter"],
+)
+AGENT_SESSION_COMPACTIONS = Counter(
+    "agent_session_compactions_total",
+    "Agent session history compactions by outcome (compacted, failed)",
+    ["outcome"],
+)
+AGENT_SESSION_PROMPT_TOKENS = Histogram(
+    "agent_session_prompt_tokens",
+    "Estimated tokens in the prompt sent upstream for one session turn",
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096),
+)
+AGENT_USAGE_BUFFERED = Gauge(
+    "agent_usage_buffered_keys",
+    "User-hour usage counters buffered in process because Redis was unavailable",
+)
+AGENT_USAGE_FLUSHES = Counter(
+    "agent_usage_flushes_total",
+    "Usage flushes to the database by outcome (ok, failed)",
+    ["outcome"],
+)
+AGENT_USAGE_ROWS_FLUSHED = Counter(
+    "agent_usage_rows_flushed_total",
+    "User-hour usage rows upserted into the database",
+)
+DISTRIBUTED_SEMAPHORE_WAIT = Histogram(
+    "distributed_semaphore_wait_seconds",
+    "Time spent waiting for a cluster-wide semaphore slot",
+    ["semaphore"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DISTRIBUTED_SEMAPHORE_ACQUIRES = Counter(
+    "distributed_semaphore_acquires_total",
+    "Semaphore acquisitions by outcome (acquired, timeout, bypassed = Redis unavailable)",
+    ["semaphore", "outcome"],
+)
+DISTRIBUTED_SEMAPHORE_LEASES_LOST = Counter(
+    "distributed_semaphore_leases_lost_total",
+    "Leases that expired while their holder was still running (holder stalled past lease_seconds)",
+    ["semaphore"],
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by tier (l1 = in-process, l2 = Redis) and result (hit, miss)",
+    ["tier", "result"],
+)
+CACHE_L1_BYTES = Gauge(
+    "cache_l1_bytes",
+    "Approximate serialized size of the values held in the in-process cache",
+)
+CACHE_REFRESHES = Counter(
+    "cache_refreshes_total",
+    "cache_response recomputations by reason (miss, early = XFetch, stale = stale-while-revalidate)",
+    ["prefix", "reason"],
+)
+CACHE_STALE_SERVED = Counter(
+    "cache_stale_served_total",
+    "Expired cache_response values served while a background refresh runs",
+    ["prefix"],
+)
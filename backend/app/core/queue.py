@@ -192,6 +192,7 @@ class Queues:
     email_queue = TaskQueue("email")
     analytics_queue = TaskQueue("analytics")
     cleanup_queue = TaskQueue("cleanup")
+    agent_queue = TaskQueue("agent")
 
 
 # Task types
@@ -201,6 +202,7 @@ class TaskTypes:
     CLEANUP_DATA = "cleanup_data"
     GENERATE_REPORT = "generate_report"
     SYNC_DATA = "sync_data"
+    GENERATE_TEXT = "generate_text"
 
 
 # Example task handlers
@@ -6,6 +6,9 @@ from app.core.config import settings
 class RedisManager:
     def __init__(self):
         self.redis: Optional[redis.Redis] = None
+        # Same server, but returns bytes; built on demand from ``self.redis``
+        self._binary: Optional[redis.Redis] = None
+        self._binary_source: Optional[redis.Redis] = None
     
     async def connect(self):
         """Connect to Redis"""
@@ -24,6 +27,9 @@ class RedisManager:
     
     async def disconnect(self):
         """Disconnect from Redis"""
+        if self._binary:
+            await self._binary.close()
+            self._binary = self._binary_source = None
         if self.redis:
             await self.redis.close()
     
@@ -33,6 +39,21 @@ class RedisManager:
             raise RuntimeError("Redis not connected")
         return self.redis
 
+    def get_binary_redis(self) -> redis.Redis:
+        """Get a connection that leaves values as bytes (``decode_responses=False``)"""
+        client = self.get_redis()
+        if self._binary_source is not client:
+            pool = client.connection_pool
+            self._binary = redis.Redis(
+                connection_pool=pool.__class__(
+                    connection_class=pool.connection_class,
+                    max_connections=pool.max_connections,
+                    **{**pool.connection_kwargs, "decode_responses": False},
+                )
+            )
+            self._binary_source = client
+        return self._binary
+
 
 # Global Redis manager instance
 redis_manager = RedisManager()
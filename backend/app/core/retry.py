@@ -1,5 +1,6 @@
 import asyncio
 import logging
+from datetime import timedelta
 from typing import Any, Callable, Type, Union
 from tenacity import (
     retry,
@@ -12,6 +13,8 @@ from tenacity import (
 from aiobreaker import CircuitBreaker
 import httpx
 
+from app.core.http_client import http_client_manager
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,10 +28,22 @@ class APIError(Exception):
     pass
 
 
+# Failures that signal an overloaded or unreachable upstream rather than a bad request
+TRANSIENT_EXCEPTIONS = (TransientAPIError, httpx.ConnectError, httpx.TimeoutException)
+TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def is_transient_error(e: BaseException) -> bool:
+    """True for errors worth retrying: transient exceptions and retryable HTTP statuses"""
+    if isinstance(e, TRANSIENT_EXCEPTIONS):
+        return True
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code in TRANSIENT_STATUS_CODES
+
+
 # Circuit breaker for external API calls
 api_circuit_breaker = CircuitBreaker(
     fail_max=5,  # Open circuit after 5 failures
-    reset_timeout=60,  # Try again after 60 seconds
+    timeout_duration=timedelta(seconds=60),  # Try again after 60 seconds
     exclude=[httpx.HTTPStatusError]  # Don't count HTTP errors as circuit failures
 )
 
@@ -37,7 +52,7 @@ def create_retry_decorator(
     max_attempts: int = 5,
     initial_wait: float = 1.0,
     max_wait: float = 10.0,
-    retry_exceptions: tuple = (TransientAPIError, httpx.ConnectError, httpx.TimeoutException)
+    retry_exceptions: tuple = TRANSIENT_EXCEPTIONS
 ):
     """Create a retry decorator with exponential backoff and jitter"""
     return retry(
@@ -76,37 +91,37 @@ async def make_external_api_call(
     """
     Make an external API call with circuit breaker and retry logic
     """
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            response = await client.request(
-                method=method,
-                url=url,
-                headers=headers,
-                json=json_data
-            )
-            
-            # Check for transient errors that should be retried
-            if response.status_code in [429, 500, 502, 503, 504]:
-                raise TransientAPIError(f"Transient error: {response.status_code}")
-            
-            # Raise for other HTTP errors
-            response.raise_for_status()
-            
-            return response.json()
-            
-        except httpx.ConnectError as e:
-            logger.warning(f"Connection error: {e}")
-            raise TransientAPIError(f"Connection error: {e}")
+    try:
+        response = await http_client_manager.request(
+            method,
+            url,
+            headers=headers,
+            json=json_data,
+            timeout=timeout
+        )
         
-        except httpx.TimeoutException as e:
-            logger.warning(f"Timeout error: {e}")
-            raise TransientAPIError(f"Timeout error: {e}")
+        # Check for transient errors that should be retried
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise TransientAPIError(f"Transient error: {response.status_code}")
         
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code >= 400:
-                logger.error(f"HTTP error {e.response.status_code}: {e.response.text}")
-                raise APIError(f"HTTP error {e.response.status_code}")
-            raise
+        # Raise for other HTTP errors
+        response.raise_for_status()
+        
+        return response.json()
+        
+    except httpx.ConnectError as e:
+        logger.warning(f"Connection error: {e}")
+        raise TransientAPIError(f"Connection error: {e}")
+    
+    except httpx.TimeoutException as e:
+        logger.warning(f"Timeout error: {e}")
+        raise TransientAPIError(f"Timeout error: {e}")
+    
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code >= 400:
+            logger.error(f"HTTP error {e.response.status_code}: {e.response.text}")
+            raise APIError(f"HTTP error {e.response.status_code}")
+        raise
 
 
 async def with_retry_and_circuit_breaker(
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import sys
 import logging
@@ -9,8 +10,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.api.api_v1.api import api_router
+from app.agent_jobs import agent_job_workers
+from app.core.cache import cache_manager
 from app.core.config import settings
+from app.core.http_client import http_client_manager
 from app.core.redis import redis_manager
+from app.metering import usage_meter
 from app.containers import container
 from prometheus_fastapi_instrumentator import Instrumentator
 
@@ -33,8 +38,22 @@ logger = structlog.get_logger()
 async def lifespan(app: FastAPI):
     # Startup
     await redis_manager.connect()
+    await http_client_manager.connect()
+    # Async agent jobs are queued in Redis; without it the job endpoints return 503
+    if redis_manager.redis:
+        agent_job_workers.start()
+    usage_meter.start()
+    # Drops in-process cache entries that other workers change
+    cache_invalidations = None
+    if redis_manager.redis:
+        cache_invalidations = asyncio.create_task(cache_manager.listen_for_invalidations())
     yield
     # Shutdown
+    if cache_invalidations:
+        cache_invalidations.cancel()
+    await agent_job_workers.stop()
+    await usage_meter.stop()
+    await http_client_manager.disconnect()
     await redis_manager.disconnect()
 
 
@@ -0,0 +1,201 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis.exceptions import ResponseError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.containers import container
+from app.core.metrics import AGENT_USAGE_BUFFERED, AGENT_USAGE_FLUSHES, AGENT_USAGE_ROWS_FLUSHED
+from app.core.redis import redis_manager
+from app.db.models.usage import AgentUsage
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes of pending usage counts to the database
+METERING_FLUSH_INTERVAL = float(os.getenv("METERING_FLUSH_INTERVAL", 10))
+# Usage rows upserted per statement
+METERING_FLUSH_BATCH_SIZE = int(os.getenv("METERING_FLUSH_BATCH_SIZE", 500))
+
+WINDOW_SECONDS = 3600
+FIELDS = ("requests", "prompt_tokens", "completion_tokens")
+PENDING_KEY = "agent:usage:pending"
+
+# (user_id, window start in epoch seconds) -> [requests, prompt_tokens, completion_tokens]
+Counts = Dict[Tuple[int, int], List[int]]
+
+
+def _add(counts: Counts, key: Tuple[int, int], values) -> None:
+    totals = counts.setdefault(key, [0, 0, 0])
+    for i, value in enumerate(values):
+        totals[i] += value
+
+
+class UsageMeter:
+    """Per-user agent usage, counted cheaply on the request path and written in batches.
+
+    ``record`` bumps hash counters in Redis (one MULTI/EXEC round trip),
+    falling back to an in-process buffer while Redis is unavailable. A
+    background task periodically claims the pending counters by renaming the
+    hash, so each count is taken by exactly one flusher across processes, and
+    upserts one row per user per hour. Counts that fail to reach the database
+    go back into the in-process buffer for the next flush; counts claimed by
+    a process that dies before writing them are lost.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = METERING_FLUSH_INTERVAL,
+        batch_size: int = METERING_FLUSH_BATCH_SIZE,
+        clock=time.time,
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._clock = clock
+        self._buffer: Counts = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def record(self, user_id: int, prompt_tokens: int, completion_tokens: int):
+        """Count one agent request; never raises, metering must not fail the request"""
+        window = int(self._clock()) // WINDOW_SECONDS * WINDOW_SECONDS
+        values = (1, prompt_tokens, completion_tokens)
+        try:
+            redis = redis_manager.get_redis()
+            pipe = redis.pipeline()
+            for field, value in zip(FIELDS, values):
+                pipe.hincrby(PENDING_KEY, f"{user_id}:{window}:{field}", value)
+            await pipe.execute()
+        except Exception as e:
+            if not isinstance(e, RuntimeError):
+                logger.warning(f"Buffering usage in process, Redis write failed: {e}")
+            _add(self._buffer, (user_id, window), values)
+            AGENT_USAGE_BUFFERED.set(len(self._buffer))
+
+    async def _claim_pending(self, counts: Counts):
+        """Move the shared Redis counters into ``counts``"""
+        try:
+            redis = redis_manager.get_redis()
+        except RuntimeError:
+            return
+        claimed = f"agent:usage:flushing:{uuid.uuid4().hex}"
+        try:
+            # RENAME is atomic: increments after this point start a fresh hash
+            await redis.rename(PENDING_KEY, claimed)
+        except ResponseError:
+            return  # Nothing pending
+        try:
+            for field, value in (await redis.hgetall(claimed)).items():
+                user_id, window, name = field.rsplit(":", 2)
+                values = [0, 0, 0]
+                values[FIELDS.index(name)] = int(value)
+                _add(counts, (int(user_id), int(window)), values)
+        finally:
+            await redis.delete(claimed)
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Write all pending counts to the usage table; returns the number of rows upserted"""
+        counts, self._buffer = self._buffer, {}
+        try:
+            await self._claim_pending(counts)
+        except Exception as e:
+            logger.warning(f"Could not claim pending usage from Redis: {e}")
+        if not counts:
+            AGENT_USAGE_BUFFERED.set(0)
+            return 0
+        try:
+            await self._write(db, counts)
+        except Exception as e:
+            await db.rollback()
+            for key, values in counts.items():
+                _add(self._buffer, key, values)
+            AGENT_USAGE_BUFFERED.set(len(self._buffer))
+            AGENT_USAGE_FLUSHES.labels("failed").inc()
+            logger.error(f"Usage flush failed, {len(counts)} rows kept for retry: {e}")
+            return 0
+        AGENT_USAGE_BUFFERED.set(len(self._buffer))
+        AGENT_USAGE_FLUSHES.labels("ok").inc()
+        AGENT_USAGE_ROWS_FLUSHED.inc(len(counts))
+        return len(counts)
+
+    async def _write(self, db: AsyncSession, counts: Counts):
+        # Both dialects spell the upsert the same way; other backends are not supported
+        insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+        rows = [
+            {
+                "user_id": user_id,
+                "window_start": datetime.fromtimestamp(window, tz=timezone.utc),
+                **dict(zip(FIELDS, values)),
+            }
+            for (user_id, window), values in counts.items()
+        ]
+        for i in range(0, len(rows), self.batch_size):
+            stmt = insert(AgentUsage).values(rows[i:i + self.batch_size])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id", "window_start"],
+                set_={field: getattr(AgentUsage, field) + getattr(stmt.excluded, field) for field in FIELDS},
+            )
+            await db.execute(stmt)
+        await db.commit()
+
+    async def _flush_once(self):
+        try:
+            async for db in container.db():
+                await self.flush(db)
+        except Exception as e:
+            logger.error(f"Usage flush error: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_once()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._flush_once()
+
+
+async def usage_for_user(
+    db: AsyncSession, user_id: int, since: datetime, until: datetime, window: str = "hour"
+) -> List[Dict[str, Any]]:
+    """Flushed usage for ``user_id`` in ``[since, until)``, summed per ``hour`` or ``day``"""
+    result = await db.execute(
+        select(AgentUsage)
+        .where(
+            AgentUsage.user_id == user_id,
+            AgentUsage.window_start >= since,
+            AgentUsage.window_start < until,
+        )
+        .order_by(AgentUsage.window_start)
+    )
+    buckets: Dict[datetime, Dict[str, Any]] = {}
+    for row in result.scalars():
+        start = row.window_start
+        if window == "day":
+            start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        bucket = buckets.setdefault(start, {"window_start": start, **{field: 0 for field in FIELDS}})
+        for field in FIELDS:
+            bucket[field] += getattr(row, field)
+    return list(buckets.values())
+
+
+def default_usage_range(days: int = 7) -> Tuple[datetime, datetime]:
+    now = datetime.now(timezone.utc)
+    return now - timedelta(days=days), now + timedelta(hours=1)
+
+
+# Global agent usage meter; the flush loop runs in the app lifespan
+usage_meter = UsageMeter()
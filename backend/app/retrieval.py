@@ -0,0 +1,241 @@
+import os
+import re
+import time
+import zlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.singleflight import SingleFlight
+from app.db.models.expense import Expense
+from app.db.models.mood import Mood
+
+logger = logging.getLogger(__name__)
+
+# Hashed feature dimensions; memory per indexed row is 4 bytes per dimension
+RETRIEVAL_DIM = int(os.getenv("RETRIEVAL_DIM", 512))
+# Records injected into a retrieval prompt
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 8))
+# Users whose index is kept in memory (least recently used are dropped)
+RETRIEVAL_MAX_USERS = int(os.getenv("RETRIEVAL_MAX_USERS", 1000))
+# Indexes are rebuilt from the database after this many seconds, picking up
+# writes handled by other backend processes
+RETRIEVAL_INDEX_TTL = float(os.getenv("RETRIEVAL_INDEX_TTL", 300))
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class HashingVectorizer:
+    """Bag-of-words vectors via the hashing trick; no vocabulary or model to fit.
+
+    Each word, plus its four-letter prefix as a crude stem ("grocery" and
+    "groceries" share "groc"), is hashed into one of ``dim`` buckets with a
+    hash-derived sign so collisions tend to cancel. Vectors are
+    L2-normalized, so a dot product is the cosine similarity.
+    """
+
+    def __init__(self, dim: int = RETRIEVAL_DIM, prefix_weight: float = 0.5):
+        self.dim = dim
+        self.prefix_weight = prefix_weight
+
+    def _features(self, text: str) -> Iterable[Tuple[int, float]]:
+        for word in _WORD.findall(text.lower()):
+            features = [(word, 1.0)]
+            if len(word) > 4:
+                features.append((word[:4] + "*", self.prefix_weight))
+            for feature, weight in features:
+                # crc32 is stable across processes, unlike hash()
+                h = zlib.crc32(feature.encode())
+                yield h % self.dim, weight if h & 0x80000000 else -weight
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """Vectorize ``texts`` into a ``(len(texts), dim)`` float32 matrix of unit rows"""
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            for col, value in self._features(text):
+                rows.append(row)
+                cols.append(col)
+                values.append(value)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (rows, cols), values)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class Match(NamedTuple):
+    key: str
+    text: str
+    score: float
+
+
+class VectorIndex:
+    """Dense in-memory index with brute-force top-k cosine search.
+
+    Rows live in one preallocated matrix that doubles when full; removal
+    moves the last row into the hole, so updates never rebuild the matrix.
+    """
+
+    def __init__(self, vectorizer: Optional[HashingVectorizer] = None, capacity: int = 64):
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self._vectors = np.zeros((capacity, self.vectorizer.dim), dtype=np.float32)
+        self._keys: List[str] = []
+        self._texts: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _reserve(self, size: int):
+        if size > len(self._vectors):
+            capacity = max(size, 2 * len(self._vectors))
+            vectors = np.zeros((capacity, self.vectorizer.dim), dtype=np.float32)
+            vectors[:len(self._keys)] = self._vectors[:len(self._keys)]
+            self._vectors = vectors
+
+    def add_many(self, items: List[Tuple[str, str]]):
+        """Insert or replace ``(key, text)`` pairs, vectorizing them in one pass"""
+        if not items:
+            return
+        vectors = self.vectorizer.transform([text for _, text in items])
+        self._reserve(len(self._keys) + len(items))
+        for (key, text), vector in zip(items, vectors):
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = len(self._keys)
+                self._keys.append(key)
+                self._texts.append(text)
+            else:
+                self._texts[row] = text
+            self._vectors[row] = vector
+
+    def upsert(self, key: str, text: str):
+        self.add_many([(key, text)])
+
+    def remove(self, key: str) -> bool:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        last = len(self._keys) - 1
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._keys[row] = self._keys[last]
+            self._texts[row] = self._texts[last]
+            self._rows[self._keys[row]] = row
+        self._keys.pop()
+        self._texts.pop()
+        return True
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> List[Match]:
+        """The ``k`` entries most similar to ``query``, best first; entries sharing no features are skipped"""
+        size = len(self._keys)
+        if size == 0 or k <= 0:
+            return []
+        scores = self._vectors[:size] @ self.vectorizer.transform([query])[0]
+        k = min(k, size)
+        # argpartition is O(n); only the k winners get sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [Match(self._keys[i], self._texts[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def expense_key(expense_id: int) -> str:
+    return f"expense:{expense_id}"
+
+def mood_key(mood_id: int) -> str:
+    return f"mood:{mood_id}"
+
+def expense_text(expense: Expense) -> str:
+    text = f"Expense {expense.date:%Y-%m-%d}: {expense.title} ({expense.category}) {expense.amount:.2f}"
+    return f"{text}. {expense.description}" if expense.description else text
+
+def mood_text(mood: Mood) -> str:
+    text = f"Mood {mood.date:%Y-%m-%d}: {mood.mood_type or 'unspecified'}, level {mood.mood_level}/10"
+    return f"{text}. {mood.notes}" if mood.notes else text
+
+
+class UserIndexes:
+    """Per-user ``VectorIndex`` over expenses and moods, built lazily from the database.
+
+    The expense and mood endpoints push their writes into a user's index if
+    it is loaded; indexes older than ``ttl`` seconds are rebuilt on next use
+    so writes through other processes show up eventually. At most
+    ``max_users`` indexes are kept, least recently used dropped first.
+    """
+
+    def __init__(
+        self,
+        max_users: int = RETRIEVAL_MAX_USERS,
+        ttl: float = RETRIEVAL_INDEX_TTL,
+        vectorizer: Optional[HashingVectorizer] = None,
+    ):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self._indexes: "OrderedDict[int, Tuple[float, VectorIndex]]" = OrderedDict()
+        # Concurrent first queries for a user share one build
+        self._builds = SingleFlight("retrieval_index")
+
+    def loaded(self, user_id: int) -> Optional[VectorIndex]:
+        entry = self._indexes.get(user_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    async def get(self, db: AsyncSession, user_id: int) -> VectorIndex:
+        index = self.loaded(user_id)
+        if index is None:
+            index = await self._builds.do(str(user_id), lambda: self._build(db, user_id))
+        elif user_id in self._indexes:
+            self._indexes.move_to_end(user_id)
+        return index
+
+    async def _build(self, db: AsyncSession, user_id: int) -> VectorIndex:
+        started = time.perf_counter()
+        expenses = (await db.execute(select(Expense).where(Expense.owner_id == user_id))).scalars().all()
+        moods = (await db.execute(select(Mood).where(Mood.owner_id == user_id))).scalars().all()
+        index = VectorIndex(self.vectorizer, capacity=max(64, len(expenses) + len(moods)))
+        index.add_many(
+            [(expense_key(e.id), expense_text(e)) for e in expenses]
+            + [(mood_key(m.id), mood_text(m)) for m in moods]
+        )
+        self._indexes[user_id] = (time.monotonic(), index)
+        while len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        logger.debug(f"Built retrieval index for user {user_id}: {len(index)} rows in {time.perf_counter() - started:.3f}s")
+        return index
+
+    def upsert_expense(self, expense: Expense):
+        index = self.loaded(expense.owner_id)
+        if index is not None:
+            index.upsert(expense_key(expense.id), expense_text(expense))
+
+    def upsert_mood(self, mood: Mood):
+        index = self.loaded(mood.owner_id)
+        if index is not None:
+            index.upsert(mood_key(mood.id), mood_text(mood))
+
+    def remove(self, user_id: int, key: str):
+        index = self.loaded(user_id)
+        if index is not None:
+            index.remove(key)
+
+
+def build_prompt(question: str, matches: List[Match]) -> str:
+    """Agent prompt carrying only the records retrieved for ``question``"""
+    if not matches:
+        records = "(no matching records)"
+    else:
+        records = "\n".join(f"- {m.text}" for m in matches)
+    return (
+        "Answer the question using only these records from the user's expense and mood history.\n"
+        f"Records:\n{records}\n\nQuestion: {question}\nAnswer:"
+    )
+
+
+# Global per-user retrieval indexes
+user_indexes = UserIndexes()
@@ -0,0 +1,97 @@
+"""Compare agent replica selection strategies on simulated stub replicas.
+
+Each simulated replica serves a few calls at a time with a base latency
+and a queueing delay when overloaded; one replica is degraded (slower and
+with occasional long stalls), like a replica on a noisy host. Runs offline,
+no agent needed:
+
+    python benchmarks/bench_agent_replicas.py --replicas 4 --requests 2000
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.load_balancer import Replica, ReplicaBalancer  # noqa: E402
+
+
+class StubReplica:
+    def __init__(self, base_latency: float, stall_probability: float, stall: float, slots: int):
+        self.base_latency = base_latency
+        self.stall_probability = stall_probability
+        self.stall = stall
+        self.slots = asyncio.Semaphore(slots)
+
+    async def serve(self):
+        async with self.slots:
+            latency = random.expovariate(1 / self.base_latency)
+            if random.random() < self.stall_probability:
+                latency += self.stall
+            await asyncio.sleep(latency)
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(args, strategy: str, hedge_percentile):
+    random.seed(args.seed)
+    stubs = {}
+    replicas = []
+    for i in range(args.replicas):
+        replica = Replica(f"http://agent-{i}/generate")
+        degraded = i == 0
+        stubs[replica.url] = StubReplica(
+            base_latency=args.base_ms / 1000 * (3 if degraded else 1),
+            stall_probability=0.05 if degraded else 0.005,
+            stall=args.stall_ms / 1000,
+            slots=args.slots,
+        )
+        replicas.append(replica)
+    balancer = ReplicaBalancer(replicas, strategy=strategy, hedge_percentile=hedge_percentile)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await balancer.call(lambda replica: stubs[replica.url].serve(), hedge=hedge_percentile is not None)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--slots", type=int, default=4, help="concurrent calls each replica serves")
+    parser.add_argument("--base-ms", type=float, default=10.0)
+    parser.add_argument("--stall-ms", type=float, default=200.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for label, strategy, hedge in (
+        ("random", "random", None),
+        ("least-outstanding", "least_outstanding", None),
+        ("ewma", "ewma", None),
+        ("ewma + hedge p95", "ewma", 95.0),
+    ):
+        latencies = await run(args, strategy, hedge)
+        print(
+            f"{label:>18}: p50 {statistics.median(latencies) * 1000:7.1f}ms "
+            f"p99 {percentile(latencies, 99) * 1000:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
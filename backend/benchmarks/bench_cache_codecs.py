@@ -0,0 +1,107 @@
+"""Compare cache codecs and compression on payloads shaped like real responses.
+
+For each payload (a single expense, expense histories of ``--rows`` and
+10x ``--rows`` entries, a mood history) reports the stored size and the mean
+encode and decode time of every codec/compression combination. Runs offline,
+no Redis needed:
+
+    python benchmarks/bench_cache_codecs.py --rows 1000 --repeat 50
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.cache_codecs import CODECS, COMPRESSIONS, CacheSerializer, zstandard  # noqa: E402
+
+TITLES = ["Groceries", "Coffee", "Rent", "Taxi", "Cinema", "Pharmacy", "Gym", "Sushi", "Books", "Electricity"]
+CATEGORIES = ["food", "housing", "transport", "entertainment", "health", "utilities"]
+MOODS = ["happy", "sad", "anxious", "calm", "tired", "stressed", "excited"]
+NOTES = ["deadline at work", "long walk", "argument with friend", "slept badly", "family dinner", "payday", None]
+
+
+def expenses(n: int, rng: random.Random):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(n):
+        when = start + timedelta(minutes=rng.randrange(60 * 24 * 365))
+        rows.append({
+            "id": i + 1,
+            "title": rng.choice(TITLES),
+            "amount": round(rng.uniform(1, 500), 2),
+            "category": rng.choice(CATEGORIES),
+            "description": rng.choice(NOTES),
+            "date": when.isoformat(),
+            "created_at": when.isoformat(),
+            "updated_at": None,
+            "owner_id": 42,
+        })
+    return rows
+
+
+def moods(n: int, rng: random.Random):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": i + 1,
+            "mood_level": rng.randint(1, 10),
+            "mood_type": rng.choice(MOODS),
+            "notes": rng.choice(NOTES),
+            "date": (start + timedelta(days=i)).isoformat(),
+            "created_at": (start + timedelta(days=i)).isoformat(),
+            "owner_id": 42,
+        }
+        for i in range(n)
+    ]
+
+
+def mean_ms(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--compress-min-bytes", type=int, default=1024)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    payloads = {
+        "1 expense": expenses(1, rng)[0],
+        f"{args.rows} expenses": expenses(args.rows, rng),
+        f"{args.rows * 10} expenses": expenses(args.rows * 10, rng),
+        f"{args.rows} moods": moods(args.rows, rng),
+    }
+    compressions = [None] + [name for name in COMPRESSIONS if name != "zstd" or zstandard is not None]
+    if zstandard is None:
+        print("zstandard not installed; skipping zstd\n")
+
+    print(f"{'payload':>16} {'codec':>8} {'compress':>8} {'bytes':>10} {'ratio':>6} {'encode ms':>10} {'decode ms':>10}")
+    for label, value in payloads.items():
+        baseline = None
+        for codec in CODECS:
+            for compression in compressions:
+                serializer = CacheSerializer(codec, compression, args.compress_min_bytes)
+                payload = serializer.encode(value)
+                assert serializer.decode(payload) == value
+                baseline = baseline or len(payload)
+                print(
+                    f"{label:>16} {codec:>8} {compression or '-':>8} {len(payload):10d} "
+                    f"{len(payload) / baseline:6.2f} "
+                    f"{mean_ms(lambda: serializer.encode(value), args.repeat):10.3f} "
+                    f"{mean_ms(lambda: serializer.decode(payload), args.repeat):10.3f}"
+                )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare pattern-based and tag-based cache invalidation on a large keyspace.
+
+Fills Redis with ``--keys`` cached entries spread over ``--users`` users,
+then invalidates one user's entries with KEYS, with SCAN (the current
+``clear_pattern``) and with ``invalidate_tags``. KEYS is a single call and
+can look quick, but it blocks every other Redis client while it walks the
+keyspace; SCAN does not block but pays a round trip per batch. Uses an in-memory fakeredis
+unless ``--redis-url`` points at a real (scratch!) Redis:
+
+    python benchmarks/bench_cache_invalidation.py --keys 200000 --users 1000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis.asyncio as aioredis  # noqa: E402
+
+from app.core.cache import CacheManager  # noqa: E402
+from app.core.redis import redis_manager  # noqa: E402
+
+
+async def fill(cache: CacheManager, redis, keys: int, users: int):
+    pipe = redis.pipeline(transaction=False)
+    for i in range(keys):
+        user = i % users
+        # Key names embed the user id so the pattern variants have something to match
+        pipe.set(f"bench:user{user}:{i}", "{}", ex=3600)
+        if len(pipe) >= 5000:
+            await pipe.execute()
+    await pipe.execute()
+    for i in range(0, keys, users):
+        await cache.set(f"bench:user0:{i}", {}, ttl=3600, tags=["user:0"])
+
+
+async def timed(label: str, coro):
+    started = time.perf_counter()
+    deleted = await coro
+    print(f"{label:>16}: {deleted:6d} keys in {(time.perf_counter() - started) * 1000:8.1f}ms")
+
+
+async def keys_then_delete(redis, pattern: str) -> int:
+    keys = await redis.keys(pattern)
+    return await redis.delete(*keys) if keys else 0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--redis-url", help="scratch Redis to use; it is flushed")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        redis = aioredis.from_url(args.redis_url, decode_responses=True)
+        await redis.flushdb()
+    else:
+        import fakeredis
+
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_manager.redis = redis
+    cache = CacheManager()
+
+    for label, run in (
+        ("KEYS", lambda: keys_then_delete(redis, "bench:user0:*")),
+        ("SCAN pattern", lambda: cache.clear_pattern("bench:user0:*")),
+        ("tag index", lambda: cache.invalidate_tags("user:0")),
+    ):
+        await fill(cache, redis, args.keys, args.users)
+        await timed(label, run())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""Measure retrieval index build, update and query latency on synthetic rows.
+
+Rows look like the text indexed for real expenses and moods. Runs offline,
+no database needed:
+
+    python benchmarks/bench_retrieval.py --rows 100000 --queries 500
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.retrieval import HashingVectorizer, VectorIndex  # noqa: E402
+
+TITLES = ["Groceries", "Coffee", "Rent", "Taxi", "Cinema", "Pharmacy", "Gym", "Sushi", "Books", "Electricity"]
+CATEGORIES = ["food", "housing", "transport", "entertainment", "health", "utilities"]
+MOODS = ["happy", "sad", "anxious", "calm", "tired", "stressed", "excited"]
+NOTES = ["deadline at work", "long walk", "argument with friend", "slept badly", "family dinner", "payday"]
+QUERIES = [
+    "how much did I spend on food when I was anxious",
+    "taxi rides last month",
+    "days I felt stressed about work",
+    "entertainment spending",
+    "pharmacy and health costs when tired",
+]
+
+
+def synthetic_rows(count: int):
+    for i in range(count):
+        day = f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}"
+        if i % 3:
+            title = random.choice(TITLES)
+            text = f"Expense {day}: {title} ({random.choice(CATEGORIES)}) {random.uniform(1, 500):.2f}"
+            yield f"expense:{i}", text
+        else:
+            text = f"Mood {day}: {random.choice(MOODS)}, level {random.randint(1, 10)}/10. {random.choice(NOTES)}"
+            yield f"mood:{i}", text
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    rows = list(synthetic_rows(args.rows))
+    index = VectorIndex(HashingVectorizer(args.dim), capacity=args.rows)
+    started = time.perf_counter()
+    index.add_many(rows)
+    build = time.perf_counter() - started
+    print(f"build: {args.rows} rows in {build:.2f}s ({args.rows / build:,.0f} rows/s), "
+          f"{index._vectors.nbytes / 2**20:.0f} MiB of vectors")
+
+    updates = []
+    for key, text in random.sample(rows, args.updates):
+        started = time.perf_counter()
+        index.upsert(key, text + " updated")
+        updates.append(time.perf_counter() - started)
+    print(f"upsert: p50 {statistics.median(updates) * 1e6:.0f}us p99 {percentile(updates, 99) * 1e6:.0f}us")
+
+    latencies = []
+    for i in range(args.queries):
+        started = time.perf_counter()
+        index.search(QUERIES[i % len(QUERIES)], args.k)
+        latencies.append(time.perf_counter() - started)
+    print(f"query (k={args.k}): p50 {statistics.median(latencies) * 1000:.2f}ms "
+          f"p99 {percentile(latencies, 99) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
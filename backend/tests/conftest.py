@@ -1,3 +1,4 @@
+import fakeredis
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
@@ -7,6 +8,7 @@ from app.main import app
 from app.core.config import settings
 from app.db.base import Base
 from app.containers import Container
+from app.core.redis import redis_manager
 import os
 
 # Use a test database URL
@@ -45,3 +47,23 @@ async def client_fixture(override_get_db):
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
     app.container.db.reset_override()
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """In-memory Redis in place of the real connection"""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_manager, "redis", client)
+    return client
+
+class FakeClock:
+    """Monotonic clock that only moves when a test sets ``now``"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
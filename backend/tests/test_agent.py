@@ -1,3 +1,5 @@
+import json
+import asyncio
 import pytest
 from httpx import AsyncClient
 from app.main import app
@@ -13,7 +15,7 @@ async def test_agent_health():
 
 @pytest.mark.asyncio
 async def test_gpt_oss_agent(monkeypatch):
-    async def mock_generate_text(prompt: str) -> str:
+    async def mock_generate_text(prompt: str, deadline=None, tenant=None) -> str:
         return f"Echo: {prompt}"
 
     from app.api.api_v1.endpoints import agent
@@ -56,7 +58,7 @@ async def test_gpt_oss_agent(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_gpt_oss_agent_error(monkeypatch):
-    async def mock_generate_text(prompt: str) -> str:
+    async def mock_generate_text(prompt: str, deadline=None, tenant=None) -> str:
         raise Exception("Agent error!")
 
     from app.api.api_v1.endpoints import agent
@@ -66,3 +68,120 @@ async def test_gpt_oss_agent_error(monkeypatch):
         resp = await ac.post("/api/v1/agent/gpt-oss", json={"prompt": "fail"})
         assert resp.status_code == 500
         assert resp.json()["detail"] == "Internal Server Error"
+
+
+@pytest.mark.asyncio
+async def test_gpt_oss_agent_forwards_client_deadline(monkeypatch):
+    import time
+    from app import ai_client
+    from app.api.api_v1.endpoints import agent
+
+    deadlines = []
+
+    async def mock_generate_text(prompt: str, deadline=None, tenant=None) -> str:
+        deadlines.append(deadline - time.monotonic())
+        raise ai_client.DeadlineExceeded("too late")
+
+    monkeypatch.setattr(agent, "generate_text", mock_generate_text)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post(
+            "/api/v1/agent/gpt-oss",
+            json={"prompt": "hurry"},
+            headers={"X-Forwarded-For": "203.0.113.3", "X-Request-Deadline-Ms": "500"},
+        )
+        assert resp.status_code == 504
+        assert 0 < deadlines[0] <= 0.5
+
+
+@pytest.mark.asyncio
+async def test_gpt_oss_agent_stream(monkeypatch):
+    async def mock_generate_text_stream(prompt: str, deadline=None, tenant=None):
+        for token in ["Echo:", f" {prompt}"]:
+            yield token
+
+    from app.api.api_v1.endpoints import agent
+    monkeypatch.setattr(agent, "generate_text_stream", mock_generate_text_stream)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post(
+            "/api/v1/agent/gpt-oss/stream",
+            json={"prompt": "hello"},
+            headers={"X-Forwarded-For": "203.0.113.2"}
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert lines == [{"token": "Echo:"}, {"token": " hello"}, {"done": True}]
+
+
+@pytest.mark.asyncio
+async def test_gpt_oss_agent_stream_error(monkeypatch):
+    async def mock_generate_text_stream(prompt: str, deadline=None, tenant=None):
+        raise Exception("Agent error!")
+        yield
+
+    from app.api.api_v1.endpoints import agent
+    monkeypatch.setattr(agent, "generate_text_stream", mock_generate_text_stream)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post(
+            "/api/v1/agent/gpt-oss/stream",
+            json={"prompt": "fail"},
+            headers={"X-Forwarded-For": "203.0.113.2"}
+        )
+        assert resp.status_code == 500
+        assert resp.json()["detail"] == "Internal Server Error"
+
+
+@pytest.mark.asyncio
+async def test_gpt_oss_agent_stream_client_leaving_before_first_token(monkeypatch):
+    from app.api.api_v1.endpoints import agent
+
+    monkeypatch.setattr(agent, "DISCONNECT_POLL_INTERVAL", 0.01)
+    upstream_closed = asyncio.Event()
+
+    async def mock_generate_text_stream(prompt: str, deadline=None, tenant=None):
+        try:
+            await asyncio.sleep(10)
+            yield "too late"
+        finally:
+            upstream_closed.set()
+
+    async def is_disconnected(self):
+        return True
+
+    monkeypatch.setattr(agent, "generate_text_stream", mock_generate_text_stream)
+    monkeypatch.setattr(agent.Request, "is_disconnected", is_disconnected)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post(
+            "/api/v1/agent/gpt-oss/stream",
+            json={"prompt": "gone"},
+            headers={"X-Forwarded-For": "203.0.113.11"}
+        )
+        assert resp.status_code == 499
+    await asyncio.wait_for(upstream_closed.wait(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_disconnect_cancels_upstream_call(monkeypatch):
+    from app.api.api_v1.endpoints import agent
+
+    monkeypatch.setattr(agent, "DISCONNECT_POLL_INTERVAL", 0.01)
+    upstream_cancelled = asyncio.Event()
+
+    async def slow_generate():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            upstream_cancelled.set()
+            raise
+
+    class DisconnectedRequest:
+        async def is_disconnected(self):
+            return True
+
+    with pytest.raises(agent.ClientDisconnected):
+        await agent.cancel_on_disconnect(DisconnectedRequest(), slow_generate())
+    await asyncio.wait_for(upstream_cancelled.wait(), timeout=1)
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app import agent_jobs
+from app.core.redis import redis_manager
+from app.main import app
+
+
+@pytest.mark.asyncio
+async def test_job_is_generated_in_background_and_long_polled(monkeypatch, fake_redis):
+    async def mock_generate_text(prompt, deadline=None, tenant=None):
+        await asyncio.sleep(0.05)
+        return f"Echo: {prompt}"
+
+    monkeypatch.setattr(agent_jobs, "generate_text", mock_generate_text)
+    workers = agent_jobs.AgentJobWorkers(concurrency=1)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post(
+            "/api/v1/agent/gpt-oss/jobs",
+            json={"prompt": "later"},
+            headers={"X-Forwarded-For": "203.0.113.4"},
+        )
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+
+        resp = await ac.get(f"/api/v1/agent/gpt-oss/jobs/{job_id}", headers={"X-Forwarded-For": "203.0.113.4"})
+        assert resp.json()["status"] == "queued"
+
+        workers.start()
+        try:
+            resp = await ac.get(
+                f"/api/v1/agent/gpt-oss/jobs/{job_id}/wait",
+                params={"timeout": 5},
+                headers={"X-Forwarded-For": "203.0.113.4"},
+            )
+        finally:
+            await workers.stop()
+        assert resp.json() == {"job_id": job_id, "status": "succeeded", "text": "Echo: later", "error": None}
+
+        resp = await ac.get("/api/v1/agent/gpt-oss/jobs/unknown")
+        assert resp.status_code == 404
+
+        # Another caller cannot read or wait on the job
+        other = {"X-Forwarded-For": "203.0.113.10"}
+        resp = await ac.get(f"/api/v1/agent/gpt-oss/jobs/{job_id}", headers=other)
+        assert resp.status_code == 404
+        resp = await ac.get(f"/api/v1/agent/gpt-oss/jobs/{job_id}/wait", params={"timeout": 0}, headers=other)
+        assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_marks_job_failed(monkeypatch, fake_redis):
+    async def mock_generate_text(prompt, deadline=None, tenant=None):
+        raise RuntimeError("agent unavailable")
+
+    monkeypatch.setattr(agent_jobs, "generate_text", mock_generate_text)
+    job_id = await agent_jobs.submit_job("boom", "ip:203.0.113.4")
+    task = await agent_jobs.Queues.agent_queue.dequeue(timeout=1)
+
+    with pytest.raises(RuntimeError):
+        await agent_jobs.generate_text_handler(task["data"])
+    job = await agent_jobs.get_job(job_id, "ip:203.0.113.4")
+    assert job["status"] == "failed"
+    assert job["error"] == "agent unavailable"
+
+
+@pytest.mark.asyncio
+async def test_job_endpoints_need_redis(monkeypatch):
+    monkeypatch.setattr(redis_manager, "redis", None)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post(
+            "/api/v1/agent/gpt-oss/jobs",
+            json={"prompt": "later"},
+            headers={"X-Forwarded-For": "203.0.113.5"},
+        )
+        assert resp.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_are_metered_against_their_user(monkeypatch, fake_redis):
+    recorded = []
+
+    async def mock_generate_text(prompt, deadline=None, tenant=None):
+        return "four words of reply"
+
+    async def mock_record(user_id, prompt_tokens, completion_tokens):
+        recorded.append((user_id, prompt_tokens, completion_tokens))
+
+    monkeypatch.setattr(agent_jobs, "generate_text", mock_generate_text)
+    monkeypatch.setattr(agent_jobs.usage_meter, "record", mock_record)
+    for user_id in (7, None):
+        await agent_jobs.submit_job("count me", f"user:{user_id}", user_id)
+        task = await agent_jobs.Queues.agent_queue.dequeue(timeout=1)
+        await agent_jobs.generate_text_handler(task["data"])
+
+    # Anonymous jobs are not metered
+    assert recorded == [(7, agent_jobs.estimate_tokens("count me"), agent_jobs.estimate_tokens("four words of reply"))]
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_dequeued_oldest_first(fake_redis):
+    job_ids = [await agent_jobs.submit_job(f"job {i}", "ip:203.0.113.4") for i in range(3)]
+    dequeued = [
+        (await agent_jobs.Queues.agent_queue.dequeue(timeout=1))["data"]["payload"]["job_id"]
+        for _ in job_ids
+    ]
+    assert dequeued == job_ids
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app import agent_sessions
+from app.core.redis import redis_manager
+from app.main import app
+
+
+@pytest.mark.asyncio
+async def test_session_turns_send_history_upstream(monkeypatch, fake_redis):
+    prompts = []
+
+    async def mock_generate_text(prompt, deadline=None, tenant=None):
+        prompts.append(prompt)
+        return f"reply {len(prompts)}"
+
+    monkeypatch.setattr(agent_sessions, "generate_text", mock_generate_text)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        headers = {"X-Forwarded-For": "203.0.113.6"}
+        resp = await ac.post("/api/v1/agent/gpt-oss/sessions", headers=headers)
+        assert resp.status_code == 201
+        session_id = resp.json()["session_id"]
+
+        for message in ("my budget is 300", "what is my budget?"):
+            resp = await ac.post(
+                f"/api/v1/agent/gpt-oss/sessions/{session_id}/messages",
+                json={"prompt": message},
+                headers=headers,
+            )
+            assert resp.status_code == 200
+        assert resp.json() == {"text": "reply 2"}
+        assert "User: my budget is 300\nAssistant: reply 1\nUser: what is my budget?" in prompts[1]
+
+        resp = await ac.get(f"/api/v1/agent/gpt-oss/sessions/{session_id}", headers=headers)
+        assert [t["text"] for t in resp.json()["turns"]] == [
+            "my budget is 300", "reply 1", "what is my budget?", "reply 2"
+        ]
+
+        # Someone else who learns the session id sees nothing and changes nothing
+        other = {"X-Forwarded-For": "203.0.113.9"}
+        url = f"/api/v1/agent/gpt-oss/sessions/{session_id}"
+        assert (await ac.get(url, headers=other)).status_code == 404
+        assert (await ac.post(f"{url}/messages", json={"prompt": "hi"}, headers=other)).status_code == 404
+        assert (await ac.delete(url, headers=other)).status_code == 404
+        assert len(prompts) == 2
+
+        assert (await ac.delete(url, headers=headers)).status_code == 204
+        resp = await ac.post(
+            f"/api/v1/agent/gpt-oss/sessions/{session_id}/messages",
+            json={"prompt": "still there?"},
+            headers=headers,
+        )
+        assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_history_over_budget_is_compacted_into_summary(monkeypatch):
+    monkeypatch.setattr(redis_manager, "redis", None)  # In-memory fallback
+    prompts = []
+
+    tenants = []
+
+    async def mock_generate_text(prompt, deadline=None, tenant=None):
+        prompts.append(prompt)
+        tenants.append((prompt.split(" ")[0], tenant))
+        if prompt.startswith("Summarize"):
+            return "User is planning a trip."
+        return "x" * 400
+
+    recorded = []
+
+    async def mock_record(user_id, prompt_tokens, completion_tokens):
+        recorded.append((user_id, prompt_tokens, completion_tokens))
+
+    monkeypatch.setattr(agent_sessions, "generate_text", mock_generate_text)
+    monkeypatch.setattr(agent_sessions.usage_meter, "record", mock_record)
+    sessions = agent_sessions.AgentSessions(context_tokens=200, keep_turns=2)
+    session_id = await sessions.create("ip:203.0.113.7")
+
+    for i in range(3):
+        await sessions.send(session_id, "ip:203.0.113.7", f"turn {i}", tenant="ip:203.0.113.7", user_id=7)
+    # Compaction runs in the background once the history is over budget
+    await asyncio.gather(*sessions._compactions)
+
+    session = await sessions.get(session_id, "ip:203.0.113.7")
+    assert session["summary"] == "User is planning a trip."
+    assert [t["text"] for t in session["turns"]] == ["turn 2", "x" * 400]
+
+    await sessions.send(session_id, "ip:203.0.113.7", "next")
+    assert prompts[-1].startswith("Summary of the conversation so far:\nUser is planning a trip.")
+    assert "turn 0" not in prompts[-1]
+    assert agent_sessions.estimate_tokens(prompts[-1]) <= 200 + 20
+    # Compaction was attributed to the tenant whose turn triggered it
+    assert ("Summarize", "ip:203.0.113.7") in tenants
+    # Usage counts whole upstream prompts, compaction included; the last send had no user
+    estimate = agent_sessions.estimate_tokens
+    assert len(recorded) == len(prompts) - 1
+    assert all(
+        (7, estimate(prompt), estimate("User is planning a trip." if prompt.startswith("Summarize") else "x" * 400))
+        in recorded
+        for prompt in prompts[:-1]
+    )
+    # Locks are not kept for sessions nobody is using
+    assert len(sessions._locks) == 0
+
+
+def test_build_prompt_trims_oldest_turns_to_budget():
+    session = {
+        "summary": "",
+        "turns": [{"role": "user", "text": "a" * 400}, {"role": "assistant", "text": "b" * 40}],
+    }
+    prompt = agent_sessions.build_prompt(session, "hi", budget=50)
+    assert "a" * 400 not in prompt
+    assert prompt.endswith("Assistant: " + "b" * 40 + "\nUser: hi\nAssistant:")
@@ -0,0 +1,146 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from app import ai_client
+
+
+@pytest.mark.asyncio
+async def test_generate_text_coalesces_identical_prompts(monkeypatch):
+    calls = []
+
+    async def mock_request_text(prompt: str, deadline: float, tenant=None) -> str:
+        calls.append(prompt)
+        await asyncio.sleep(0.01)
+        return f"Echo: {prompt}"
+
+    monkeypatch.setattr(ai_client, "_request_text", mock_request_text)
+
+    results = await asyncio.gather(
+        *(ai_client.generate_text("same") for _ in range(5)),
+        ai_client.generate_text("other"),
+    )
+
+    assert results == ["Echo: same"] * 5 + ["Echo: other"]
+    assert sorted(calls) == ["other", "same"]
+
+
+@pytest.mark.asyncio
+async def test_generate_text_flights_are_per_tenant(monkeypatch):
+    calls = []
+
+    async def mock_request_text(prompt: str, deadline: float, tenant=None) -> str:
+        calls.append(tenant)
+        await asyncio.sleep(0.01)
+        return f"{tenant}: {prompt}"
+
+    monkeypatch.setattr(ai_client, "_request_text", mock_request_text)
+
+    results = await asyncio.gather(
+        ai_client.generate_text("same", tenant="user:1"),
+        ai_client.generate_text("same", tenant="user:1"),
+        ai_client.generate_text("same", tenant="user:2"),
+    )
+
+    assert results == ["user:1: same", "user:1: same", "user:2: same"]
+    assert sorted(calls) == ["user:1", "user:2"]
+
+
+@pytest.mark.asyncio
+async def test_follower_retries_when_the_leader_runs_out_of_time(monkeypatch):
+    calls = []
+
+    async def mock_request_text(prompt: str, deadline: float, tenant=None) -> str:
+        calls.append(deadline)
+        await asyncio.sleep(0.02)
+        if time.monotonic() >= deadline:
+            raise ai_client.DeadlineExceeded("Deadline passed")
+        return "ok"
+
+    monkeypatch.setattr(ai_client, "_request_text", mock_request_text)
+
+    leader, follower = await asyncio.gather(
+        ai_client.generate_text("slow", deadline=time.monotonic() + 0.01),
+        ai_client.generate_text("slow", deadline=time.monotonic() + 5),
+        return_exceptions=True,
+    )
+
+    # The leader's own deadline error is final; the follower gets a call of its own
+    assert isinstance(leader, ai_client.DeadlineExceeded)
+    assert follower == "ok"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_generate_text_batch_chunks_and_keeps_order(monkeypatch):
+    chunks = []
+    in_flight = 0
+    peak = 0
+
+    async def mock_request_batch(prompts, deadline, tenant=None):
+        nonlocal in_flight, peak
+        chunks.append(prompts)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if "p5" in prompts:
+            raise RuntimeError("agent unavailable")
+        return [{"text": f"Echo: {p}", "error": None} for p in prompts]
+
+    monkeypatch.setattr(ai_client, "_request_batch", mock_request_batch)
+
+    prompts = [f"p{i}" for i in range(10)]
+    results = await ai_client.generate_text_batch(prompts, chunk_size=3, max_concurrency=2)
+
+    assert [len(c) for c in chunks] == [3, 3, 3, 1]
+    assert peak == 2
+    assert [r["text"] for r in results[:3]] == ["Echo: p0", "Echo: p1", "Echo: p2"]
+    assert all(r["error"] == "agent unavailable" for r in results[3:6])
+    assert results[9] == {"text": "Echo: p9", "error": None}
+
+
+@pytest.mark.asyncio
+async def test_generate_text_batch_gives_each_chunk_its_own_deadline(monkeypatch):
+    deadlines = []
+
+    async def mock_request_batch(prompts, deadline, tenant=None):
+        deadlines.append(deadline)
+        await asyncio.sleep(0.02)
+        return [{"text": p, "error": None} for p in prompts]
+
+    monkeypatch.setattr(ai_client, "_request_batch", mock_request_batch)
+
+    await ai_client.generate_text_batch(["a", "b"], chunk_size=1, max_concurrency=1)
+    # The second chunk's budget starts when it does, not when the call did
+    assert deadlines[1] - deadlines[0] >= 0.02
+
+    deadlines.clear()
+    shared = time.monotonic() + 5
+    await ai_client.generate_text_batch(["a", "b"], chunk_size=1, max_concurrency=1, deadline=shared)
+    assert deadlines == [shared, shared]
+
+
+@pytest.mark.asyncio
+async def test_request_text_forwards_budget_and_tenant(monkeypatch):
+    budgets = []
+
+    def handler(request):
+        budgets.append(int(request.headers[ai_client.DEADLINE_HEADER]))
+        assert request.headers[ai_client.TENANT_HEADER] == "198.51.100.7"
+        assert request.headers[ai_client.PRIORITY_HEADER] == "interactive"
+        return httpx.Response(200, json={"text": "ok"})
+
+    monkeypatch.setattr(
+        ai_client.http_client_manager, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+    assert await ai_client._request_text("hi", time.monotonic() + 2, "198.51.100.7") == "ok"
+    assert 1500 < budgets[0] <= 2000 - ai_client.GPT_AGENT_DEADLINE_MARGIN_MS
+
+    # Nothing is sent once the budget is gone
+    with pytest.raises(ai_client.DeadlineExceeded):
+        await ai_client._request_text("hi", time.monotonic() - 1)
+    assert len(budgets) == 1
@@ -0,0 +1,236 @@
+import asyncio
+
+import pytest
+
+from app.core import cache as cache_module
+from app.core.cache import CacheManager, LocalCache
+
+
+def test_local_cache_is_bounded_by_entries_and_bytes():
+    l1 = LocalCache(max_entries=2, max_bytes=100, ttl=60)
+    l1.set("a", 1, size=10)
+    l1.set("b", 2, size=10)
+    l1.get("a")  # "b" is now least recently used
+    l1.set("c", 3, size=10)
+    assert l1.get("b") is None and l1.get("a") == 1
+
+    l1.set("big", 4, size=95)
+    assert len(l1) == 1 and l1.bytes == 95
+    l1.set("huge", 5, size=500)  # Larger than the whole cache: not kept
+    assert l1.get("huge") is None
+
+    l1.set("short", 6, size=1, ttl=0)
+    assert l1.get("short") is None
+
+
+@pytest.mark.asyncio
+async def test_l1_serves_hot_keys_and_reports_tiers_separately(fake_redis):
+    cache = CacheManager(l1_max_entries=10, l1_ttl=60)
+    await fake_redis.set("k", '{"v": 1}')
+
+    assert await cache.get("k") == {"v": 1}  # L1 miss, L2 hit
+    await fake_redis.set("k", '{"v": 2}')
+    assert await cache.get("k") == {"v": 1}  # L1 hit, Redis not consulted
+    assert await cache.get("missing") is None
+
+    stats = cache.stats()
+    assert (stats["l1_hit"], stats["l1_miss"], stats["l2_hit"], stats["l2_miss"]) == (1, 2, 1, 1)
+    assert stats["l1_hit_rate"] == 1 / 3 and stats["l2_hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_other_workers_l1(fake_redis):
+    worker_a = CacheManager(l1_max_entries=10, l1_ttl=60)
+    worker_b = CacheManager(l1_max_entries=10, l1_ttl=60)
+    listener = asyncio.create_task(worker_b.listen_for_invalidations())
+    await asyncio.sleep(0.05)
+    try:
+        await worker_a.set("k", {"v": 1})
+        assert await worker_b.get("k") == {"v": 1}
+
+        await worker_a.set("k", {"v": 2})
+        await asyncio.sleep(0.05)
+        assert await worker_b.get("k") == {"v": 2}
+        assert await worker_a.get("k") == {"v": 2}  # The writer's own L1 was updated, not dropped
+
+        await worker_a.delete("k")
+        await asyncio.sleep(0.05)
+        assert await worker_b.get("k") is None
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_invalidate_tags_deletes_only_tagged_keys(fake_redis, monkeypatch):
+    monkeypatch.setattr("app.core.cache.DELETE_CHUNK_SIZE", 3)
+    cache = CacheManager()
+    for i in range(7):
+        await cache.set(f"k{i}", i, ttl=60, tags=["user:1", "expenses"] if i < 5 else ["user:2"])
+
+    assert await cache.invalidate_tags("user:1") == 5
+    assert [await cache.get(f"k{i}") for i in range(7)] == [None] * 5 + [5, 6]
+    assert await fake_redis.exists("cache:tag:user:1") == 0
+    # Keys already gone are skipped when another of their tags is invalidated
+    assert await cache.invalidate_tags("expenses") == 0
+
+
+@pytest.mark.asyncio
+async def test_tag_index_outlives_its_longest_member(fake_redis):
+    cache = CacheManager()
+    await cache.set("long", 1, ttl=600, tags=["t"])
+    await cache.set("short", 2, ttl=10, tags=["t"])
+    assert await fake_redis.ttl("cache:tag:t") == 600
+
+
+@pytest.mark.asyncio
+async def test_cache_user_data_is_invalidated_per_user(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache_module, "cache_manager", CacheManager())
+    calls = []
+
+    @cache_module.cache_user_data(ttl=60)
+    async def load(user_id: int, page: int):
+        calls.append((user_id, page))
+        return {"user": user_id, "page": page}
+
+    for user_id in (1, 1, 2):
+        await load(user_id, 0)
+    assert calls == [(1, 0), (2, 0)]
+    await cache_module.UserCache.invalidate_user_cache(1)
+    for user_id in (1, 2):
+        await load(user_id, 0)
+    assert calls == [(1, 0), (2, 0), (1, 0)]
+
+
+@pytest.mark.asyncio
+async def test_versioned_keys_change_when_a_tag_is_invalidated(fake_redis):
+    cache = CacheManager()
+    before = await cache.versioned_key("k", ["user:1"])
+    await cache.invalidate_tags("user:1")
+    assert await cache.versioned_key("k", ["user:1"]) != before
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_compute_once(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache_module, "cache_manager", CacheManager())
+    calls = 0
+
+    @cache_module.cache_response(prefix="stampede", ttl=60, lock_timeout=1)
+    async def load(key: str):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return {"key": key}
+
+    results = await asyncio.gather(*(load("a") for _ in range(20)))
+    assert calls == 1 and results == [{"key": "a"}] * 20
+    assert not await fake_redis.keys("*:lock")  # Lock released after the write
+
+
+@pytest.mark.asyncio
+async def test_expired_value_is_served_stale_while_one_refresh_runs(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache_module, "cache_manager", CacheManager())
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    version = 0
+
+    @cache_module.cache_response(prefix="swr", ttl=10, stale_ttl=30)
+    async def load():
+        nonlocal version
+        version += 1
+        await asyncio.sleep(0.02)
+        return version
+
+    assert await load() == 1
+    now[0] += 15  # Past ttl, inside the stale window
+    assert await asyncio.gather(*(load() for _ in range(5))) == [1] * 5
+    await asyncio.gather(*cache_module._background_refreshes)
+    assert version == 2 and await load() == 2
+
+    now[0] += 100  # Past the stale window too: a plain miss
+    assert await load() == 3
+
+
+@pytest.mark.asyncio
+async def test_early_expiration_refreshes_before_the_value_expires(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache_module, "cache_manager", CacheManager())
+    version = 0
+
+    @cache_module.cache_response(prefix="xfetch", ttl=60, early_expiration=1e6)
+    async def load():
+        nonlocal version
+        version += 1
+        await asyncio.sleep(0.01)
+        return version
+
+    assert await load() == 1
+    # A huge beta makes every hit roll an early refresh, but only one runs at a time
+    assert await asyncio.gather(*(load() for _ in range(5))) == [1] * 5
+    await asyncio.gather(*cache_module._background_refreshes)
+    assert version == 2 and await load() == 2
+
+
+@pytest.mark.asyncio
+async def test_many_operations_round_trip_with_tags(fake_redis):
+    cache = CacheManager(l1_max_entries=10, l1_ttl=60)
+    assert await cache.set_many({"a": 1, "b": [2], "c": {"v": 3}}, ttl=60, tags={"a": ["t"], "b": ["t"]})
+    await fake_redis.delete("c")  # Still in this worker's L1
+    assert await cache.get_many(["a", "b", "c", "missing", "a"]) == {"a": 1, "b": [2], "c": {"v": 3}}
+    assert await fake_redis.ttl("b") == 60
+
+    assert await CacheManager().get_many(["a", "c"]) == {"a": 1}
+    assert await cache.delete_many(["a", "missing"]) == 1
+    assert await cache.get_many(["a", "b"]) == {"b": [2]}
+    assert await cache.invalidate_tags("t") == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_decorator_computes_only_misses_and_shares_entries(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache_module, "cache_manager", CacheManager())
+    batches = []
+
+    @cache_module.cache_response_batch(prefix="square", ttl=60, tags=lambda n: [f"n:{n}"])
+    async def squares(arg_tuples):
+        batches.append([n for (n,) in arg_tuples])
+        return [n * n for (n,) in arg_tuples]
+
+    @cache_module.cache_response(prefix="square", ttl=60)
+    async def square(n):
+        return -1  # Never called: the batch already cached n=3
+
+    assert await squares([(1,), (2,), (1,)]) == [1, 4, 1]
+    assert await squares([(2,), (3,), (1,)]) == [4, 9, 1]
+    assert batches == [[1, 2], [3]]
+    assert await square(3) == 9
+
+    await cache_module.cache_manager.invalidate_tags("n:2")
+    assert await squares([(1,), (2,)]) == [1, 4]
+    assert batches[-1] == [2]
+
+
+@pytest.mark.asyncio
+async def test_miss_never_joins_a_refresh_that_lost_the_lock(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache_module, "cache_manager", CacheManager())
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+
+    @cache_module.cache_response(prefix="lost", ttl=10, stale_ttl=30, lock_timeout=0.2)
+    async def load():
+        await asyncio.sleep(0.02)
+        return "fresh"
+
+    assert await load() == "fresh"
+    [key] = await fake_redis.keys("lost:*")
+    await fake_redis.set(f"{key}:lock", "another-process")
+    set_value = fake_redis.set
+
+    async def slow_lock(*args, nx=False, **kwargs):
+        if nx:
+            await asyncio.sleep(0.05)  # Keep the refresh in flight while the miss arrives
+        return await set_value(*args, nx=nx, **kwargs)
+
+    monkeypatch.setattr(fake_redis, "set", slow_lock)
+    now[0] += 15
+    assert await load() == "fresh"  # Stale; its refresh will lose the lock and return None
+    await fake_redis.delete(key)
+    assert await load() == "fresh"
@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+
+import fakeredis
+import pytest
+
+from app.core.cache import CacheManager
+from app.core.cache_codecs import CacheSerializer
+from app.core.redis import redis_manager
+
+EXPENSES = [
+    {"id": i, "title": f"Expense {i}", "amount": i * 1.25, "category": "food", "description": None}
+    for i in range(200)
+]
+
+
+@pytest.mark.parametrize("codec", ["json", "orjson"])
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_round_trip_and_compression_threshold(codec, compression):
+    serializer = CacheSerializer(codec, compression, compress_min_bytes=100)
+    for value in (EXPENSES, {"small": 1}):
+        payload = serializer.encode(value)
+        assert serializer.decode(payload) == value
+    if compression:
+        assert len(serializer.encode(EXPENSES)) < len(CacheSerializer(codec).encode(EXPENSES)) / 3
+        # Below the threshold: stored exactly as without compression
+        assert serializer.encode({"small": 1}) == CacheSerializer(codec).encode({"small": 1})
+
+
+def test_plain_json_is_headerless_and_every_format_reads_every_other():
+    assert CacheSerializer().encode({"a": 1}) == b'{"a": 1}'
+    writers = [CacheSerializer(codec, compression, 0) for codec in ("json", "orjson") for compression in (None, "zlib")]
+    for writer in writers:
+        for reader in writers:
+            assert reader.decode(writer.encode(EXPENSES)) == EXPENSES
+    # Entries written before codecs existed, read back through a str client
+    assert CacheSerializer("orjson").decode('{"a": [1, 2]}') == {"a": [1, 2]}
+
+
+def test_orjson_serialises_datetimes_natively():
+    when = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+    assert CacheSerializer("orjson").decode(CacheSerializer("orjson").encode({"t": when})) == {
+        "t": "2024-05-01T12:00:00+00:00"
+    }
+
+
+def test_unknown_settings_and_headers_are_rejected():
+    with pytest.raises(ValueError):
+        CacheSerializer("pickle")
+    with pytest.raises(ValueError):
+        CacheSerializer(compression="lz4")
+    with pytest.raises(ValueError):
+        CacheSerializer().decode(b"\x8f{}")
+
+
+@pytest.mark.asyncio
+async def test_cache_manager_stores_binary_payloads(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_manager, "redis", client)
+    cache = CacheManager(serializer=CacheSerializer("orjson", "zlib", compress_min_bytes=100))
+    await cache.set("expenses", EXPENSES, ttl=60, tags=["user:1"])
+    assert await cache.get("expenses") == EXPENSES
+    assert (await redis_manager.get_binary_redis().get("expenses"))[0] == 0x92
+    # A worker still on the JSON default reads it too
+    assert await CacheManager(serializer=CacheSerializer()).get("expenses") == EXPENSES
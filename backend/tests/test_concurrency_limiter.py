@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.concurrency_limiter import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+
+
+@pytest.mark.asyncio
+async def test_calls_over_limit_queue_then_fail_fast():
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_queue=1, queue_timeout=0.05)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter.acquire():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(ConcurrencyLimitExceeded):  # queue full
+        async with limiter.acquire():
+            pass
+
+    with pytest.raises(ConcurrencyLimitExceeded):  # queued call times out
+        await queued
+    release.set()
+    await holder
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.rejected == 2
+
+
+@pytest.mark.asyncio
+async def test_aimd_backs_off_on_transient_failures_and_grows_on_success():
+    limiter = AdaptiveConcurrencyLimiter("test", algorithm="aimd", initial_limit=10, min_limit=1)
+
+    for _ in range(3):
+        with pytest.raises(httpx.ConnectError):
+            async with limiter.acquire():
+                raise httpx.ConnectError("refused")
+    assert int(limiter.limit) == 7
+
+    # Non-transient errors (bad requests) do not count as overload
+    with pytest.raises(ValueError):
+        async with limiter.acquire():
+            raise ValueError("bad prompt")
+    assert int(limiter.limit) == 7
+
+    limiter.in_flight = 4  # Keep the limit in use so successes count
+    for _ in range(20):
+        async with limiter.acquire():
+            pass
+    assert limiter.limit > 7.29
+
+
+@pytest.mark.asyncio
+async def test_gradient_shrinks_limit_when_latency_rises(clock):
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=20, min_limit=2, clock=clock)
+
+    async def call(latency):
+        limiter.in_flight = int(limiter.limit) - 1  # Saturated: every sample adjusts the limit
+        async with limiter.acquire():
+            clock.now += latency
+
+    for _ in range(50):
+        await call(0.1)
+    steady = limiter.limit
+    assert steady > 20
+
+    for _ in range(50):
+        await call(1.0)
+    assert limiter.limit < steady / 2
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.core.concurrency_limiter import ConcurrencyLimitExceeded
+from app.core.distributed_semaphore import DistributedSemaphore
+from app.core.redis import redis_manager
+
+
+@pytest.mark.asyncio
+async def test_limit_holds_across_workers(fake_redis):
+    # Two instances with the same name stand in for two backend workers
+    workers = [DistributedSemaphore("test", 2, poll_interval=0.01) for _ in range(2)]
+    in_flight = 0
+    peak = 0
+
+    async def call(semaphore):
+        nonlocal in_flight, peak
+        async with semaphore.acquire():
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+
+    await asyncio.gather(*(call(workers[i % 2]) for i in range(8)))
+    assert peak == 2
+    assert await workers[0].stats() == {"limit": 2, "holders": 0, "waiting": 0}
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_admitted_in_arrival_order(fake_redis):
+    semaphore = DistributedSemaphore("fifo", 1, poll_interval=0.01)
+    order = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with semaphore.acquire():
+            await release.wait()
+
+    async def wait(name):
+        async with semaphore.acquire():
+            order.append(name)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.01)
+    first = asyncio.create_task(wait("first"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(wait("second"))
+    await asyncio.sleep(0.05)
+    release.set()
+    await asyncio.gather(holder, first, second)
+    assert order == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_crashed_holder_frees_slot_when_lease_expires(fake_redis):
+    semaphore = DistributedSemaphore("lease", 1, lease_seconds=0.2, poll_interval=0.01)
+    # Take a slot and never release or renew it, like a worker that died
+    await semaphore._wait_for_slot(fake_redis, "crashed", timeout=1)
+
+    with pytest.raises(ConcurrencyLimitExceeded):
+        async with semaphore.acquire(timeout=0.05):
+            pass
+    assert (await semaphore.stats())["waiting"] == 0
+
+    async with semaphore.acquire(timeout=1):
+        assert (await semaphore.stats())["holders"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_unavailable_lets_calls_through(monkeypatch):
+    monkeypatch.setattr(redis_manager, "redis", None)
+    semaphore = DistributedSemaphore("down", 1)
+    async with semaphore.acquire():
+        async with semaphore.acquire():
+            pass
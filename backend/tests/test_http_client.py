@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.http_client import HTTPClientManager
+
+
+@pytest.mark.asyncio
+async def test_client_is_reused_and_per_host_limit_enforced():
+    in_flight = {"a.test": 0, "b.test": 0}
+    peak = {"a.test": 0, "b.test": 0}
+
+    async def handler(request):
+        host = request.url.host
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200, json={"host": host})
+
+    manager = HTTPClientManager()
+    manager.per_host_limit = 2
+    manager.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = manager.get_client()
+
+    responses = await asyncio.gather(
+        *(manager.request("GET", f"http://{host}/") for host in ["a.test"] * 5 + ["b.test"] * 3)
+    )
+
+    assert [r.json()["host"] for r in responses] == ["a.test"] * 5 + ["b.test"] * 3
+    assert peak == {"a.test": 2, "b.test": 2}
+    assert manager.get_client() is client
+    assert manager.stats()["in_flight"] == {"a.test": 0, "b.test": 0}
+
+    await manager.disconnect()
+    assert manager.client is None
@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.load_balancer import Replica, ReplicaBalancer
+
+
+def test_least_outstanding_prefers_idle_replica():
+    busy, idle = Replica("http://a/generate"), Replica("http://b/generate")
+    busy.outstanding = 3
+    balancer = ReplicaBalancer([busy, idle])
+    assert all(balancer.pick() is idle for _ in range(10))
+
+
+@pytest.mark.asyncio
+async def test_failing_replica_is_ejected_then_restored(clock):
+    bad, good = Replica("http://bad/generate"), Replica("http://good/generate")
+    balancer = ReplicaBalancer([bad, good], eject_after_failures=2, eject_seconds=10, clock=clock)
+
+    async def fail(replica):
+        raise httpx.ConnectError("refused")
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            async with balancer.track(bad):
+                await fail(bad)
+
+    assert balancer.stats()["replicas"][0]["ejected"]
+    assert all(balancer.pick() is good for _ in range(10))
+
+    clock.now = 11
+    assert not balancer.stats()["replicas"][0]["ejected"]
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_to_another_replica():
+    slow, fast = Replica("http://slow/generate"), Replica("http://fast/generate")
+    balancer = ReplicaBalancer([slow, fast], hedge_percentile=90, hedge_min_samples=1)
+    balancer._record_latency(fast, 0.01)
+    slow.outstanding = -1  # Make the slow replica the primary pick
+
+    async def fn(replica):
+        await asyncio.sleep(1 if replica is slow else 0.01)
+        return replica.url
+
+    assert await asyncio.wait_for(balancer.call(fn, hedge=True), timeout=0.5) == fast.url
+    await asyncio.sleep(0)
+    assert slow.outstanding == -1  # The losing attempt was cancelled and released
+    # Its elapsed time still counts against the slow replica, as a lower bound
+    assert slow.ewma_latency > fast.ewma_latency
+
+
+def test_cancelled_calls_only_raise_the_ewma():
+    replica = Replica("http://a/generate")
+    balancer = ReplicaBalancer([replica])
+    balancer._record_latency(replica, 1.0)
+    balancer._record_latency_lower_bound(replica, 0.5)
+    assert replica.ewma_latency == 1.0
+    balancer._record_latency_lower_bound(replica, 2.0)
+    assert replica.ewma_latency == pytest.approx(1.3)
+    assert list(balancer._latencies) == [1.0]
+
+
+@pytest.mark.asyncio
+async def test_cancelling_during_hedge_delay_cancels_the_attempt():
+    primary, other = Replica("http://a/generate"), Replica("http://b/generate")
+    balancer = ReplicaBalancer([primary, other], hedge_percentile=90, hedge_min_samples=1)
+    balancer._record_latency(other, 1.0)
+    primary.outstanding = -1
+    started = asyncio.Event()
+
+    async def fn(replica):
+        started.set()
+        await asyncio.sleep(10)
+
+    call = asyncio.create_task(balancer.call(fn, hedge=True))
+    await started.wait()
+    call.cancel()  # Still inside the hedge delay, like a client disconnect
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    await asyncio.sleep(0)
+    assert primary.outstanding == -1
@@ -0,0 +1,94 @@
+import fakeredis
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.api_v1.endpoints import agent
+from app.core.redis import redis_manager
+from app.core.security import get_password_hash
+from app.db.models.usage import AgentUsage
+from app.db.models.user import User as UserModel
+from app.metering import UsageMeter, usage_meter
+
+HOUR = 1_714_564_800  # 2024-05-01T12:00:00Z
+
+
+async def create_user(test_session: AsyncSession, email: str) -> int:
+    user = UserModel(email=email, hashed_password=get_password_hash("pw"), full_name="Usage User")
+    test_session.add(user)
+    await test_session.commit()
+    await test_session.refresh(user)
+    return user.id
+
+
+@pytest.mark.asyncio
+async def test_counts_are_aggregated_and_upserted_per_user_hour(test_session: AsyncSession, monkeypatch):
+    user_id = await create_user(test_session, "meter@example.com")
+    now = [HOUR + 60]
+    meter = UsageMeter(clock=lambda: now[0])
+
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_manager, "redis", redis)
+    await meter.record(user_id, 10, 20)
+    await meter.record(user_id, 5, 5)
+    monkeypatch.setattr(redis_manager, "redis", None)  # Redis down: buffered in process
+    await meter.record(user_id, 1, 1)
+    now[0] += 3600
+    await meter.record(user_id, 2, 3)
+    monkeypatch.setattr(redis_manager, "redis", redis)
+
+    assert await meter.flush(test_session) == 2
+    assert await meter.flush(test_session) == 0
+    await meter.record(user_id, 4, 4)
+    assert await meter.flush(test_session) == 1
+
+    rows = (await test_session.execute(select(AgentUsage).order_by(AgentUsage.window_start))).scalars().all()
+    assert [(r.requests, r.prompt_tokens, r.completion_tokens) for r in rows] == [(3, 16, 26), (2, 6, 7)]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_counts_for_retry(test_session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(redis_manager, "redis", fakeredis.FakeAsyncRedis(decode_responses=True))
+    meter = UsageMeter(clock=lambda: HOUR)
+    await meter.record(1, 1, 1)
+
+    async def broken_write(db, counts):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(meter, "_write", broken_write)
+    assert await meter.flush(test_session) == 0
+    assert meter._buffer == {(1, HOUR): [1, 1, 1]}
+
+
+@pytest.mark.asyncio
+async def test_agent_calls_by_signed_in_users_show_in_usage(
+    client: AsyncClient, test_session: AsyncSession, monkeypatch
+):
+    monkeypatch.setattr(redis_manager, "redis", None)
+    user_id = await create_user(test_session, "usage@example.com")
+    response = await client.post("/api/v1/auth/login", data={"username": "usage@example.com", "password": "pw"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}", "X-Forwarded-For": "203.0.113.8"}
+
+    tenants = []
+
+    async def mock_generate_text(prompt: str, deadline=None, tenant=None) -> str:
+        tenants.append(tenant)
+        return "a" * 40
+
+    monkeypatch.setattr(agent, "generate_text", mock_generate_text)
+    monkeypatch.setattr(usage_meter, "_buffer", {})
+    await client.post("/api/v1/agent/gpt-oss", json={"prompt": "b" * 80}, headers=headers)
+    # Anonymous calls are not metered
+    await client.post("/api/v1/agent/gpt-oss", json={"prompt": "b" * 80}, headers={"X-Forwarded-For": "203.0.113.8"})
+    assert await usage_meter.flush(test_session) == 1
+    # Signed-in users get their own upstream tenant instead of sharing their IP's
+    assert tenants == [f"user:{user_id}", "ip:203.0.113.8"]
+
+    response = await client.get("/api/v1/agent/usage", params={"window": "day"}, headers=headers)
+    assert response.status_code == 200
+    [bucket] = response.json()["buckets"]
+    assert (bucket["requests"], bucket["prompt_tokens"], bucket["completion_tokens"]) == (1, 21, 11)
+
+    response = await client.get("/api/v1/agent/usage")
+    assert response.status_code == 401
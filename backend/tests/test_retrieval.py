@@ -0,0 +1,73 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.api_v1.endpoints import agent
+from app.core.security import get_password_hash
+from app.db.models.user import User as UserModel
+from app.retrieval import VectorIndex, user_indexes
+
+
+def test_index_search_upsert_and_remove():
+    index = VectorIndex(capacity=2)
+    index.add_many([
+        ("expense:1", "Expense 2024-05-01: Groceries (food) 42.10"),
+        ("expense:2", "Expense 2024-05-02: Rent (housing) 900.00"),
+        ("mood:1", "Mood 2024-05-01: anxious, level 3/10. Deadline at work"),
+    ])
+    assert len(index) == 3
+
+    assert index.search("grocery food", k=1)[0].key == "expense:1"
+    assert index.search("when was I anxious", k=1)[0].key == "mood:1"
+    assert index.search("zzz") == []
+
+    index.upsert("expense:2", "Expense 2024-05-02: Sushi dinner (food) 60.00")
+    assert {m.key for m in index.search("food", k=2)} == {"expense:1", "expense:2"}
+
+    assert index.remove("expense:1")
+    assert not index.remove("expense:1")
+    assert [m.key for m in index.search("food")] == ["expense:2"]
+    assert index.search("anxious")[0].key == "mood:1"
+
+
+@pytest.mark.asyncio
+async def test_ask_puts_only_matching_records_in_prompt(client: AsyncClient, test_session: AsyncSession, monkeypatch):
+    user = UserModel(email="ask@example.com", hashed_password=get_password_hash("pw"), full_name="Ask User")
+    test_session.add(user)
+    await test_session.commit()
+    await test_session.refresh(user)
+    user_id = user.id
+    response = await client.post("/api/v1/auth/login", data={"username": "ask@example.com", "password": "pw"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}", "X-Forwarded-For": "203.0.113.7"}
+
+    prompts = []
+
+    async def mock_generate_text(prompt: str, deadline=None, tenant=None) -> str:
+        prompts.append(prompt)
+        return "You spent 42.10 on food."
+
+    monkeypatch.setattr(agent, "generate_text", mock_generate_text)
+
+    for title, category in (("Groceries", "food"), ("Cinema", "entertainment")):
+        await client.post(
+            "/api/v1/expenses/",
+            json={"title": title, "amount": 42.1, "category": category, "date": "2024-05-01T12:00:00"},
+            headers=headers,
+        )
+    response = await client.post(
+        "/api/v1/agent/gpt-oss/ask", json={"prompt": "how much did I spend on food?"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["text"] == "You spent 42.10 on food."
+    assert "Groceries" in prompts[-1] and "Cinema" not in prompts[-1]
+
+    # Writes after the index is built are applied to it incrementally
+    response = await client.post(
+        "/api/v1/moods/",
+        json={"mood_level": 3, "mood_type": "anxious", "notes": "food shopping stress", "date": "2024-05-01T18:00:00"},
+        headers=headers,
+    )
+    mood_id = response.json()["id"]
+    assert user_indexes.loaded(user_id).search("anxious")[0].key == f"mood:{mood_id}"
+    await client.delete(f"/api/v1/moods/{mood_id}", headers=headers)
+    assert user_indexes.loaded(user_id).search("anxious") == []
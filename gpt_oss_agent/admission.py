@@ -0,0 +1,149 @@
+import math
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from schemas import PromptRequest
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Request shed ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Admitted unit of work; release it when the request finishes"""
+
+    def __init__(self, controller: "AdmissionController", cost: float, predicted: float, stream: bool = False):
+        self.controller = controller
+        self.cost = cost
+        self.predicted = predicted
+        self.stream = stream
+        self.started_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """Cost-aware admission control with load shedding.
+
+    Each request's cost is estimated in seconds of model time from its prompt
+    length and requested ``max_tokens``. A request is admitted only if the
+    queue is below ``max_queue_depth`` and the predicted latency, which is the
+    outstanding work spread over ``capacity`` concurrent sequences plus the
+    request's own cost, stays within ``target_latency``. Predictions are
+    calibrated against observed latencies with an EWMA, so a wrong
+    throughput guess corrects itself under load. Streams each hold a
+    producer thread for their whole lifetime, so at most ``max_streams`` are
+    admitted at once.
+    """
+
+    def __init__(
+        self,
+        max_queue_depth: int = 256,
+        target_latency: float = 10.0,
+        capacity: int = 8,
+        prefill_tokens_per_sec: float = 2000.0,
+        decode_tokens_per_sec: float = 50.0,
+        chars_per_token: float = 4.0,
+        queue_depth: Optional[Callable[[], int]] = None,
+        max_streams: Optional[int] = None,
+    ):
+        self.max_queue_depth = max_queue_depth
+        self.target_latency = target_latency
+        self.capacity = max(1, capacity)
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.decode_tokens_per_sec = decode_tokens_per_sec
+        self.chars_per_token = chars_per_token
+        self._queue_depth = queue_depth or (lambda: 0)
+        self.max_streams = max_streams
+        self.in_flight = 0
+        self.streams = 0
+        self.outstanding_cost = 0.0
+        self.scale = 1.0  # observed / predicted latency, smoothed
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"queue_depth": 0, "latency": 0, "streams": 0}
+
+    def estimate_cost(self, request: PromptRequest) -> float:
+        prompt_tokens = len(request.prompt) / self.chars_per_token
+        return prompt_tokens / self.prefill_tokens_per_sec + request.max_tokens / self.decode_tokens_per_sec
+
+    def predicted_latency(self, cost: float) -> float:
+        return (self.outstanding_cost / self.capacity + cost) * self.scale
+
+    def affordable_tokens(self, request: PromptRequest, budget: float) -> int:
+        """Largest ``max_tokens`` whose predicted latency fits in ``budget`` seconds"""
+        prompt_tokens = len(request.prompt) / self.chars_per_token
+        decode_time = (
+            budget / self.scale
+            - self.outstanding_cost / self.capacity
+            - prompt_tokens / self.prefill_tokens_per_sec
+        )
+        return max(0, int(decode_time * self.decode_tokens_per_sec))
+
+    def admit(self, request: PromptRequest, stream: bool = False) -> Ticket:
+        """Admit a request or raise ``AdmissionRejected``"""
+        # A negative estimate would hide other work from the latency prediction
+        cost = max(0.0, self.estimate_cost(request))
+        depth = self._queue_depth()
+        if depth >= self.max_queue_depth:
+            # Roughly how long until the queue drains below the limit
+            per_item = self.predicted_latency(0) / max(1, depth)
+            self._reject("queue_depth", per_item * (depth - self.max_queue_depth + 1))
+
+        if stream and self.max_streams is not None and self.streams >= self.max_streams:
+            # A stream slot frees up once the work ahead of it drains
+            self._reject("streams", self.predicted_latency(0))
+
+        predicted = self.predicted_latency(cost)
+        # An idle service always admits, even if a single request exceeds the target
+        if self.in_flight and predicted > self.target_latency:
+            self._reject("latency", predicted - self.target_latency)
+
+        self.in_flight += 1
+        self.streams += stream
+        self.outstanding_cost += cost
+        self.admitted += 1
+        return Ticket(self, cost, predicted, stream)
+
+    def _reject(self, reason: str, wait: float):
+        self.shed[reason] += 1
+        retry_after = max(1, math.ceil(wait))
+        logger.warning(f"Shedding request ({reason}), retry after {retry_after}s")
+        raise AdmissionRejected(reason, retry_after)
+
+    def _release(self, ticket: Ticket):
+        self.in_flight -= 1
+        self.streams -= ticket.stream
+        self.outstanding_cost = max(0.0, self.outstanding_cost - ticket.cost)
+        if ticket.predicted > 0:
+            observed = time.monotonic() - ticket.started_at
+            ratio = min(10.0, max(0.1, observed / ticket.predicted))
+            self.scale = 0.9 * self.scale + 0.1 * ratio
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "streams": self.streams,
+            "queue_depth": self._queue_depth(),
+            "outstanding_cost_s": round(self.outstanding_cost, 3),
+            "latency_scale": round(self.scale, 3),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
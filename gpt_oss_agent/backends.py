@@ -0,0 +1,227 @@
+import os
+import mmap
+import time
+import zlib
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Sequence
+
+from schemas import PromptRequest
+
+logger = logging.getLogger(__name__)
+
+_STREAM_END = object()
+
+# Called with a request's index in the batch; True once its caller has gone away
+CancelCheck = Callable[[int], bool]
+
+
+class InferenceBackend:
+    """Base class for inference backends.
+
+    Backends receive whole micro-batches from the scheduler and return one
+    completion per request, in order. ``generate_batch`` may block; the
+    scheduler runs it off the event loop through ``agenerate_batch``. Backends
+    should poll ``is_cancelled`` between steps and stop spending work on
+    requests whose callers have disconnected; their completions are discarded.
+    """
+
+    name = "base"
+
+    def generate_batch(
+        self, requests: Sequence[PromptRequest], is_cancelled: Optional[CancelCheck] = None
+    ) -> List[str]:
+        raise NotImplementedError
+
+    async def agenerate_batch(
+        self, requests: Sequence[PromptRequest], is_cancelled: Optional[CancelCheck] = None
+    ) -> List[str]:
+        """Run a batch without blocking the event loop"""
+        return await asyncio.to_thread(self.generate_batch, list(requests), is_cancelled)
+
+    def count_tokens(self, text: str) -> int:
+        """Token count used for telemetry; a whitespace split unless the backend knows better"""
+        return len(text.split())
+
+    def stream(self, request: PromptRequest) -> Iterator[str]:
+        """Yield completion tokens as they are produced.
+
+        Backends without native streaming return the whole completion as a
+        single chunk.
+        """
+        yield self.generate_batch([request])[0]
+
+    async def astream(
+        self,
+        request: PromptRequest,
+        buffer_size: int = 16,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ) -> AsyncIterator[str]:
+        """Stream tokens from a worker thread into the event loop.
+
+        At most ``buffer_size`` tokens are buffered; when the consumer falls
+        behind, the producing thread blocks, so a slow client slows generation
+        down instead of growing memory. Closing the iterator stops the producer.
+        The producer runs on ``executor`` (the loop's default one if omitted);
+        it is held for the whole stream, so long streams belong on their own
+        pool rather than the one ``asyncio.to_thread`` shares.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        stopped = threading.Event()
+
+        def put(item) -> bool:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=0.1)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    if stopped.is_set():
+                        future.cancel()
+                        return False
+
+        def produce():
+            tokens = self.stream(request)
+            try:
+                for token in tokens:
+                    if stopped.is_set() or not put(token):
+                        return
+                put(_STREAM_END)
+            except Exception as e:
+                put(e)
+            finally:
+                # Release anything the generator holds (e.g. the model lock) right away
+                tokens.close()
+
+        loop.run_in_executor(executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+
+class StubBackend(InferenceBackend):
+    """Deterministic CPU stand-in for a real model.
+
+    Completions echo the prompt. The simulated cost has the shape of a batched
+    decoder: every decode step pays a fixed overhead plus a small cost per
+    sequence in the batch, so batching amortises the overhead the same way a
+    real model does.
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        step_overhead: float = 0.0,
+        per_sequence_cost: float = 0.0,
+        weights: Optional[mmap.mmap] = None,
+    ):
+        self.step_overhead = step_overhead
+        self.per_sequence_cost = per_sequence_cost
+        self.weights = weights
+        # Touch every page like a real model load would; pages come from the shared mapping
+        self.weights_checksum = zlib.crc32(weights) if weights is not None else None
+
+    def complete(self, request: PromptRequest) -> str:
+        """Deterministic completion for a single request"""
+        text = f"Echo: {request.prompt}"
+        words = text.split(" ")
+        if len(words) > request.max_tokens:
+            text = " ".join(words[:request.max_tokens])
+        return text
+
+    def generate_batch(
+        self, requests: Sequence[PromptRequest], is_cancelled: Optional[CancelCheck] = None
+    ) -> List[str]:
+        texts = [self.complete(r) for r in requests]
+        lengths = [len(t.split(" ")) for t in texts]
+        if self.step_overhead <= 0 and self.per_sequence_cost <= 0:
+            return texts
+        for step in range(max(lengths, default=0)):
+            # Finished and cancelled sequences leave the batch, like continuous batching
+            active = sum(
+                1 for i, n in enumerate(lengths)
+                if n > step and not (is_cancelled and is_cancelled(i))
+            )
+            if not active:
+                break
+            time.sleep(self.step_overhead + self.per_sequence_cost * active)
+        return texts
+
+    def stream(self, request: PromptRequest) -> Iterator[str]:
+        step_cost = self.step_overhead + self.per_sequence_cost
+        for i, word in enumerate(self.complete(request).split(" ")):
+            if step_cost > 0:
+                time.sleep(step_cost)
+            yield word if i == 0 else f" {word}"
+
+
+class LlamaCppBackend(InferenceBackend):
+    """llama-cpp-python backend (one sequence at a time)"""
+
+    name = "llama-cpp"
+
+    def __init__(self, model_path: str, n_ctx: int = 2048):
+        from llama_cpp import Llama  # Optional dependency, only needed for real inference
+
+        # use_mmap keeps the weights in the shared page cache across worker processes
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, use_mmap=True, verbose=False)
+        # Llama instances are not thread-safe; batches and streams take turns
+        self._lock = threading.Lock()
+
+    def generate_batch(
+        self, requests: Sequence[PromptRequest], is_cancelled: Optional[CancelCheck] = None
+    ) -> List[str]:
+        texts = []
+        with self._lock:
+            for i, r in enumerate(requests):
+                if is_cancelled and is_cancelled(i):
+                    texts.append("")
+                    continue
+                output = self.llm(r.prompt, max_tokens=r.max_tokens, temperature=r.temperature)
+                texts.append(output["choices"][0]["text"])
+        return texts
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.llm.tokenize(text.encode(), add_bos=False))
+
+    def stream(self, request: PromptRequest) -> Iterator[str]:
+        with self._lock:
+            for chunk in self.llm(
+                request.prompt,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                stream=True,
+            ):
+                yield chunk["choices"][0]["text"]
+
+
+def create_backend(weights: Optional[mmap.mmap] = None) -> InferenceBackend:
+    """Build the backend selected by ``AGENT_BACKEND`` (``stub`` or ``llama``).
+
+    ``weights`` is a read-only mapping of the weight file, handed in by the
+    worker pool. llama.cpp memory-maps ``MODEL_PATH`` on its own, so only the
+    stub backend uses it.
+    """
+    kind = os.getenv("AGENT_BACKEND", "stub")
+    if kind == "llama":
+        model_path = os.getenv("MODEL_PATH", "/models/llama.bin")
+        logger.info(f"Loading llama-cpp model from {model_path}")
+        return LlamaCppBackend(model_path, n_ctx=int(os.getenv("MODEL_N_CTX", 2048)))
+    if kind != "stub":
+        raise ValueError(f"Unknown AGENT_BACKEND: {kind}")
+    return StubBackend(
+        step_overhead=float(os.getenv("STUB_STEP_OVERHEAD_MS", 0)) / 1000,
+        per_sequence_cost=float(os.getenv("STUB_PER_SEQUENCE_MS", 0)) / 1000,
+        weights=weights,
+    )
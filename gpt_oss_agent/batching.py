@@ -0,0 +1,230 @@
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from backends import InferenceBackend
+from fair_queue import DEFAULT_FLOW, FairQueue, Flow
+from metrics import BATCH_SIZE, CANCELLED, DEADLINE_EXPIRED, OUTPUT_TOKENS, PROMPT_TOKENS, QUEUE_WAIT, TOKENS_PER_SECOND
+from schemas import PromptRequest
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """Raised for a queued request whose caller's deadline passed before dispatch"""
+
+
+@dataclass
+class PendingRequest:
+    """A request waiting in the scheduler queue"""
+    request: PromptRequest
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Monotonic time after which the caller no longer wants the result
+    deadline: Optional[float] = None
+    flow: Flow = DEFAULT_FLOW
+    # Thread-safe mirror of the future's cancellation for backends running off the loop
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    # Only waits for its fair-queue turn (streams); never joins a batch
+    turn_only: bool = False
+
+
+def request_cost(pending: PendingRequest) -> float:
+    """Approximate tokens of work, so fairness is by compute rather than request count"""
+    return len(pending.request.prompt) / 4 + pending.request.max_tokens
+
+
+class MicroBatcher:
+    """Collects concurrent requests into micro-batches for the backend.
+
+    A batch is dispatched as soon as ``max_batch_size`` requests are waiting or
+    ``max_wait_ms`` has passed since the oldest one arrived, whichever comes
+    first. Results are fanned back out to the waiting callers in order.
+    ``max_concurrent_batches`` lets a multi-worker backend run several batches
+    at once; with the default of one, the next batch fills while the current
+    one runs.
+
+    Waiting requests are held in a ``FairQueue``: each tenant and priority
+    class gets its own FIFO and batches are filled by weighted deficit
+    round-robin across them, so a heavy tenant cannot starve light ones.
+    """
+
+    def __init__(
+        self,
+        backend: InferenceBackend,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 1,
+        priority_weights: Optional[Dict[str, float]] = None,
+        quantum: float = 256,
+    ):
+        self.backend = backend
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._queue = FairQueue(priority_weights, quantum, cost=request_cost)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    async def start(self):
+        """Start the dispatch loop"""
+        if self._task is not None and self._task.get_loop() is not asyncio.get_running_loop():
+            # Tasks, events and futures are bound to a loop; start over on a new one
+            self._queue.clear()
+            self._task = None
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+                f"max_wait_ms={self.max_wait * 1000:g})"
+            )
+
+    async def stop(self):
+        """Stop the dispatch loop and fail anything still queued"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        while self._queue:
+            pending = self._queue.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Scheduler stopped"))
+
+    async def submit(
+        self, request: PromptRequest, deadline: Optional[float] = None, flow: Flow = DEFAULT_FLOW
+    ) -> str:
+        """Queue a request and wait for its completion.
+
+        If ``deadline`` (a ``time.monotonic()`` value) passes while the request
+        is still queued, it is dropped and ``DeadlineExceeded`` is raised.
+        """
+        return await self._enqueue(request, deadline, flow)
+
+    async def wait_turn(
+        self, request: PromptRequest, deadline: Optional[float] = None, flow: Flow = DEFAULT_FLOW
+    ):
+        """Wait until ``request``'s flow is due, without running it.
+
+        For streams, which generate outside micro-batches: they still queue
+        behind other tenants and are charged against their own flow's
+        credit, so streaming is no way around fair scheduling.
+        """
+        await self._enqueue(request, deadline, flow, turn_only=True)
+
+    async def _enqueue(
+        self, request: PromptRequest, deadline: Optional[float], flow: Flow, turn_only: bool = False
+    ) -> Any:
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        pending = PendingRequest(request, future, deadline=deadline, flow=flow, turn_only=turn_only)
+        future.add_done_callback(lambda f: f.cancelled() and pending.cancelled.set())
+        self._queue.append(pending)
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self.max_concurrent_batches)
+        while True:
+            await slots.acquire()
+            batch = await self._next_batch()
+            if not batch:
+                slots.release()
+                continue
+            task = asyncio.create_task(self._dispatch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _next_batch(self) -> List[PendingRequest]:
+        while not self._queue:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+        # Hold the batch open until it is full or the oldest request has waited long enough
+        deadline = self._queue.oldest().enqueued_at + self.max_wait
+        while len(self._queue) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+
+        batch = []
+        now = time.monotonic()
+        while self._queue and len(batch) < self.max_batch_size:
+            pending = self._queue.popleft()
+            # Callers that gave up while queued are dropped before inference
+            if pending.future.done():
+                if pending.future.cancelled():
+                    CANCELLED.labels("queued").inc()
+                continue
+            if pending.deadline is not None and pending.deadline <= now:
+                DEADLINE_EXPIRED.labels("queued").inc()
+                pending.future.set_exception(DeadlineExceeded())
+                continue
+            if pending.turn_only:
+                QUEUE_WAIT.observe(now - pending.enqueued_at)
+                pending.future.set_result(None)
+                continue
+            batch.append(pending)
+        return batch
+
+    async def _dispatch(self, batch: List[PendingRequest]):
+        self.batches += 1
+        self.items += len(batch)
+        started = time.monotonic()
+        BATCH_SIZE.set(len(batch))
+        for pending in batch:
+            QUEUE_WAIT.observe(started - pending.enqueued_at)
+        try:
+            texts = await self.backend.agenerate_batch(
+                [p.request for p in batch],
+                lambda i: batch[i].cancelled.is_set(),
+            )
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} failed: {e}")
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        elapsed = time.monotonic() - started
+        for pending, text in zip(batch, texts):
+            if pending.cancelled.is_set():
+                CANCELLED.labels("running").inc()
+                continue
+            if not pending.future.done():
+                pending.future.set_result(text)
+            output_tokens = self.backend.count_tokens(text)
+            PROMPT_TOKENS.observe(self.backend.count_tokens(pending.request.prompt))
+            OUTPUT_TOKENS.observe(output_tokens)
+            if elapsed > 0:
+                TOKENS_PER_SECOND.observe(output_tokens / elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "queue_depth_by_priority": self._queue.depth_by_priority(),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,57 @@
+"""Compare micro-batched throughput against one-at-a-time handling.
+
+Runs entirely offline against the deterministic ``StubBackend``:
+
+    python benchmarks/bench_batching.py --requests 256 --concurrency 64
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import StubBackend  # noqa: E402
+from batching import MicroBatcher  # noqa: E402
+from schemas import PromptRequest  # noqa: E402
+
+
+async def run(batcher: MicroBatcher, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await batcher.submit(PromptRequest(prompt=f"summarise account {i} for this month"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    await batcher.stop()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--step-overhead-ms", type=float, default=2.0)
+    parser.add_argument("--per-sequence-ms", type=float, default=0.1)
+    args = parser.parse_args()
+
+    backend = StubBackend(args.step_overhead_ms / 1000, args.per_sequence_ms / 1000)
+    for label, size in (("unbatched", 1), ("batched", args.max_batch_size)):
+        batcher = MicroBatcher(backend, max_batch_size=size, max_wait_ms=args.max_wait_ms)
+        elapsed = await run(batcher, args.requests, args.concurrency)
+        stats = batcher.stats()
+        print(
+            f"{label:>10}: {args.requests / elapsed:8.1f} req/s "
+            f"({elapsed:.2f}s, avg batch {stats['avg_batch_size']})"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""Light-tenant latency under a heavy tenant's burst: FIFO vs fair queuing.
+
+A heavy tenant dumps a burst of requests while a light tenant sends a
+request at a steady interval. With FIFO ordering (every request on one flow)
+light requests wait behind the whole burst; with per-tenant fair queuing
+they wait roughly one round. Runs offline against the ``StubBackend``:
+
+    python benchmarks/bench_fair_queue.py --heavy 400 --light 20
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import StubBackend  # noqa: E402
+from batching import MicroBatcher  # noqa: E402
+from fair_queue import Flow  # noqa: E402
+from schemas import PromptRequest  # noqa: E402
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(batcher: MicroBatcher, args, fair: bool):
+    heavy_flow = Flow("heavy") if fair else Flow()
+    light_flow = Flow("light", "interactive") if fair else Flow()
+    request = PromptRequest(prompt="summarise my spending this month", max_tokens=args.max_tokens)
+    latencies = {"heavy": [], "light": []}
+
+    async def one(tenant: str, flow: Flow):
+        started = time.perf_counter()
+        await batcher.submit(request, flow=flow)
+        latencies[tenant].append(time.perf_counter() - started)
+
+    async def light_client():
+        tasks = []
+        for _ in range(args.light):
+            tasks.append(asyncio.create_task(one("light", light_flow)))
+            await asyncio.sleep(args.light_interval_ms / 1000)
+        await asyncio.gather(*tasks)
+
+    heavy = [one("heavy", heavy_flow) for _ in range(args.heavy)]
+    await asyncio.gather(*heavy, light_client())
+    await batcher.stop()
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--heavy", type=int, default=400)
+    parser.add_argument("--light", type=int, default=20)
+    parser.add_argument("--light-interval-ms", type=float, default=20.0)
+    parser.add_argument("--max-tokens", type=int, default=16)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--step-overhead-ms", type=float, default=0.5)
+    parser.add_argument("--per-sequence-ms", type=float, default=0.05)
+    args = parser.parse_args()
+
+    backend = StubBackend(args.step_overhead_ms / 1000, args.per_sequence_ms / 1000)
+    for label, fair in (("fifo", False), ("fair", True)):
+        batcher = MicroBatcher(backend, max_batch_size=args.max_batch_size, max_wait_ms=1)
+        latencies = await run(batcher, args, fair)
+        for tenant in ("light", "heavy"):
+            values = latencies[tenant]
+            print(
+                f"{label:>5} {tenant:>5}: p50 {statistics.median(values) * 1000:8.1f}ms "
+                f"p99 {percentile(values, 99) * 1000:8.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,29 +1,430 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import os
+import json
+import time
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+from admission import AdmissionController, AdmissionRejected
+from backends import create_backend
+from batching import DeadlineExceeded, MicroBatcher
+from fair_queue import DEFAULT_FLOW, Flow, weights_from_env
+from metrics import (
+    CANCELLED,
+    CLIENT_DISCONNECTS,
+    DEADLINE_EXPIRED,
+    DEADLINE_TRUNCATED,
+    GENERATION_TIME,
+    IN_FLIGHT,
+    OUTPUT_TOKENS,
+    PROMPT_TOKENS,
+    TIME_TO_FIRST_TOKEN,
+    TOKENS_PER_SECOND,
+    StatsCollector,
+)
+from registry import ModelRegistry, UnknownModel, specs_from_env
+from response_cache import ResponseCache
+from worker_pool import WorkerPool
+from schemas import BatchRequest, BatchResponse, PromptRequest, TextResponse
+from singleflight import SingleFlight
 
-app = FastAPI()
 logging.basicConfig(level=logging.INFO)
 
-class PromptRequest(BaseModel):
-    prompt: str
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+STREAM_BUFFER_TOKENS = int(os.getenv("STREAM_BUFFER_TOKENS", 16))
+# Streams each hold a producer thread; beyond this many concurrent streams new ones get 503
+STREAM_MAX_CONCURRENCY = int(os.getenv("STREAM_MAX_CONCURRENCY", 32))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 300))
+# 0 runs inference in-process; N > 0 runs it in N worker processes
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", 0))
+MODEL_WEIGHTS_PATH = os.getenv("MODEL_WEIGHTS_PATH")
+MODEL_MEMORY_BUDGET_MB = os.getenv("MODEL_MEMORY_BUDGET_MB")
+MAX_BATCH_PROMPTS = int(os.getenv("MAX_BATCH_PROMPTS", 256))
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", 0.25))
+# Callers send their remaining time budget in milliseconds
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+# Fair queuing: one queue per tenant and priority class, served by weighted round-robin
+TENANT_HEADER = "X-Tenant-Id"
+PRIORITY_HEADER = "X-Priority"
+PRIORITY_WEIGHTS = weights_from_env(os.getenv("PRIORITY_WEIGHTS"))
+FAIR_QUEUE_QUANTUM = float(os.getenv("FAIR_QUEUE_QUANTUM", 256))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", 256))
+ADMISSION_TARGET_LATENCY = float(os.getenv("ADMISSION_TARGET_LATENCY", 20))
+ADMISSION_PREFILL_TOKENS_PER_SEC = float(os.getenv("ADMISSION_PREFILL_TOKENS_PER_SEC", 2000))
+ADMISSION_DECODE_TOKENS_PER_SEC = float(os.getenv("ADMISSION_DECODE_TOKENS_PER_SEC", 50))
+
+if AGENT_WORKERS > 0 and os.getenv("AGENT_MODELS"):
+    # Registry models are built in-process by their own factories; a pool
+    # spawned for the default backend would be warmed up and never used
+    logging.warning(f"AGENT_MODELS is set: ignoring AGENT_WORKERS={AGENT_WORKERS}, models run in-process")
+    AGENT_WORKERS = 0
+if AGENT_WORKERS > 0:
+    logging.info(f"Running inference in {AGENT_WORKERS} worker processes")
+    backend = WorkerPool(AGENT_WORKERS, create_backend, weights_path=MODEL_WEIGHTS_PATH)
+else:
+    backend = create_backend()
+# Without AGENT_MODELS the registry holds one "default" model: the backend above
+model_registry = ModelRegistry(
+    specs_from_env(lambda: backend),
+    memory_budget_bytes=int(float(MODEL_MEMORY_BUDGET_MB) * 1024 * 1024) if MODEL_MEMORY_BUDGET_MB else None,
+)
+# One scheduler per model, so a batch never mixes models
+batchers = {
+    name: MicroBatcher(
+        model_registry.backend(name),
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_concurrent_batches=max(1, AGENT_WORKERS),
+        priority_weights=PRIORITY_WEIGHTS,
+        quantum=FAIR_QUEUE_QUANTUM,
+    )
+    for name in model_registry.names
+}
+
+def queue_depth() -> int:
+    return sum(b.queue_depth for b in batchers.values())
+
+def scheduler_stats():
+    per_model = {name: b.stats() for name, b in batchers.items()}
+    by_priority = {}
+    for model_stats in per_model.values():
+        for priority, depth in model_stats["queue_depth_by_priority"].items():
+            by_priority[priority] = by_priority.get(priority, 0) + depth
+    return {"queue_depth": queue_depth(), "queue_depth_by_priority": by_priority, "models": per_model}
+
+admission = AdmissionController(
+    max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+    target_latency=ADMISSION_TARGET_LATENCY,
+    capacity=BATCH_MAX_SIZE * max(1, AGENT_WORKERS),
+    prefill_tokens_per_sec=ADMISSION_PREFILL_TOKENS_PER_SEC,
+    decode_tokens_per_sec=ADMISSION_DECODE_TOKENS_PER_SEC,
+    queue_depth=queue_depth,
+    max_streams=STREAM_MAX_CONCURRENCY,
+)
+# Stream producers get their own threads so they cannot starve asyncio.to_thread work
+stream_executor = ThreadPoolExecutor(STREAM_MAX_CONCURRENCY, thread_name_prefix="agent-stream")
+response_cache = ResponseCache(max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL)
+singleflight = SingleFlight()
+REGISTRY.register(StatsCollector({
+    "cache": lambda: response_cache.stats(),
+    "admission": lambda: admission.stats(),
+    "singleflight": lambda: singleflight.stats(),
+    "scheduler": scheduler_stats,
+}))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    if isinstance(backend, WorkerPool):
+        backend.start()
+    for batcher in batchers.values():
+        await batcher.start()
+    yield
+    # Shutdown
+    for batcher in batchers.values():
+        await batcher.stop()
+    if isinstance(backend, WorkerPool):
+        await asyncio.to_thread(backend.stop)
+
+
+app = FastAPI(lifespan=lifespan)
+
+async def cancel_on_disconnect(http_request: Request, endpoint: str, coro):
+    """Await ``coro``, cancelling it if the client disconnects first.
+
+    Cancellation detaches the request from single-flight and drops it from
+    the scheduler queue, or out of a running batch, so nobody keeps
+    generating a response that will never be read.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                CLIENT_DISCONNECTS.labels(endpoint).inc()
+                logging.info(f"Client disconnected from {endpoint}; cancelling generation")
+                # 499 (client closed request) is only for logs; nobody is listening
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        task.cancel()
+
+def request_deadline(http_request: Request) -> Optional[float]:
+    """Monotonic deadline from the caller's remaining budget header, if any"""
+    raw = http_request.headers.get(DEADLINE_HEADER)
+    if raw is None:
+        return None
+    try:
+        budget_ms = float(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {DEADLINE_HEADER} header")
+    return time.monotonic() + budget_ms / 1000
+
+def request_flow(http_request: Request) -> Flow:
+    """Tenant and priority class from the caller's headers"""
+    priority = http_request.headers.get(PRIORITY_HEADER, DEFAULT_FLOW.priority)
+    if priority not in PRIORITY_WEIGHTS:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority}")
+    return Flow(http_request.headers.get(TENANT_HEADER, DEFAULT_FLOW.tenant), priority)
+
+def fit_to_deadline(
+    request: PromptRequest, deadline: Optional[float], flow: Flow = DEFAULT_FLOW
+) -> PromptRequest:
+    """Cap ``max_tokens`` so the request can finish in time, or fail with 504.
+
+    Requests that could not produce a single token before the deadline are
+    dropped on arrival instead of occupying a batch slot. ``batch`` priority
+    work is never truncated: a shortened bulk completion is worse than one
+    that fails and is retried, and its deadline is a wait bound rather than
+    a latency target.
+    """
+    if deadline is None:
+        return request
+    remaining = deadline - time.monotonic()
+    affordable = admission.affordable_tokens(request, remaining) if remaining > 0 else 0
+    if affordable < 1:
+        DEADLINE_EXPIRED.labels("arrival").inc()
+        raise HTTPException(status_code=504, detail="Deadline exceeded")
+    if affordable < request.max_tokens and flow.priority != "batch":
+        DEADLINE_TRUNCATED.inc()
+        return request.model_copy(update={"max_tokens": affordable})
+    return request
+
+def route(request: PromptRequest) -> str:
+    try:
+        return model_registry.route(request)
+    except UnknownModel:
+        raise HTTPException(status_code=400, detail=f"Unknown model: {request.model}")
 
-class TextResponse(BaseModel):
-    text: str
+def admit(request: PromptRequest, stream: bool = False):
+    """Admit a request or shed it with 503 and a Retry-After hint"""
+    try:
+        return admission.admit(request, stream)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Agent overloaded ({e.reason})",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+async def complete(
+    request: PromptRequest, deadline: Optional[float] = None, flow: Flow = DEFAULT_FLOW
+) -> str:
+    """Run one request through admission and the scheduler, then cache the result"""
+    started = time.monotonic()
+    request = fit_to_deadline(request, deadline, flow)
+    with admit(request), IN_FLIGHT.labels("batch").track_inprogress():
+        try:
+            text = await batchers[route(request)].submit(request, deadline, flow)
+        except DeadlineExceeded:
+            raise HTTPException(status_code=504, detail="Deadline exceeded")
+        except Exception as e:
+            logging.error(f"Inference failed: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail="Inference failed")
+    elapsed = time.monotonic() - started
+    # Non-streaming clients see their first token only once the whole completion is ready
+    TIME_TO_FIRST_TOKEN.labels("batch").observe(elapsed)
+    GENERATION_TIME.labels("batch").observe(elapsed)
+    response_cache.put(request, text)
+    logging.info(f"Prompt: {request.prompt} | Response: {text}")
+    return text
+
+async def generate_one(
+    request: PromptRequest, deadline: Optional[float] = None, flow: Flow = DEFAULT_FLOW
+) -> str:
+    route(request)  # Reject unknown models before touching the cache
+    text = response_cache.get(request)
+    if text is not None:
+        return text
+    if response_cache.cacheable(request):
+        # Identical deterministic requests in flight share one generation. The
+        # key is taken after deadline truncation, so nobody receives output cut
+        # short for someone else's deadline, and includes the flow, so each
+        # tenant's work is scheduled and accounted under its own flow.
+        fitted = fit_to_deadline(request, deadline, flow)
+        key = f"{flow.tenant}|{flow.priority}|{response_cache.make_key(fitted)}"
+        try:
+            return await singleflight.do(key, lambda: complete(fitted, deadline, flow))
+        except HTTPException as e:
+            # The shared call ran out of the leader's time; ours may not have
+            if e.status_code != 504 or (deadline is not None and time.monotonic() >= deadline):
+                raise
+            return await complete(fitted, deadline, flow)
+    return await complete(request, deadline, flow)
 
 @app.post("/generate", response_model=TextResponse)
-async def generate(request: PromptRequest):
-    prompt = request.prompt
-    # Placeholder: Replace with real model inference (e.g., llama-cpp-python)
-    # Example:
-    # from llama_cpp import Llama
-    # llm = Llama(model_path="/models/llama.bin")
-    # output = llm(prompt)
-    # text = output["choices"][0]["text"]
-    text = f"Echo: {prompt}"
-    logging.info(f"Prompt: {prompt} | Response: {text}")
+async def generate(request: PromptRequest, http_request: Request):
+    deadline = request_deadline(http_request)
+    flow = request_flow(http_request)
+    text = await cancel_on_disconnect(http_request, "generate", generate_one(request, deadline, flow))
     return {"text": text}
 
+@app.post("/generate/batch", response_model=BatchResponse)
+async def generate_batch(batch: BatchRequest, http_request: Request):
+    """Generate completions for many prompts; results keep input order, errors are per item"""
+    if len(batch.prompts) > MAX_BATCH_PROMPTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many prompts (max {MAX_BATCH_PROMPTS} per batch)",
+        )
+    deadline = request_deadline(http_request)
+    flow = request_flow(http_request)
+    requests = [
+        PromptRequest(
+            prompt=prompt,
+            max_tokens=batch.max_tokens,
+            temperature=batch.temperature,
+            model=batch.model,
+        )
+        for prompt in batch.prompts
+    ]
+    # Submitting everything at once lets the scheduler pack the prompts into full batches
+    outcomes = await cancel_on_disconnect(
+        http_request,
+        "generate_batch",
+        asyncio.gather(*(generate_one(r, deadline, flow) for r in requests), return_exceptions=True),
+    )
+
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, HTTPException):
+            results.append({"error": outcome.detail})
+        elif isinstance(outcome, Exception):
+            logging.error(f"Batch item failed: {outcome}")
+            results.append({"error": "Inference failed"})
+        else:
+            results.append({"text": outcome})
+    return {"results": results}
+
+class TicketedStreamingResponse(StreamingResponse):
+    """Releases an admission ticket however the response ends.
+
+    The body generator's ``finally`` only runs if the body is iterated and
+    closed; a client that disconnects before the first send, or a failed
+    send, would otherwise leak the admission slot.
+    """
+
+    def __init__(self, content, ticket=None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.ticket is not None:
+                self.ticket.release()
+
+@app.post("/generate/stream")
+async def generate_stream(request: PromptRequest, http_request: Request):
+    """Stream the completion as NDJSON: ``{"token": ...}`` lines, then ``{"done": true}``"""
+    started = time.monotonic()
+    model = route(request)
+    flow = request_flow(http_request)
+    cached = response_cache.get(request)
+    ticket = None
+    if cached is None:
+        deadline = request_deadline(http_request)
+        request = fit_to_deadline(request, deadline, flow)
+        ticket = admit(request, stream=True)
+        try:
+            # Take a fair-queue turn like batched requests, then stream outside the batch
+            await cancel_on_disconnect(
+                http_request, "generate_stream", batchers[model].wait_turn(request, deadline, flow)
+            )
+        except DeadlineExceeded:
+            ticket.release()
+            raise HTTPException(status_code=504, detail="Deadline exceeded")
+        except BaseException:
+            ticket.release()
+            raise
+
+    async def ndjson_lines():
+        if cached is not None:
+            yield json.dumps({"token": cached}) + "\n"
+            yield json.dumps({"done": True}) + "\n"
+            return
+        model_backend = model_registry.backend(model)
+        tokens = model_backend.astream(
+            request, buffer_size=STREAM_BUFFER_TOKENS, executor=stream_executor
+        )
+        parts = []
+        first_token_at = None
+        IN_FLIGHT.labels("stream").inc()
+        try:
+            async for token in tokens:
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                    TIME_TO_FIRST_TOKEN.labels("stream").observe(first_token_at - started)
+                parts.append(token)
+                yield json.dumps({"token": token}) + "\n"
+            finished = time.monotonic()
+            GENERATION_TIME.labels("stream").observe(finished - started)
+            PROMPT_TOKENS.observe(model_backend.count_tokens(request.prompt))
+            OUTPUT_TOKENS.observe(len(parts))
+            if first_token_at is not None and finished > first_token_at:
+                TOKENS_PER_SECOND.observe(len(parts) / (finished - first_token_at))
+            response_cache.put(request, "".join(parts))
+            yield json.dumps({"done": True}) + "\n"
+        except asyncio.CancelledError:
+            # The server cancels the response when the client goes away
+            CLIENT_DISCONNECTS.labels("generate_stream").inc()
+            CANCELLED.labels("stream").inc()
+            raise
+        except Exception as e:
+            logging.error(f"Streaming inference failed: {e}", exc_info=True)
+            yield json.dumps({"error": "Inference failed"}) + "\n"
+        finally:
+            IN_FLIGHT.labels("stream").dec()
+            ticket.release()
+            await tokens.aclose()
+
+    return TicketedStreamingResponse(ndjson_lines(), ticket, media_type="application/x-ndjson")
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: fails until every inference worker has warmed up"""
+    if isinstance(backend, WorkerPool) and not backend.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+@app.get("/stats")
+async def stats():
+    result = {
+        "cache": response_cache.stats(),
+        "scheduler": scheduler_stats(),
+        "models": model_registry.stats(),
+        "admission": admission.stats(),
+        "singleflight": singleflight.stats(),
+    }
+    if isinstance(backend, WorkerPool):
+        result["workers"] = backend.stats()
+    return result
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/cache/prefixes")
+async def cache_prefixes(min_count: int = 2, limit: int = 10):
+    """Report the most common templated prompt prefixes in the cache"""
+    return {"prefixes": response_cache.common_prefixes(min_count=min_count, limit=limit)}
+
+@app.get("/cache/lookup")
+async def cache_lookup(prefix: str, limit: int = 20):
+    """Find cached completions for prompts starting with ``prefix``"""
+    return {"results": response_cache.lookup_prefix(prefix, limit=limit)}
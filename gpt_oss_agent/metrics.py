@@ -0,0 +1,122 @@
+"""Prometheus metrics for the agent service.
+
+Everything here is cheap enough to leave on in production: histogram
+observations are a lock plus a bucket scan, token counts reuse text the
+request already produced, and component counters (cache, admission,
+single-flight) are read from their ``stats()`` only when ``/metrics`` is
+scraped.
+"""
+
+from typing import Any, Callable, Dict
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+TOKEN_BUCKETS = (1, 4, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+RATE_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+QUEUE_WAIT = Histogram(
+    "agent_queue_wait_seconds",
+    "Time a request spent queued before its batch was dispatched",
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "agent_time_to_first_token_seconds",
+    "Time from request arrival to the first token reaching the client",
+    ["mode"],
+    buckets=LATENCY_BUCKETS,
+)
+GENERATION_TIME = Histogram(
+    "agent_generation_seconds",
+    "Total time from request arrival to the completed response",
+    ["mode"],
+    buckets=LATENCY_BUCKETS,
+)
+PROMPT_TOKENS = Histogram("agent_prompt_tokens", "Prompt length in tokens", buckets=TOKEN_BUCKETS)
+OUTPUT_TOKENS = Histogram("agent_output_tokens", "Completion length in tokens", buckets=TOKEN_BUCKETS)
+TOKENS_PER_SECOND = Histogram(
+    "agent_tokens_per_second",
+    "Per-request decode rate, excluding queue wait",
+    buckets=RATE_BUCKETS,
+)
+BATCH_SIZE = Gauge("agent_batch_size", "Size of the most recently dispatched batch")
+IN_FLIGHT = Gauge("agent_in_flight_requests", "Requests currently being served", ["mode"])
+CANCELLED = Counter(
+    "agent_cancelled_requests_total",
+    "Requests abandoned by a disconnected caller, by where the work was stopped",
+    ["stage"],
+)
+CLIENT_DISCONNECTS = Counter(
+    "agent_client_disconnects_total",
+    "Clients that disconnected before their response was ready",
+    ["endpoint"],
+)
+DEADLINE_EXPIRED = Counter(
+    "agent_deadline_expired_total",
+    "Requests dropped because the caller's deadline passed, by where they were dropped",
+    ["stage"],
+)
+DEADLINE_TRUNCATED = Counter(
+    "agent_deadline_truncated_total",
+    "Requests whose max_tokens was lowered to finish within the caller's deadline",
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "agent_model_load_seconds",
+    "Time to load a model into memory",
+    ["model"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+MODEL_RESIDENT = Gauge("agent_model_resident", "1 if the model is loaded, else 0", ["model"])
+MODEL_RESIDENT_BYTES = Gauge("agent_model_resident_bytes", "Declared size of all loaded models")
+MODEL_EVICTIONS = Counter("agent_model_evictions_total", "Models unloaded to fit the memory budget", ["model"])
+
+
+class StatsCollector:
+    """Exports component counters from ``stats()`` snapshots at scrape time"""
+
+    def __init__(self, sources: Dict[str, Callable[[], Dict[str, Any]]]):
+        self.sources = sources
+
+    def collect(self):
+        stats = {name: source() for name, source in self.sources.items()}
+
+        cache = stats.get("cache")
+        if cache:
+            for key in ("hits", "misses", "evictions", "expirations"):
+                yield CounterMetricFamily(f"agent_cache_{key}", f"Response cache {key}", value=cache[key])
+            yield GaugeMetricFamily("agent_cache_size_bytes", "Response cache size", value=cache["size_bytes"])
+
+        admission = stats.get("admission")
+        if admission:
+            yield CounterMetricFamily("agent_admission_admitted", "Requests admitted", value=admission["admitted"])
+            shed = CounterMetricFamily("agent_admission_shed", "Requests shed by reason", labels=["reason"])
+            for reason, count in admission["shed"].items():
+                shed.add_metric([reason], count)
+            yield shed
+            yield GaugeMetricFamily(
+                "agent_admission_outstanding_cost_seconds",
+                "Estimated model time of admitted, unfinished work",
+                value=admission["outstanding_cost_s"],
+            )
+
+        singleflight = stats.get("singleflight")
+        if singleflight:
+            yield CounterMetricFamily(
+                "agent_singleflight_upstream_calls", "Generations started", value=singleflight["upstream_calls"]
+            )
+            yield CounterMetricFamily(
+                "agent_singleflight_saved_calls",
+                "Requests served by attaching to an identical in-flight generation",
+                value=singleflight["saved_calls"],
+            )
+
+        scheduler = stats.get("scheduler")
+        if scheduler:
+            yield GaugeMetricFamily("agent_queue_depth", "Requests waiting for a batch", value=scheduler["queue_depth"])
+            by_priority = GaugeMetricFamily(
+                "agent_queue_depth_by_priority", "Requests waiting for a batch by priority class", labels=["priority"]
+            )
+            for priority, depth in scheduler["queue_depth_by_priority"].items():
+                by_priority.add_metric([priority], depth)
+            yield by_priority
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import concurrent.futures
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from backends import CancelCheck, InferenceBackend, LlamaCppBackend, StubBackend
+from metrics import MODEL_EVICTIONS, MODEL_LOAD_SECONDS, MODEL_RESIDENT, MODEL_RESIDENT_BYTES
+from schemas import PromptRequest
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownModel(KeyError):
+    """Raised when a request names a model that is not registered"""
+
+
+@dataclass
+class ModelSpec:
+    name: str
+    size_bytes: int
+    factory: Callable[[], InferenceBackend]
+    # Prompts up to this many characters may be routed here; None means no limit
+    max_prompt_chars: Optional[int] = None
+
+
+class _Resident:
+    __slots__ = ("backend", "in_use")
+
+    def __init__(self, backend: InferenceBackend):
+        self.backend = backend
+        self.in_use = 0
+
+
+class ModelRegistry:
+    """Loads models lazily and keeps them within a memory budget.
+
+    Requests either name a model explicitly or are routed to the smallest
+    model whose ``max_prompt_chars`` fits the prompt. When loading a model
+    would exceed ``memory_budget_bytes``, least recently used models that are
+    not serving a batch are evicted first; if every resident model is busy,
+    the load waits until one is released.
+    """
+
+    def __init__(self, specs: Sequence[ModelSpec], memory_budget_bytes: Optional[int] = None):
+        if not specs:
+            raise ValueError("At least one model must be registered")
+        self.specs: Dict[str, ModelSpec] = {spec.name: spec for spec in specs}
+        self.memory_budget_bytes = memory_budget_bytes
+        for spec in specs:
+            if memory_budget_bytes is not None and spec.size_bytes > memory_budget_bytes:
+                raise ValueError(f"Model {spec.name} does not fit in the memory budget")
+        # Routing order: smallest prompt limit first, unlimited models last
+        self._routing = sorted(
+            specs, key=lambda s: (s.max_prompt_chars is None, s.max_prompt_chars or 0)
+        )
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()
+        self._loading: Dict[str, int] = {}  # name -> bytes reserved while loading
+        self._changed = asyncio.Condition()
+        self.load_seconds: Dict[str, float] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.specs)
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(self.specs[name].size_bytes for name in self._resident)
+
+    def route(self, request: PromptRequest) -> str:
+        """Pick the model for a request"""
+        if request.model is not None:
+            if request.model not in self.specs:
+                raise UnknownModel(request.model)
+            return request.model
+        length = len(request.prompt)
+        for spec in self._routing:
+            if spec.max_prompt_chars is None or length <= spec.max_prompt_chars:
+                return spec.name
+        # Longer than every limit: use the model that accepts the longest prompts
+        return self._routing[-1].name
+
+    @asynccontextmanager
+    async def use(self, name: str) -> AsyncIterator[InferenceBackend]:
+        """Borrow a loaded model; it cannot be evicted while borrowed"""
+        resident = await self._acquire(name)
+        try:
+            yield resident.backend
+        finally:
+            resident.in_use -= 1
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def _acquire(self, name: str) -> _Resident:
+        spec = self.specs[name]
+        async with self._changed:
+            while True:
+                resident = self._resident.get(name)
+                if resident is not None:
+                    self._resident.move_to_end(name)
+                    resident.in_use += 1
+                    return resident
+                if name not in self._loading and self._make_room(spec.size_bytes):
+                    break
+                await self._changed.wait()
+            # Reserve the memory, then load without holding the lock so other models keep serving
+            self._loading[name] = spec.size_bytes
+
+        started = time.monotonic()
+        try:
+            backend = await asyncio.to_thread(spec.factory)
+        except BaseException:
+            # Failed or cancelled (e.g. a stream client went away mid-load): give the
+            # reservation back before awaiting anything, then wake the waiters
+            del self._loading[name]
+            async with self._changed:
+                self._changed.notify_all()
+            raise
+        elapsed = time.monotonic() - started
+
+        async with self._changed:
+            del self._loading[name]
+            resident = _Resident(backend)
+            resident.in_use += 1
+            self._resident[name] = resident
+            self.loads += 1
+            self.load_seconds[name] = elapsed
+            self._changed.notify_all()
+        MODEL_LOAD_SECONDS.labels(name).observe(elapsed)
+        MODEL_RESIDENT.labels(name).set(1)
+        MODEL_RESIDENT_BYTES.set(self.resident_bytes)
+        logger.info(f"Loaded model {name} in {elapsed:.2f}s")
+        return resident
+
+    def _make_room(self, size: int) -> bool:
+        if self.memory_budget_bytes is None:
+            return True
+        reserved = sum(self._loading.values())
+        while self.resident_bytes + reserved + size > self.memory_budget_bytes:
+            idle = next((n for n, r in self._resident.items() if r.in_use == 0), None)
+            if idle is None:
+                return False
+            self._evict(idle)
+        return True
+
+    def _evict(self, name: str):
+        resident = self._resident.pop(name)
+        close = getattr(resident.backend, "close", None)
+        if close:
+            close()
+        self.evictions += 1
+        MODEL_EVICTIONS.labels(name).inc()
+        MODEL_RESIDENT.labels(name).set(0)
+        MODEL_RESIDENT_BYTES.set(self.resident_bytes)
+        logger.info(f"Evicted model {name} to stay within the memory budget")
+
+    def resident_backend(self, name: str) -> Optional[InferenceBackend]:
+        """The loaded backend for ``name``, without loading or borrowing it"""
+        resident = self._resident.get(name)
+        return resident.backend if resident is not None else None
+
+    def backend(self, name: str) -> "RegisteredModel":
+        return RegisteredModel(self, name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "resident_bytes": self.resident_bytes,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "models": {
+                name: {
+                    "size_bytes": spec.size_bytes,
+                    "max_prompt_chars": spec.max_prompt_chars,
+                    "resident": name in self._resident,
+                    "in_use": self._resident[name].in_use if name in self._resident else 0,
+                    "last_load_seconds": self.load_seconds.get(name),
+                }
+                for name, spec in self.specs.items()
+            },
+        }
+
+
+class RegisteredModel(InferenceBackend):
+    """Backend handle that borrows its model from the registry per call"""
+
+    def __init__(self, registry: ModelRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def count_tokens(self, text: str) -> int:
+        # Telemetry runs right after a call, while the model is normally still
+        # resident; if it was evicted in between, fall back to the estimate
+        backend = self.registry.resident_backend(self.name)
+        if backend is None:
+            return super().count_tokens(text)
+        return backend.count_tokens(text)
+
+    async def agenerate_batch(
+        self, requests: Sequence[PromptRequest], is_cancelled: Optional[CancelCheck] = None
+    ) -> List[str]:
+        async with self.registry.use(self.name) as backend:
+            return await backend.agenerate_batch(requests, is_cancelled)
+
+    async def astream(
+        self,
+        request: PromptRequest,
+        buffer_size: int = 16,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ) -> AsyncIterator[str]:
+        async with self.registry.use(self.name) as backend:
+            tokens = backend.astream(request, buffer_size=buffer_size, executor=executor)
+            try:
+                async for token in tokens:
+                    yield token
+            finally:
+                await tokens.aclose()
+
+
+def specs_from_env(default_factory: Callable[[], InferenceBackend]) -> List[ModelSpec]:
+    """Model specs from ``AGENT_MODELS``, or a single ``default`` model.
+
+    ``AGENT_MODELS`` is a JSON list such as::
+
+        [{"name": "small", "size_mb": 500, "max_prompt_chars": 512},
+         {"name": "large", "backend": "llama", "model_path": "/models/large.bin"}]
+
+    Stub models only declare a synthetic size. Llama models default their
+    size to the weight file size.
+    """
+    raw = os.getenv("AGENT_MODELS")
+    if not raw:
+        return [ModelSpec("default", 0, default_factory)]
+
+    specs = []
+    for entry in json.loads(raw):
+        kind = entry.get("backend", "stub")
+        if kind == "llama":
+            path = entry["model_path"]
+            size = int(entry.get("size_mb", 0) * 1024 * 1024) or os.path.getsize(path)
+            factory = lambda path=path: LlamaCppBackend(path)  # noqa: E731
+        elif kind == "stub":
+            size = int(entry.get("size_mb", 0) * 1024 * 1024)
+            factory = lambda entry=entry: StubBackend(  # noqa: E731
+                step_overhead=entry.get("step_overhead_ms", 0) / 1000,
+                per_sequence_cost=entry.get("per_sequence_ms", 0) / 1000,
+            )
+        else:
+            raise ValueError(f"Unknown backend for model {entry['name']}: {kind}")
+        specs.append(ModelSpec(entry["name"], size, factory, entry.get("max_prompt_chars")))
+    return specs
@@ -0,0 +1,208 @@
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from schemas import PromptRequest
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry bookkeeping overhead (key, trie path, dict slots)
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different prompts share an entry"""
+    return " ".join(prompt.split())
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    prompt: str
+    text: str
+    size: int
+    expires_at: float
+
+
+class _TrieNode:
+    __slots__ = ("children", "keys")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.keys: set = set()  # keys of all entries whose prompt passes through this node
+
+
+class PrefixTrie:
+    """Word-level prefix index over cached prompts"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def insert(self, words: List[str], key: str):
+        node = self.root
+        node.keys.add(key)
+        for word in words:
+            node = node.children.setdefault(word, _TrieNode())
+            node.keys.add(key)
+
+    def remove(self, words: List[str], key: str):
+        node = self.root
+        node.keys.discard(key)
+        for word in words:
+            child = node.children.get(word)
+            if child is None:
+                return
+            child.keys.discard(key)
+            if not child.keys:
+                # Nothing else shares this path; drop the whole subtree
+                del node.children[word]
+                return
+            node = child
+
+    def keys_with_prefix(self, words: List[str]) -> set:
+        node = self.root
+        for word in words:
+            node = node.children.get(word)
+            if node is None:
+                return set()
+        return node.keys
+
+    def shared_prefixes(self, min_count: int, max_depth: int) -> List[tuple]:
+        """Longest prefixes shared by at least ``min_count`` entries"""
+        found = []
+        stack = [(self.root, [])]
+        while stack:
+            node, path = stack.pop()
+            extended = False
+            if len(path) < max_depth:
+                for word, child in node.children.items():
+                    if len(child.keys) >= min_count:
+                        stack.append((child, path + [word]))
+                        extended = True
+            if path and not extended:
+                found.append((" ".join(path), len(node.keys)))
+        return found
+
+
+class ResponseCache:
+    """Byte-bounded LRU cache of completions with TTL and a prefix index.
+
+    Entries are keyed by the normalized prompt plus generation parameters.
+    Only deterministic requests (``temperature == 0``) are cached, since a
+    sampled completion is not a valid answer for the next identical request.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._trie = PrefixTrie()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(request: PromptRequest) -> str:
+        params = {
+            "prompt": normalize_prompt(request.prompt),
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+            "model": request.model,
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def cacheable(request: PromptRequest) -> bool:
+        return request.temperature == 0
+
+    def get(self, request: PromptRequest) -> Optional[str]:
+        """Return a cached completion, or None on a miss"""
+        if not self.cacheable(request):
+            return None
+        key = self.make_key(request)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= self._clock():
+            self._remove(entry)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.text
+
+    def put(self, request: PromptRequest, text: str) -> bool:
+        """Store a completion, evicting least recently used entries to fit"""
+        if not self.cacheable(request):
+            return False
+        prompt = normalize_prompt(request.prompt)
+        size = len(prompt.encode()) + len(text.encode()) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return False
+
+        key = self.make_key(request)
+        existing = self._entries.get(key)
+        if existing is not None:
+            self._remove(existing)
+
+        while self._entries and self.size_bytes + size > self.max_bytes:
+            _, oldest = next(iter(self._entries.items()))
+            self._remove(oldest)
+            self.evictions += 1
+
+        entry = CacheEntry(key, prompt, text, size, self._clock() + self.ttl)
+        self._entries[key] = entry
+        self._trie.insert(prompt.split(" "), key)
+        self.size_bytes += size
+        return True
+
+    def _remove(self, entry: CacheEntry):
+        del self._entries[entry.key]
+        self._trie.remove(entry.prompt.split(" "), entry.key)
+        self.size_bytes -= entry.size
+
+    def lookup_prefix(self, prefix: str, limit: int = 20) -> List[Dict[str, str]]:
+        """Cached, unexpired completions whose prompt starts with ``prefix`` (word-aligned)"""
+        words = normalize_prompt(prefix).split(" ") if prefix.strip() else []
+        now = self._clock()
+        results = []
+        for key in self._trie.keys_with_prefix(words):
+            entry = self._entries[key]
+            if entry.expires_at > now:
+                results.append({"prompt": entry.prompt, "text": entry.text})
+                if len(results) >= limit:
+                    break
+        return results
+
+    def common_prefixes(self, min_count: int = 2, limit: int = 10, max_depth: int = 16) -> List[Dict[str, Any]]:
+        """Most shared templated prefixes among cached prompts"""
+        prefixes = self._trie.shared_prefixes(max(1, min_count), max_depth)
+        prefixes.sort(key=lambda p: (p[1], len(p[0])), reverse=True)
+        return [{"prefix": prefix, "entries": count} for prefix, count in prefixes[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
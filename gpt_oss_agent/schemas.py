@@ -0,0 +1,35 @@
+import os
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+# Largest max_tokens a request may ask for; a completion cannot outgrow the model's context
+MAX_TOKENS_LIMIT = int(os.getenv("MAX_TOKENS_LIMIT", os.getenv("MODEL_N_CTX", 2048)))
+
+
+class PromptRequest(BaseModel):
+    prompt: str
+    max_tokens: int = Field(256, ge=1, le=MAX_TOKENS_LIMIT)
+    temperature: float = 0.0
+    # Explicit model name; when omitted the registry routes by prompt size
+    model: Optional[str] = None
+
+
+class TextResponse(BaseModel):
+    text: str
+
+
+class BatchRequest(BaseModel):
+    prompts: List[str]
+    max_tokens: int = Field(256, ge=1, le=MAX_TOKENS_LIMIT)
+    temperature: float = 0.0
+    model: Optional[str] = None
+
+
+class BatchItemResult(BaseModel):
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
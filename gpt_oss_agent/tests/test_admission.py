@@ -0,0 +1,81 @@
+import pytest
+from httpx import AsyncClient
+from pydantic import ValidationError
+
+from admission import AdmissionController, AdmissionRejected
+from schemas import MAX_TOKENS_LIMIT, BatchRequest, PromptRequest
+
+
+def test_cost_grows_with_prompt_and_max_tokens():
+    controller = AdmissionController()
+    short = controller.estimate_cost(PromptRequest(prompt="hi", max_tokens=16))
+    long = controller.estimate_cost(PromptRequest(prompt="hi" * 1000, max_tokens=512))
+    assert long > short > 0
+
+
+def test_max_tokens_is_bounded():
+    for max_tokens in (0, -5, MAX_TOKENS_LIMIT + 1):
+        with pytest.raises(ValidationError):
+            PromptRequest(prompt="hi", max_tokens=max_tokens)
+        with pytest.raises(ValidationError):
+            BatchRequest(prompts=["hi"], max_tokens=max_tokens)
+
+
+def test_negative_cost_estimates_are_clamped():
+    class Optimistic(AdmissionController):
+        def estimate_cost(self, request):
+            return -100.0
+
+    controller = Optimistic()
+    ticket = controller.admit(PromptRequest(prompt="x"))
+    assert ticket.cost == 0 and controller.outstanding_cost == 0
+
+
+def test_sheds_when_latency_target_exceeded():
+    controller = AdmissionController(target_latency=12, capacity=1, decode_tokens_per_sec=50)
+    request = PromptRequest(prompt="x", max_tokens=250)  # ~5s of decode
+
+    first = controller.admit(request)
+    controller.admit(request)
+    with pytest.raises(AdmissionRejected) as exc:
+        controller.admit(request)
+    assert exc.value.reason == "latency"
+    assert exc.value.retry_after >= 1
+    assert controller.stats()["shed"]["latency"] == 1
+
+    first.release()
+    assert controller.in_flight == 1
+
+
+def test_caps_concurrent_streams():
+    controller = AdmissionController(max_streams=1)
+    stream = controller.admit(PromptRequest(prompt="x"), stream=True)
+    controller.admit(PromptRequest(prompt="x"))  # Non-streaming work is not capped
+    with pytest.raises(AdmissionRejected) as exc:
+        controller.admit(PromptRequest(prompt="x"), stream=True)
+    assert exc.value.reason == "streams"
+
+    stream.release()
+    assert controller.stats()["streams"] == 0
+    controller.admit(PromptRequest(prompt="x"), stream=True)
+
+
+def test_sheds_when_queue_too_deep():
+    controller = AdmissionController(max_queue_depth=2, queue_depth=lambda: 2)
+    with pytest.raises(AdmissionRejected) as exc:
+        controller.admit(PromptRequest(prompt="x"))
+    assert exc.value.reason == "queue_depth"
+
+
+@pytest.mark.asyncio
+async def test_generate_returns_503_with_retry_after(monkeypatch):
+    import gpt_oss_agent
+
+    def reject(request, stream=False):
+        raise AdmissionRejected("latency", 3)
+
+    monkeypatch.setattr(gpt_oss_agent.admission, "admit", reject)
+    async with AsyncClient(app=gpt_oss_agent.app, base_url="http://test") as ac:
+        resp = await ac.post("/generate", json={"prompt": "never cached"})
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "3"
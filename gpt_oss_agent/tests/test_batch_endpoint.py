@@ -0,0 +1,35 @@
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint_keeps_order_and_reports_item_errors(monkeypatch):
+    import gpt_oss_agent
+
+    original = gpt_oss_agent.complete
+
+    async def flaky_complete(request, deadline=None, flow=None):
+        if request.prompt == "bad":
+            raise HTTPException(status_code=503, detail="Agent overloaded (latency)")
+        return await original(request)
+
+    monkeypatch.setattr(gpt_oss_agent, "complete", flaky_complete)
+    async with AsyncClient(app=gpt_oss_agent.app, base_url="http://test") as ac:
+        resp = await ac.post("/generate/batch", json={"prompts": ["one", "bad", "three"]})
+        assert resp.status_code == 200
+        assert resp.json()["results"] == [
+            {"text": "Echo: one", "error": None},
+            {"text": None, "error": "Agent overloaded (latency)"},
+            {"text": "Echo: three", "error": None},
+        ]
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint_rejects_oversized_batches(monkeypatch):
+    import gpt_oss_agent
+
+    monkeypatch.setattr(gpt_oss_agent, "MAX_BATCH_PROMPTS", 2)
+    async with AsyncClient(app=gpt_oss_agent.app, base_url="http://test") as ac:
+        resp = await ac.post("/generate/batch", json={"prompts": ["a", "b", "c"]})
+        assert resp.status_code == 400
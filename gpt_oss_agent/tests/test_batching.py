@@ -0,0 +1,104 @@
+import time
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from backends import StubBackend
+from batching import MicroBatcher
+from schemas import PromptRequest
+
+
+class RecordingBackend(StubBackend):
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def generate_batch(self, requests, is_cancelled=None):
+        self.batch_sizes.append(len(requests))
+        return super().generate_batch(requests, is_cancelled)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_batched():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch_size=4, max_wait_ms=50)
+
+    prompts = [f"prompt {i}" for i in range(10)]
+    texts = await asyncio.gather(*(batcher.submit(PromptRequest(prompt=p)) for p in prompts))
+    await batcher.stop()
+
+    assert texts == [f"Echo: {p}" for p in prompts]
+    assert backend.batch_sizes == [4, 4, 2]
+
+
+@pytest.mark.asyncio
+async def test_backend_error_fails_whole_batch():
+    class FailingBackend(StubBackend):
+        def generate_batch(self, requests, is_cancelled=None):
+            raise ValueError("boom")
+
+    batcher = MicroBatcher(FailingBackend(), max_batch_size=2, max_wait_ms=10)
+    results = await asyncio.gather(
+        batcher.submit(PromptRequest(prompt="a")),
+        batcher.submit(PromptRequest(prompt="b")),
+        return_exceptions=True,
+    )
+    await batcher.stop()
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_requests_are_dropped_from_queue_and_running_batches():
+    backend = RecordingBackend()
+    backend.step_overhead = 0.02
+    batcher = MicroBatcher(backend, max_batch_size=1, max_wait_ms=0)
+
+    running = asyncio.create_task(batcher.submit(PromptRequest(prompt="one two three four five six")))
+    queued = asyncio.create_task(batcher.submit(PromptRequest(prompt="queued")))
+    await asyncio.sleep(0.03)
+    started = time.monotonic()
+    running.cancel()
+    queued.cancel()
+    while batcher._running:
+        await asyncio.sleep(0.005)
+    elapsed = time.monotonic() - started
+    await asyncio.sleep(0.02)
+    await batcher.stop()
+
+    # Running to completion would take ~0.14s; it stops within a decode step instead
+    assert elapsed < 0.06
+    # The queued request was dropped without reaching the backend
+    assert backend.batch_sizes == [1]
+
+
+@pytest.mark.asyncio
+async def test_generate_endpoint():
+    from gpt_oss_agent import app
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post("/generate", json={"prompt": "hello"})
+        assert resp.status_code == 200
+        assert resp.json() == {"text": "Echo: hello"}
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exports_inference_telemetry():
+    from gpt_oss_agent import app
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/generate", json={"prompt": "telemetry check"})
+        resp = await ac.get("/metrics")
+        assert resp.status_code == 200
+        body = resp.text
+        for name in (
+            "agent_queue_wait_seconds_bucket",
+            'agent_time_to_first_token_seconds_count{mode="batch"}',
+            "agent_tokens_per_second_count",
+            "agent_batch_size",
+            "agent_in_flight_requests",
+            "agent_cache_hits_total",
+            "agent_admission_shed_total",
+        ):
+            assert name in body
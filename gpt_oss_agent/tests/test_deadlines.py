@@ -0,0 +1,76 @@
+import time
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from admission import AdmissionController
+from backends import StubBackend
+from batching import DeadlineExceeded, MicroBatcher
+from schemas import PromptRequest
+
+
+@pytest.mark.asyncio
+async def test_expired_requests_are_dropped_from_queue():
+    backend = StubBackend(step_overhead=0.01)
+    batcher = MicroBatcher(backend, max_batch_size=1, max_wait_ms=0)
+
+    # The first request occupies the backend while the second one's deadline passes
+    first = asyncio.ensure_future(batcher.submit(PromptRequest(prompt="slow " * 10)))
+    await asyncio.sleep(0)
+    with pytest.raises(DeadlineExceeded):
+        await batcher.submit(PromptRequest(prompt="late"), deadline=time.monotonic() + 0.02)
+    assert (await first).startswith("Echo: slow")
+    await batcher.stop()
+
+    assert batcher.items == 1
+
+
+def test_affordable_tokens_fit_the_budget():
+    controller = AdmissionController(decode_tokens_per_sec=50, prefill_tokens_per_sec=1e9)
+    assert controller.affordable_tokens(PromptRequest(prompt=""), 2.0) == 100
+    assert controller.affordable_tokens(PromptRequest(prompt="x"), 0) == 0
+
+
+@pytest.mark.asyncio
+async def test_generate_honours_deadline_header(monkeypatch):
+    import gpt_oss_agent
+
+    monkeypatch.setattr(gpt_oss_agent, "admission", AdmissionController(decode_tokens_per_sec=50))
+    submitted = []
+    original = gpt_oss_agent.complete
+
+    async def recording_complete(request, deadline=None, flow=None):
+        submitted.append(deadline)
+        return await original(request, deadline, flow)
+
+    monkeypatch.setattr(gpt_oss_agent, "complete", recording_complete)
+    async with AsyncClient(app=gpt_oss_agent.app, base_url="http://test") as ac:
+        # 100ms at 50 tokens/s leaves room for about 5 tokens
+        resp = await ac.post(
+            "/generate",
+            json={"prompt": "one two three four five six seven eight nine ten", "temperature": 0.5},
+            headers={"X-Request-Deadline-Ms": "100"},
+        )
+        assert resp.status_code == 200
+        assert len(resp.json()["text"].split()) < 10
+        assert submitted[0] is not None
+
+        # Batch work keeps its full length instead
+        resp = await ac.post(
+            "/generate",
+            json={"prompt": "one two three four five six seven eight nine ten", "temperature": 0.5},
+            headers={"X-Request-Deadline-Ms": "100", "X-Priority": "batch"},
+        )
+        assert resp.status_code == 200
+        assert len(resp.json()["text"].split()) == 11
+
+        resp = await ac.post(
+            "/generate", json={"prompt": "too late"}, headers={"X-Request-Deadline-Ms": "0"}
+        )
+        assert resp.status_code == 504
+
+        resp = await ac.post(
+            "/generate", json={"prompt": "bad header"}, headers={"X-Request-Deadline-Ms": "soon"}
+        )
+        assert resp.status_code == 400
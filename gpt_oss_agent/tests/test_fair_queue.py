@@ -0,0 +1,82 @@
+import asyncio
+from dataclasses import dataclass, field
+
+import pytest
+
+from backends import StubBackend
+from batching import MicroBatcher
+from fair_queue import FairQueue, Flow
+from schemas import PromptRequest
+
+
+@dataclass
+class Item:
+    flow: Flow
+    name: str
+    enqueued_at: float = field(default=0.0)
+
+
+def test_flows_are_served_in_proportion_to_weight():
+    queue = FairQueue({"interactive": 3, "batch": 1}, quantum=1)
+    for i in range(12):
+        queue.append(Item(Flow("a", "batch"), f"a{i}"))
+        queue.append(Item(Flow("b", "interactive"), f"b{i}"))
+
+    first = [queue.popleft().name for _ in range(8)]
+    assert sum(name.startswith("b") for name in first) == 6
+    assert len(queue) == 16
+
+
+def test_light_tenant_does_not_wait_behind_heavy_backlog():
+    queue = FairQueue(quantum=1)
+    for i in range(100):
+        queue.append(Item(Flow("heavy"), f"heavy{i}"))
+    queue.append(Item(Flow("light"), "light"))
+
+    order = [queue.popleft().name for _ in range(4)]
+    assert "light" in order
+    assert queue.depth_by_priority() == {"normal": 97}
+
+
+@pytest.mark.asyncio
+async def test_batcher_fills_batches_fairly():
+    backend = StubBackend(step_overhead=0.001)
+    batcher = MicroBatcher(backend, max_batch_size=2, max_wait_ms=0, quantum=1)
+
+    done = []
+
+    async def submit(flow, prompt):
+        await batcher.submit(PromptRequest(prompt=prompt, max_tokens=4), flow=flow)
+        done.append(prompt)
+
+    heavy = [submit(Flow("heavy"), f"heavy {i}") for i in range(20)]
+    light = submit(Flow("light"), "light")
+    await asyncio.gather(*heavy, light)
+    await batcher.stop()
+
+    assert done.index("light") < 6
+
+
+def test_quantum_must_be_positive():
+    with pytest.raises(ValueError):
+        FairQueue(quantum=0)
+
+
+@pytest.mark.asyncio
+async def test_streams_take_fair_turns_behind_other_tenants():
+    batcher = MicroBatcher(StubBackend(), max_batch_size=2, max_wait_ms=0, quantum=1)
+
+    granted = []
+
+    async def stream(flow, prompt):
+        await batcher.wait_turn(PromptRequest(prompt=prompt, max_tokens=4), flow=flow)
+        granted.append(prompt)
+
+    # A tenant streaming heavily waits its turns instead of skipping the queue
+    heavy = [stream(Flow("heavy"), f"heavy {i}") for i in range(20)]
+    light = stream(Flow("light"), "light")
+    await asyncio.gather(*heavy, light)
+    await batcher.stop()
+
+    assert granted.index("light") < 6
+    assert batcher.items == 0  # Turns are never run as batch items
@@ -0,0 +1,89 @@
+import time
+import asyncio
+
+import pytest
+
+from backends import StubBackend
+from registry import ModelRegistry, ModelSpec, UnknownModel
+from schemas import PromptRequest
+
+MB = 1024 * 1024
+
+
+def make_registry(budget_mb=None):
+    specs = [
+        ModelSpec("small", 100 * MB, StubBackend, max_prompt_chars=20),
+        ModelSpec("medium", 300 * MB, StubBackend, max_prompt_chars=200),
+        ModelSpec("large", 600 * MB, StubBackend),
+    ]
+    return ModelRegistry(specs, memory_budget_bytes=budget_mb * MB if budget_mb else None)
+
+
+def test_routes_by_prompt_size_or_explicit_model():
+    registry = make_registry()
+    assert registry.route(PromptRequest(prompt="short")) == "small"
+    assert registry.route(PromptRequest(prompt="x" * 100)) == "medium"
+    assert registry.route(PromptRequest(prompt="x" * 1000)) == "large"
+    assert registry.route(PromptRequest(prompt="short", model="large")) == "large"
+    with pytest.raises(UnknownModel):
+        registry.route(PromptRequest(prompt="short", model="missing"))
+
+
+@pytest.mark.asyncio
+async def test_models_load_lazily_and_evict_lru_within_budget():
+    registry = make_registry(budget_mb=900)
+    assert registry.stats()["resident_bytes"] == 0
+
+    for name in ("small", "medium"):
+        texts = await registry.backend(name).agenerate_batch([PromptRequest(prompt="hi")])
+        assert texts == ["Echo: hi"]
+    assert registry.resident_bytes == 400 * MB
+
+    await registry.backend("large").agenerate_batch([PromptRequest(prompt="hi")])
+    stats = registry.stats()
+    assert stats["resident_bytes"] <= 900 * MB
+    assert stats["models"]["large"]["resident"]
+    assert not stats["models"]["small"]["resident"]
+    assert stats["evictions"] == 1
+    assert stats["models"]["large"]["last_load_seconds"] is not None
+
+
+@pytest.mark.asyncio
+async def test_busy_models_are_not_evicted():
+    registry = make_registry(budget_mb=700)
+    async with registry.use("medium"):
+        load_large = asyncio.create_task(registry.backend("large").agenerate_batch([PromptRequest(prompt="hi")]))
+        await asyncio.sleep(0.05)
+        assert not load_large.done()
+    assert await asyncio.wait_for(load_large, timeout=1) == ["Echo: hi"]
+    assert not registry.stats()["models"]["medium"]["resident"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_load_releases_its_reservation():
+    def slow_load():
+        time.sleep(0.1)
+        return StubBackend()
+
+    registry = ModelRegistry([ModelSpec("m", 10, slow_load)], memory_budget_bytes=10)
+    loading = asyncio.create_task(registry.backend("m").agenerate_batch([PromptRequest(prompt="hi")]))
+    await asyncio.sleep(0.02)
+    loading.cancel()  # E.g. a stream client disconnecting while its model loads
+    with pytest.raises(asyncio.CancelledError):
+        await loading
+    assert registry._loading == {}
+    texts = await asyncio.wait_for(registry.backend("m").agenerate_batch([PromptRequest(prompt="hi")]), timeout=1)
+    assert texts == ["Echo: hi"]
+
+
+@pytest.mark.asyncio
+async def test_registered_model_counts_with_the_resident_tokenizer():
+    class CharTokens(StubBackend):
+        def count_tokens(self, text):
+            return len(text)
+
+    registry = ModelRegistry([ModelSpec("m", 0, CharTokens)])
+    model = registry.backend("m")
+    assert model.count_tokens("a b") == 2  # Not loaded yet: whitespace estimate
+    await model.agenerate_batch([PromptRequest(prompt="hi")])
+    assert model.count_tokens("a b") == 3
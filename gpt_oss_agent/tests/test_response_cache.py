@@ -0,0 +1,78 @@
+import pytest
+from httpx import AsyncClient
+
+from response_cache import ResponseCache
+from schemas import PromptRequest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_after_put_with_normalized_prompt():
+    cache = ResponseCache()
+    cache.put(PromptRequest(prompt="What is my  balance?"), "42")
+
+    assert cache.get(PromptRequest(prompt=" What is my balance? ")) == "42"
+    assert cache.get(PromptRequest(prompt="What is my balance?", max_tokens=10)) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_sampled_requests_are_not_cached():
+    cache = ResponseCache()
+    request = PromptRequest(prompt="tell me a story", temperature=0.8)
+    assert cache.put(request, "once upon a time") is False
+    assert cache.get(request) is None
+
+
+def test_lru_eviction_respects_byte_budget():
+    cache = ResponseCache(max_bytes=2000)
+    for i in range(5):
+        cache.put(PromptRequest(prompt=f"prompt {i}"), "x" * 100)
+    cache.get(PromptRequest(prompt="prompt 2"))
+    cache.put(PromptRequest(prompt="prompt 5"), "x" * 100)
+
+    assert cache.size_bytes <= 2000
+    assert cache.evictions > 0
+    assert cache.get(PromptRequest(prompt="prompt 2")) is not None
+    assert cache.get(PromptRequest(prompt="prompt 0")) is None
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = ResponseCache(ttl=10, clock=clock)
+    request = PromptRequest(prompt="hi")
+    cache.put(request, "hello")
+    clock.now = 11
+
+    assert cache.get(request) is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_prefix_index():
+    cache = ResponseCache()
+    for month in ("january", "february", "march"):
+        cache.put(PromptRequest(prompt=f"Summarize my spending for {month}"), f"summary {month}")
+    cache.put(PromptRequest(prompt="How do I feel today?"), "fine")
+
+    results = cache.lookup_prefix("Summarize my spending")
+    assert sorted(r["text"] for r in results) == ["summary february", "summary january", "summary march"]
+    assert cache.common_prefixes(min_count=2) == [{"prefix": "Summarize my spending for", "entries": 3}]
+
+
+@pytest.mark.asyncio
+async def test_stats_endpoint_reports_cache_counters():
+    from gpt_oss_agent import app
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/generate", json={"prompt": "cached prompt"})
+        await ac.post("/generate", json={"prompt": "cached prompt"})
+        resp = await ac.get("/stats")
+        assert resp.status_code == 200
+        assert resp.json()["cache"]["hits"] >= 1
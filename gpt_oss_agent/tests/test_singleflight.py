@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_computation():
+    group = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(group.do("k", compute) for _ in range(5)))
+
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert group.stats()["saved_calls"] == 4
+    assert group.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_leader_disconnect_does_not_cancel_followers():
+    group = SingleFlight()
+    release = asyncio.Event()
+
+    async def compute():
+        await release.wait()
+        return "done"
+
+    leader = asyncio.create_task(group.do("k", compute))
+    follower = asyncio.create_task(group.do("k", compute))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await follower == "done"
+    assert leader.cancelled()
+    assert group.stats()["cancelled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_computation_cancelled_when_all_waiters_leave():
+    group = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def compute():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiters = [asyncio.create_task(group.do("k", compute)) for _ in range(2)]
+    await started.wait()
+    for w in waiters:
+        w.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+    assert group.stats()["cancelled"] == 1
+    assert group.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_generation_is_shared_only_within_a_flow_and_deadline_fit(monkeypatch):
+    import time
+
+    import gpt_oss_agent
+    from admission import AdmissionController
+    from fair_queue import Flow
+    from schemas import PromptRequest
+
+    monkeypatch.setattr(gpt_oss_agent, "admission", AdmissionController(decode_tokens_per_sec=50))
+    monkeypatch.setattr(gpt_oss_agent, "singleflight", SingleFlight())
+    calls = []
+
+    async def recording_complete(request, deadline=None, flow=None):
+        calls.append((request.max_tokens, flow.tenant))
+        await asyncio.sleep(0.01)
+        return f"{request.max_tokens}:{flow.tenant}"
+
+    monkeypatch.setattr(gpt_oss_agent, "complete", recording_complete)
+    request = PromptRequest(prompt="shared prompt", max_tokens=64)
+    a, b = Flow("a"), Flow("b")
+    short = time.monotonic() + 0.1  # Room for about 5 tokens
+    results = await asyncio.gather(
+        gpt_oss_agent.generate_one(request, None, a),
+        gpt_oss_agent.generate_one(request, None, a),
+        gpt_oss_agent.generate_one(request, None, b),
+        gpt_oss_agent.generate_one(request, short, a),
+    )
+    assert results[0] == results[1] == "64:a" and results[2] == "64:b"
+    assert results[3] != "64:a"
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_joiner_with_time_left_retries_after_leaders_deadline(monkeypatch):
+    import time
+
+    from fastapi import HTTPException
+
+    import gpt_oss_agent
+    from fair_queue import DEFAULT_FLOW
+    from schemas import PromptRequest
+
+    monkeypatch.setattr(gpt_oss_agent, "singleflight", SingleFlight())
+    calls = []
+
+    async def complete(request, deadline=None, flow=None):
+        calls.append(deadline)
+        await asyncio.sleep(0.05)
+        if deadline is not None and time.monotonic() >= deadline:
+            raise HTTPException(status_code=504, detail="Deadline exceeded")
+        return "done"
+
+    monkeypatch.setattr(gpt_oss_agent, "complete", complete)
+    request = PromptRequest(prompt="tiny", max_tokens=1)
+    leader = asyncio.ensure_future(gpt_oss_agent.generate_one(request, time.monotonic() + 0.03, DEFAULT_FLOW))
+    await asyncio.sleep(0)
+    joiner = gpt_oss_agent.generate_one(request, None, DEFAULT_FLOW)
+    results = await asyncio.gather(leader, joiner, return_exceptions=True)
+    assert isinstance(results[0], HTTPException) and results[1] == "done"
+    assert len(calls) == 2 and calls[1] is None
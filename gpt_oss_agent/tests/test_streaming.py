@@ -0,0 +1,69 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from httpx import AsyncClient
+
+from backends import StubBackend
+from schemas import PromptRequest
+
+
+@pytest.mark.asyncio
+async def test_astream_yields_tokens_in_order():
+    backend = StubBackend()
+    tokens = [t async for t in backend.astream(PromptRequest(prompt="a b c"), buffer_size=1)]
+    assert tokens == ["Echo:", " a", " b", " c"]
+    assert "".join(tokens) == backend.complete(PromptRequest(prompt="a b c"))
+
+
+@pytest.mark.asyncio
+async def test_astream_produces_on_the_given_executor():
+    class ThreadRecorder(StubBackend):
+        def stream(self, request):
+            self.thread = threading.current_thread().name
+            yield from super().stream(request)
+
+    backend = ThreadRecorder()
+    with ThreadPoolExecutor(1, thread_name_prefix="streams") as executor:
+        tokens = [t async for t in backend.astream(PromptRequest(prompt="a"), executor=executor)]
+    assert tokens == ["Echo:", " a"]
+    assert backend.thread.startswith("streams")
+
+
+@pytest.mark.asyncio
+async def test_generate_stream_endpoint():
+    from gpt_oss_agent import app
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post("/generate/stream", json={"prompt": "hello world"})
+        assert resp.status_code == 200
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert lines == [{"token": "Echo:"}, {"token": " hello"}, {"token": " world"}, {"done": True}]
+
+
+@pytest.mark.asyncio
+async def test_stream_ticket_is_released_when_body_is_never_sent(monkeypatch):
+    import gpt_oss_agent
+    from admission import AdmissionController
+
+    controller = AdmissionController()
+    monkeypatch.setattr(gpt_oss_agent, "admission", controller)
+    response = await gpt_oss_agent.generate_stream(
+        PromptRequest(prompt="never read"), _FakeRequest()
+    )
+    assert controller.stats()["in_flight"] == 1
+
+    async def failing_send(message):
+        raise OSError("connection reset")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    with pytest.raises(Exception):  # anyio wraps it in an ExceptionGroup
+        await response({"type": "http"}, receive, failing_send)
+    assert controller.stats()["in_flight"] == 0
+
+
+class _FakeRequest:
+    headers = {}
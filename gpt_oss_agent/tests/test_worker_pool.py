@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from backends import create_backend
+from schemas import PromptRequest
+from worker_pool import WorkerPool, map_weights
+
+
+@pytest.fixture
+def weight_file(tmp_path):
+    path = tmp_path / "fake-weights.bin"
+    path.write_bytes(os.urandom(1024 * 1024))
+    return str(path)
+
+
+def test_map_weights_is_read_only(weight_file):
+    weights = map_weights(weight_file)
+    assert len(weights) == 1024 * 1024
+    with pytest.raises(TypeError):
+        weights[0] = 1
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_serves_batches(weight_file):
+    pool = WorkerPool(2, create_backend, weights_path=weight_file)
+    pool.start()
+    try:
+        assert pool.wait_ready(timeout=30)
+        info = pool.stats()["worker_info"]
+        assert len({w["pid"] for w in info.values()}) == 2
+        assert all(w["weights_bytes"] == 1024 * 1024 for w in info.values())
+
+        texts = await pool.agenerate_batch([PromptRequest(prompt="a"), PromptRequest(prompt="b")])
+        assert texts == ["Echo: a", "Echo: b"]
+    finally:
+        pool.stop()
+    assert pool.stats()["alive"] == 0
+
+
+def start_reader(pool: WorkerPool):
+    pool._reader = threading.Thread(target=pool._read_results, daemon=True)
+    pool._reader.start()
+
+
+def test_cancelled_caller_does_not_stop_result_reader():
+    pool = WorkerPool(1, create_backend)
+    start_reader(pool)
+    try:
+        abandoned = pool._submit([PromptRequest(prompt="a")])
+        abandoned.cancel()  # What asyncio.wrap_future does when the awaiting task is cancelled
+        pool._results.put(("result", 0, ["Echo: a"]))
+        waiting = pool._submit([PromptRequest(prompt="b")])
+        pool._results.put(("result", 1, ["Echo: b"]))
+        assert waiting.result(timeout=5) == ["Echo: b"]
+    finally:
+        pool.stop()
+
+
+def test_dead_worker_fails_outstanding_and_new_jobs():
+    pool = WorkerPool(1, create_backend)
+    crashed = pool._ctx.Process(target=sys.exit, args=(1,))
+    crashed.start()
+    crashed.join()
+    pool._processes = [crashed]
+    outstanding = pool._submit([PromptRequest(prompt="a")])
+    start_reader(pool)
+    try:
+        with pytest.raises(RuntimeError, match="died"):
+            outstanding.result(timeout=5)
+        with pytest.raises(RuntimeError, match="failed worker"):
+            pool._submit([PromptRequest(prompt="b")]).result(timeout=1)
+    finally:
+        pool.stop()
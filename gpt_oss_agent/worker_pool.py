@@ -0,0 +1,216 @@
+import os
+import mmap
+import queue
+import asyncio
+import logging
+import itertools
+import threading
+import multiprocessing
+import concurrent.futures
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from backends import CancelCheck, InferenceBackend
+from schemas import PromptRequest
+
+logger = logging.getLogger(__name__)
+
+BackendFactory = Callable[[Optional[mmap.mmap]], InferenceBackend]
+
+
+def map_weights(path: Optional[str]) -> Optional[mmap.mmap]:
+    """Map a weight file read-only.
+
+    Read-only file mappings are backed by the page cache, so every worker that
+    maps the same file shares one physical copy of the weights.
+    """
+    if not path:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _worker_main(
+    worker_id: int,
+    factory: BackendFactory,
+    weights_path: Optional[str],
+    requests: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+):
+    """Entry point of a worker process"""
+    try:
+        weights = map_weights(weights_path)
+        backend = factory(weights)
+        # Warm up so the first real request does not pay for lazy initialisation
+        backend.generate_batch([PromptRequest(prompt="warm up", max_tokens=1)])
+    except Exception as e:
+        results.put(("failed", worker_id, repr(e)))
+        return
+
+    results.put(("ready", worker_id, {"pid": os.getpid(), "weights_bytes": len(weights) if weights else 0}))
+    while True:
+        job = requests.get()
+        if job is None:
+            break
+        job_id, payload = job
+        try:
+            texts = backend.generate_batch([PromptRequest(**item) for item in payload])
+            results.put(("result", job_id, texts))
+        except Exception as e:
+            results.put(("error", job_id, repr(e)))
+
+
+def _resolve(future: concurrent.futures.Future, result: Any = None, error: Optional[BaseException] = None):
+    """Complete ``future`` unless its caller already cancelled it"""
+    if not future.set_running_or_notify_cancel():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class WorkerPool(InferenceBackend):
+    """Runs inference in N worker processes pulling from one shared queue.
+
+    The pool is itself an ``InferenceBackend``: the scheduler hands it batches
+    and awaits the result, so the HTTP front end never blocks on inference.
+    """
+
+    name = "worker-pool"
+
+    def __init__(
+        self,
+        num_workers: int,
+        factory: BackendFactory,
+        weights_path: Optional[str] = None,
+        start_method: str = "spawn",
+    ):
+        self.num_workers = num_workers
+        self.factory = factory
+        self.weights_path = weights_path
+        self._ctx = multiprocessing.get_context(start_method)
+        self._requests = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._processes: List[multiprocessing.Process] = []
+        self._jobs: Dict[int, concurrent.futures.Future] = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+        self._ready_workers: Dict[int, Dict[str, Any]] = {}
+        self._all_ready = threading.Event()
+        self.failed = False
+
+    @property
+    def ready(self) -> bool:
+        return self._all_ready.is_set()
+
+    def start(self):
+        """Spawn the workers; readiness is signalled once all have warmed up"""
+        for worker_id in range(self.num_workers):
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(worker_id, self.factory, self.weights_path, self._requests, self._results),
+                name=f"inference-worker-{worker_id}",
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        self._reader = threading.Thread(target=self._read_results, name="worker-pool-reader", daemon=True)
+        self._reader.start()
+        logger.info(f"Started {self.num_workers} inference workers")
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._all_ready.wait(timeout)
+
+    def stop(self, timeout: float = 5.0):
+        """Ask workers to exit, then fail any jobs still outstanding"""
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._results.put(("stop", None, None))
+        if self._reader:
+            self._reader.join(timeout)
+        self._fail_outstanding("Worker pool stopped")
+
+    def _fail_outstanding(self, reason: str):
+        with self._lock:
+            jobs, self._jobs = self._jobs, {}
+        for future in jobs.values():
+            _resolve(future, error=RuntimeError(reason))
+
+    def _read_results(self):
+        while True:
+            try:
+                kind, ident, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if kind == "stop":
+                return
+            if kind == "ready":
+                self._ready_workers[ident] = payload
+                logger.info(f"Inference worker {ident} ready (pid {payload['pid']})")
+                if len(self._ready_workers) == self.num_workers:
+                    self._all_ready.set()
+                continue
+            if kind == "failed":
+                logger.error(f"Inference worker {ident} failed to start: {payload}")
+                self.failed = True
+                continue
+            with self._lock:
+                future = self._jobs.pop(ident, None)
+            if future is None:
+                continue
+            if kind == "result":
+                _resolve(future, result=payload)
+            else:
+                _resolve(future, error=RuntimeError(f"Inference worker error: {payload}"))
+
+    def _check_workers(self):
+        for worker_id, process in enumerate(self._processes):
+            if not process.is_alive() and process.exitcode not in (None, 0):
+                if not self.failed:
+                    logger.error(f"Inference worker {worker_id} exited with code {process.exitcode}")
+                self.failed = True
+                self._all_ready.clear()
+        if self.failed:
+            # Whatever the dead worker had taken is lost and we cannot tell
+            # which jobs those were; fail them all rather than let them hang
+            self._fail_outstanding("Inference worker died")
+
+    def _submit(self, requests: Sequence[PromptRequest]) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        if self.failed:
+            # Not respawned: /ready reports the pool down so the process gets restarted
+            future.set_exception(RuntimeError("Worker pool has a failed worker"))
+            return future
+        job_id = next(self._job_ids)
+        with self._lock:
+            self._jobs[job_id] = future
+        self._requests.put((job_id, [r.model_dump() for r in requests]))
+        return future
+
+    # Once a batch reaches a worker process it runs to completion; cancelled
+    # callers are still dropped from the queue before dispatch.
+    def generate_batch(
+        self, requests: Sequence[PromptRequest], is_cancelled: Optional[CancelCheck] = None
+    ) -> List[str]:
+        return self._submit(requests).result()
+
+    async def agenerate_batch(
+        self, requests: Sequence[PromptRequest], is_cancelled: Optional[CancelCheck] = None
+    ) -> List[str]:
+        return await asyncio.wrap_future(self._submit(requests))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.num_workers,
+            "alive": sum(p.is_alive() for p in self._processes),
+            "ready": self.ready,
+            "outstanding_jobs": len(self._jobs),
+            "worker_info": self._ready_workers,
+        }